@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+多账号管理
+功能：在同一个一键包中同时运行多个QQ账号，每个账号有自己的麦麦主程序、适配器、配置和数据
+
+主账号仍使用 modules/ 下的 MaiBot 和适配器；其他账号位于 accounts/<QQ号>/：
+MaiBot 和适配器的代码以硬链接与主账号共享（见 fleet.mirror_module），
+config/、.env、data/ 和日志各自独立；NapCat 共用同一个安装，按QQ号读取各自的配置文件。
+更新模块（或回滚）后 update_modules 会调用 sync_accounts，让其他账号使用更新后的代码。
+
+添加账号时自动分配不与其他账号、也不与本机已占用端口冲突的端口：
+- 适配器端口：写入适配器配置 [napcat_server].port 和该账号的 onebot11_<QQ>.json
+- 麦麦主程序端口：写入 .env 的 PORT 和适配器配置 [maibot_server].port
+
+命令行用法：
+- python accounts.py add <QQ号> [--mode hardlink|reflink|copy]
+- python accounts.py remove <QQ号> [--delete-files]（不删除文件时再次添加同一QQ号会沿用原目录和数据）
+- python accounts.py status
+- python accounts.py sync: 将其他账号的代码同步到主账号当前的版本
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import sys
+import time
+
+import tomlkit
+
+from config_store import atomic_write_text, config_store
+from env_document import EnvDocument
+from fleet import PROVISION_MODES, mirror_module, sync_module
+from init_napcat import create_napcat_config, create_onebot_config
+from onebot_profiles import get_adapter_port, get_port_table
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ACCOUNTS_DIR = os.path.join(BASE_DIR, 'accounts')
+ACCOUNTS_STATE_PATH = os.path.join(BASE_DIR, 'runtime', 'accounts.json')
+PRIMARY_BOT_CONFIG_PATH = os.path.join(BASE_DIR, 'modules', 'MaiBot', 'config', 'bot_config.toml')
+PRIMARY_ENV_PATH = os.path.join(BASE_DIR, 'modules', 'MaiBot', '.env')
+# 端口分配的起点（主账号默认使用 8095 和 8000）
+BASE_ADAPTER_PORT = 8095
+BASE_CORE_PORT = 8000
+MAX_PORT = 65535
+
+
+def load_accounts() -> dict:
+    """读取已添加的账号
+
+    Returns:
+        dict: {QQ号: {'qq', 'dir', 'adapter_port', 'core_port', 'mode', 'created'}}
+    """
+    try:
+        with open(ACCOUNTS_STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_accounts(accounts: dict) -> None:
+    atomic_write_text(ACCOUNTS_STATE_PATH, json.dumps(accounts, ensure_ascii=False, indent=2))
+
+
+def _read_core_port(env_path: str) -> int:
+    try:
+        return int(config_store.load_env(env_path).get('PORT') or BASE_CORE_PORT)
+    except (OSError, ValueError):
+        return BASE_CORE_PORT
+
+
+def get_primary_account():
+    """主账号（modules/ 下的 MaiBot 和适配器），未配置QQ号时返回None"""
+    try:
+        qq_number = config_store.load_toml(PRIMARY_BOT_CONFIG_PATH).get('bot', {}).get('qq_account')
+    except Exception:
+        return None
+    if not qq_number:
+        return None
+    return {
+        'qq': str(qq_number),
+        'dir': os.path.join(BASE_DIR, 'modules'),
+        'adapter_port': get_adapter_port(),
+        'core_port': _read_core_port(PRIMARY_ENV_PATH),
+        'primary': True,
+    }
+
+
+def list_all_accounts() -> list:
+    """主账号和所有添加的账号"""
+    primary = get_primary_account()
+    return ([primary] if primary else []) + sorted(load_accounts().values(), key=lambda item: item['adapter_port'])
+
+
+def _port_available(port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(('127.0.0.1', port))
+        except OSError:
+            return False
+    return True
+
+
+def _allocate_port(start: int, used: set) -> int:
+    port = start
+    while port <= MAX_PORT:
+        if port not in used and _port_available(port):
+            used.add(port)
+            return port
+        port += 1
+    raise RuntimeError(f"从 {start} 开始没有可用的端口")
+
+
+def allocate_ports(reserved=()):
+    """为新账号（或分片）分配适配器端口和麦麦主程序端口
+
+    Args:
+        reserved: 调用方已占用、尚未保存的端口
+
+    Returns:
+        tuple: (适配器端口, 麦麦主程序端口)
+    """
+    from shards import get_shard_ports  # 分片模块依赖本模块，延迟导入
+
+    used = set(reserved) | get_shard_ports()
+    for account in list_all_accounts():
+        used.update((account['adapter_port'], account['core_port']))
+    return _allocate_port(BASE_ADAPTER_PORT + 1, used), _allocate_port(BASE_CORE_PORT + 1, used)
+
+
+def get_account_paths(account: dict) -> dict:
+    """账号的麦麦主程序目录、适配器目录和各配置文件路径"""
+    main_dir = os.path.join(account['dir'], 'MaiBot')
+    adapter_dir = os.path.join(account['dir'], 'MaiBot-Napcat-Adapter')
+    return {
+        'main_dir': main_dir,
+        'adapter_dir': adapter_dir,
+        'bot_config': os.path.join(main_dir, 'config', 'bot_config.toml'),
+        'env': os.path.join(main_dir, '.env'),
+        'adapter_config': os.path.join(adapter_dir, 'config.toml'),
+        'data': os.path.join(main_dir, 'data'),
+    }
+
+
+def write_ports(paths: dict, adapter_port: int, core_port: int) -> None:
+    """将端口写入 .env 的 PORT 和适配器配置的 [napcat_server] / [maibot_server]"""
+    env_document = config_store.load_env_document(paths['env']) if os.path.exists(paths['env']) else EnvDocument()
+    env_document.set('PORT', str(core_port))
+    config_store.save_env_document(paths['env'], env_document)
+
+    adapter_config = config_store.load_toml(paths['adapter_config'])
+    for section, port in (('napcat_server', adapter_port), ('maibot_server', core_port)):
+        if section not in adapter_config:
+            adapter_config[section] = tomlkit.table()
+        adapter_config[section]['port'] = port
+    config_store.save_toml(paths['adapter_config'], adapter_config)
+
+
+def find_account(qq_number):
+    """按QQ号查找账号（包括主账号），不存在时返回None"""
+    return next((account for account in list_all_accounts() if account['qq'] == str(qq_number)), None)
+
+
+def _configure_account(account: dict) -> None:
+    paths = get_account_paths(account)
+
+    bot_config = config_store.load_toml(paths['bot_config'])
+    if 'bot' not in bot_config:
+        bot_config['bot'] = tomlkit.table()
+    bot_config['bot']['qq_account'] = int(account['qq'])
+    config_store.save_toml(paths['bot_config'], bot_config)
+
+    write_ports(paths, account['adapter_port'], account['core_port'])
+
+    os.makedirs(paths['data'], exist_ok=True)
+    # NapCat 共用同一个安装，按QQ号生成各自的配置，连接该账号的适配器端口
+    create_napcat_config(account['qq'])
+    create_onebot_config(account['qq'], adapter_port=account['adapter_port'])
+    from shards import restore_napcat_clients  # 分片模块依赖本模块，延迟导入
+    restore_napcat_clients(account['qq'])
+
+
+def add_account(qq_number: str, mode: str = 'hardlink') -> dict:
+    """添加一个账号：创建共享代码的目录、分配端口并生成配置
+
+    Raises:
+        ValueError: QQ号无效或已存在
+    """
+    qq_number = str(qq_number).strip()
+    if not qq_number.isdigit():
+        raise ValueError(f"无效的QQ号: {qq_number}")
+    primary = get_primary_account()
+    accounts = load_accounts()
+    if qq_number in accounts or (primary and primary['qq'] == qq_number):
+        raise ValueError(f"账号 {qq_number} 已存在")
+
+    adapter_port, core_port = allocate_ports()
+    account = {
+        'qq': qq_number,
+        'dir': os.path.join(ACCOUNTS_DIR, qq_number),
+        'adapter_port': adapter_port,
+        'core_port': core_port,
+        'mode': mode,
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    paths = get_account_paths(account)
+    # 之前移除账号时保留的目录直接沿用（其中的数据库不受影响），只同步代码
+    reused = os.path.isdir(account['dir'])
+    try:
+        if reused:
+            sync_account_code(account['dir'], mode)
+        else:
+            mirror_module('modules/MaiBot', paths['main_dir'], mode)
+            mirror_module('modules/MaiBot-Napcat-Adapter', paths['adapter_dir'], mode)
+        _configure_account(account)
+    except Exception:
+        # 只删除本次创建的目录，不能删除保留下来的数据
+        if not reused:
+            shutil.rmtree(account['dir'], ignore_errors=True)
+        raise
+
+    accounts[qq_number] = account
+    _save_accounts(accounts)
+    return account
+
+
+def sync_account_code(directory: str, mode: str = 'hardlink') -> dict:
+    """将账号目录（或分片目录）中的麦麦主程序和适配器代码同步到 modules/ 中的当前版本
+
+    Returns:
+        dict: {'linked', 'copied', 'bytes_copied', 'failed': [无法替换的文件]}
+    """
+    paths = get_account_paths({'dir': directory})
+    total = {'linked': 0, 'copied': 0, 'bytes_copied': 0, 'failed': []}
+    for relative, target in (('modules/MaiBot', paths['main_dir']),
+                             ('modules/MaiBot-Napcat-Adapter', paths['adapter_dir'])):
+        if not os.path.isdir(target):
+            continue
+        stats = sync_module(relative, target, mode)
+        for key in ('linked', 'copied', 'bytes_copied'):
+            total[key] += stats[key]
+        total['failed'].extend(os.path.join(target, os.path.relpath(path, relative)) for path in stats['failed'])
+    return total
+
+
+def report_sync(name: str, stats: dict, report=print) -> None:
+    updated = stats['linked'] + stats['copied']
+    if updated:
+        report(f"✅ {name}: 已同步 {updated} 个更新的代码文件")
+    for path in stats['failed'][:10]:
+        report(f"⚠️  {name}: 无法替换 {path}（文件可能被正在运行的进程占用，关闭后重新同步）")
+    if len(stats['failed']) > 10:
+        report(f"⚠️  {name}: 共 {len(stats['failed'])} 个文件无法替换")
+
+
+def sync_accounts(report=print) -> bool:
+    """将所有其他账号的代码同步到主账号当前的版本
+
+    Returns:
+        bool: 所有文件是否都已同步
+    """
+    success = True
+    for account in load_accounts().values():
+        if not os.path.isdir(account['dir']):
+            continue
+        stats = sync_account_code(account['dir'], account.get('mode', 'hardlink'))
+        report_sync(f"账号 {account['qq']}", stats, report)
+        success = success and not stats['failed']
+    return success
+
+
+def remove_account(qq_number: str, delete_files: bool = False) -> bool:
+    """移除账号，delete_files为True时同时删除其目录（包括数据）
+
+    Returns:
+        bool: 账号是否存在
+    """
+    accounts = load_accounts()
+    account = accounts.pop(str(qq_number), None)
+    if account is None:
+        return False
+    _save_accounts(accounts)
+    if delete_files:
+        # 硬链接的代码文件只删除该账号的链接，不影响主账号
+        shutil.rmtree(account['dir'], ignore_errors=True)
+    return True
+
+
+def get_accounts_status() -> list:
+    """所有账号的运行状态（只调用一次 netstat）
+
+    Returns:
+        list: [{'qq', 'primary', 'adapter_port', 'core_port', 'core', 'adapter', 'napcat'}]
+    """
+    ports = get_port_table()
+    status = []
+    for account in list_all_accounts():
+        adapter_states = ports.get(account['adapter_port'], set())
+        status.append({
+            'qq': account['qq'],
+            'primary': bool(account.get('primary')),
+            'adapter_port': account['adapter_port'],
+            'core_port': account['core_port'],
+            'core': 'LISTENING' in ports.get(account['core_port'], set()),
+            'adapter': 'LISTENING' in adapter_states,
+            # NapCat 连上适配器后适配器端口上有已建立的连接
+            'napcat': 'ESTABLISHED' in adapter_states,
+        })
+    return status
+
+
+def format_status(item: dict) -> str:
+    def mark(running):
+        return '✅' if running else '❌'
+    name = f"{item['qq']}（主账号）" if item['primary'] else item['qq']
+    return (f"{name}  麦麦主程序 {mark(item['core'])} :{item['core_port']}  "
+            f"适配器 {mark(item['adapter'])} :{item['adapter_port']}  NapCat {mark(item['napcat'])}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="管理同时运行的多个QQ账号")
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    add_parser = subparsers.add_parser('add', help="添加账号并分配端口")
+    add_parser.add_argument('qq', help="QQ号")
+    add_parser.add_argument('--mode', choices=PROVISION_MODES, default='hardlink', help="共享代码文件的创建方式")
+    remove_parser = subparsers.add_parser('remove', help="移除账号")
+    remove_parser.add_argument('qq', help="QQ号")
+    remove_parser.add_argument('--delete-files', action='store_true', help="同时删除该账号的目录和数据")
+    subparsers.add_parser('status', help="查看所有账号的运行状态")
+    subparsers.add_parser('sync', help="将其他账号的代码同步到主账号当前的版本")
+    args = parser.parse_args(argv)
+
+    if args.action == 'sync':
+        return 0 if sync_accounts() else 1
+
+    if args.action == 'status':
+        for item in get_accounts_status():
+            print(format_status(item))
+        return 0
+    if args.action == 'remove':
+        if not remove_account(args.qq, args.delete_files):
+            print(f"❌ 账号 {args.qq} 不存在")
+            return 1
+        print(f"✅ 已移除账号 {args.qq}")
+        return 0
+    try:
+        account = add_account(args.qq, args.mode)
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"❌ 添加账号失败: {e}")
+        return 1
+    print(f"✅ 已添加账号 {account['qq']}：适配器端口 {account['adapter_port']}，"
+          f"麦麦主程序端口 {account['core_port']}，目录 {account['dir']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
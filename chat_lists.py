@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+聊天名单模型
+功能：为适配器配置 [chat] 段中的 group_list、private_list、ban_user_id 提供带索引的内存模型
+
+名单以集合保存，成员判断和增删都是O(1)；写回TOML时按数值排序，输出稳定。
+tomlkit 逐个追加数组元素的开销随长度平方增长，这里直接构造数组，几万个号码也能立即写回。
+
+支持从 CSV/TXT/JSON 文件或标准输入批量导入号码（逐行读取并去重），以及按相同格式导出。
+命令行用法：
+- python chat_lists.py import <名单> <文件|->: 导入号码到适配器配置的名单，- 表示标准输入
+- python chat_lists.py export <名单> <文件>: 导出名单
+名单为 group_list、private_list 或 ban_user_id
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+
+from tomlkit.items import Array, Integer, Trivia, Whitespace
+
+# 适配器配置 [chat] 段中的名单字段
+CHAT_LIST_KEYS = ('group_list', 'private_list', 'ban_user_id')
+# 名单预览显示的最大数量
+PREVIEW_LIMIT = 20
+# 支持导入导出的文件格式
+ID_FILE_FORMATS = ('txt', 'csv', 'json')
+# 适配器配置文件
+ADAPTER_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   'modules', 'MaiBot-Napcat-Adapter', 'config.toml')
+
+_ID_SEPARATOR = re.compile(r'[\s,，;；]+')
+
+
+def parse_id(value):
+    """将群号/QQ号转换为整数，无效时返回None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if value > 0 else None
+    value = str(value).strip()
+    # isdigit 会接受 '²' 等 int() 无法转换的字符，只接受十进制数字
+    return int(value) if value.isdecimal() and int(value) > 0 else None
+
+
+def parse_ids(text: str):
+    """解析以空格、逗号或分号分隔的多个号码
+
+    Returns:
+        tuple: (有效号码列表, 无效输入列表)
+    """
+    ids, invalid = [], []
+    for token in _ID_SEPARATOR.split(text.strip()):
+        if not token:
+            continue
+        value = parse_id(token)
+        if value is None:
+            invalid.append(token)
+        else:
+            ids.append(value)
+    return ids, invalid
+
+
+class IdList:
+    """群号/QQ号名单"""
+
+    def __init__(self, ids=()):
+        self._ids = set()
+        self._sorted = None
+        self.add_many(ids)
+        self.dirty = False
+
+    @classmethod
+    def from_config(cls, config, key: str) -> 'IdList':
+        """从配置文档的 [chat] 段读取名单，忽略无法识别的条目"""
+        return cls(config.get('chat', {}).get(key, []))
+
+    def __contains__(self, value) -> bool:
+        return parse_id(value) in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self.sorted())
+
+    def sorted(self) -> list:
+        """按数值排序的名单（结果缓存到下次修改）"""
+        if self._sorted is None:
+            self._sorted = sorted(self._ids)
+        return self._sorted
+
+    def _changed(self) -> None:
+        self._sorted = None
+        self.dirty = True
+
+    def add(self, value) -> bool:
+        """添加号码，已存在或无效时返回False"""
+        value = parse_id(value)
+        if value is None or value in self._ids:
+            return False
+        self._ids.add(value)
+        self._changed()
+        return True
+
+    def remove(self, value) -> bool:
+        """移除号码，不存在时返回False"""
+        value = parse_id(value)
+        if value not in self._ids:
+            return False
+        self._ids.discard(value)
+        self._changed()
+        return True
+
+    def add_many(self, values):
+        """批量添加号码
+
+        Returns:
+            tuple: (新增数量, 重复数量, 无效数量)
+        """
+        added = duplicates = invalid = 0
+        for value in values:
+            value = parse_id(value)
+            if value is None:
+                invalid += 1
+            elif value in self._ids:
+                duplicates += 1
+            else:
+                self._ids.add(value)
+                added += 1
+        if added:
+            self._changed()
+        return added, duplicates, invalid
+
+    def remove_many(self, values):
+        """批量移除号码
+
+        Returns:
+            tuple: (移除数量, 不存在的数量)
+        """
+        removed = missing = 0
+        for value in values:
+            value = parse_id(value)
+            if value in self._ids:
+                self._ids.discard(value)
+                removed += 1
+            else:
+                missing += 1
+        if removed:
+            self._changed()
+        return removed, missing
+
+    def clear(self) -> None:
+        if self._ids:
+            self._ids.clear()
+            self._changed()
+
+    def preview(self, limit: int = PREVIEW_LIMIT) -> str:
+        """名单的简短预览，过长时只显示前limit个"""
+        if not self._ids:
+            return '(空)'
+        ids = self.sorted()
+        if len(ids) <= limit:
+            return str(ids)
+        return f"{ids[:limit]} ... 共 {len(ids)} 个"
+
+    def to_toml_array(self) -> Array:
+        """按数值排序生成TOML数组"""
+        items = []
+        for value in self.sorted():
+            if items:
+                items.append(Whitespace(', '))
+            items.append(Integer(value, Trivia(), str(value)))
+        return Array(items, Trivia())
+
+
+class ChatLists:
+    """适配器配置中的全部聊天名单，修改后通过 sync 写回配置文档"""
+
+    def __init__(self, config):
+        self.config = config
+        self.lists = {key: IdList.from_config(config, key) for key in CHAT_LIST_KEYS}
+
+    def __getitem__(self, key: str) -> IdList:
+        return self.lists[key]
+
+    def sync(self) -> bool:
+        """将修改过的名单写回配置文档
+
+        Returns:
+            bool: 是否有名单被写回
+        """
+        changed = False
+        for key, id_list in self.lists.items():
+            if id_list.dirty:
+                if 'chat' not in self.config:
+                    self.config['chat'] = {}
+                self.config['chat'][key] = id_list.to_toml_array()
+                id_list.dirty = False
+                changed = True
+        return changed
+
+
+def get_file_format(path: str) -> str:
+    """根据扩展名判断号码文件格式，无法识别时按TXT处理"""
+    suffix = os.path.splitext(str(path))[1].lower().lstrip('.')
+    return suffix if suffix in ID_FILE_FORMATS else 'txt'
+
+
+def iter_ids_from_stream(stream, file_format: str = 'txt', key: str = None):
+    """从文本流逐个读取号码（未校验的原始值）
+
+    TXT 每行可包含多个以空格、逗号或分号分隔的号码，# 开头的行为注释；
+    CSV 读取每个单元格，首行全部不是数字时视为表头跳过；
+    JSON 支持号码数组，或以名单字段为键的对象（如 {"group_list": [...]}）。
+    """
+    if file_format == 'json':
+        # JSON 无法逐行解析，整体读取（几万个号码也只有几百KB）
+        data = json.load(stream)
+        if isinstance(data, dict):
+            data = data.get(key, []) if key else [value for values in data.values() for value in values]
+        yield from data
+    elif file_format == 'csv':
+        for row_number, row in enumerate(csv.reader(stream)):
+            cells = [cell.strip() for cell in row if cell.strip()]
+            if row_number == 0 and cells and all(parse_id(cell) is None for cell in cells):
+                continue
+            yield from cells
+    else:
+        for line in stream:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            yield from (token for token in _ID_SEPARATOR.split(line) if token)
+
+
+def import_ids(id_list: IdList, source: str, key: str = None):
+    """从文件或标准输入（source为 -）批量导入号码，重复和无效的号码会被跳过
+
+    Returns:
+        tuple: (新增数量, 重复数量, 无效数量)
+    """
+    if source == '-':
+        return id_list.add_many(iter_ids_from_stream(sys.stdin, 'txt', key))
+    file_format = get_file_format(source)
+    # utf-8-sig 兼容 Excel 导出的带BOM的CSV
+    with open(source, 'r', encoding='utf-8-sig', newline='') as f:
+        return id_list.add_many(iter_ids_from_stream(f, file_format, key))
+
+
+def export_ids(id_list: IdList, path: str, key: str = None) -> int:
+    """按扩展名对应的格式导出名单
+
+    Returns:
+        int: 导出的号码数量
+    """
+    file_format = get_file_format(path)
+    ids = id_list.sorted()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if file_format == 'json':
+            json.dump({key: ids} if key else ids, f, ensure_ascii=False)
+        elif file_format == 'csv':
+            writer = csv.writer(f)
+            writer.writerow([key or 'id'])
+            writer.writerows([value] for value in ids)
+        else:
+            f.writelines(f"{value}\n" for value in ids)
+    return len(ids)
+
+
+def format_import_summary(added: int, duplicates: int, invalid: int) -> str:
+    return f"新增 {added} 个，重复 {duplicates} 个，无效 {invalid} 个"
+
+
+def main(argv=None) -> int:
+    """命令行批量导入导出适配器配置中的名单"""
+    from config_store import config_store
+
+    parser = argparse.ArgumentParser(description="批量导入导出适配器配置中的聊天名单")
+    parser.add_argument('action', choices=['import', 'export'], help="导入或导出")
+    parser.add_argument('list_key', choices=CHAT_LIST_KEYS, help="名单字段")
+    parser.add_argument('path', help="CSV/TXT/JSON 文件路径，导入时 - 表示标准输入")
+    parser.add_argument('--config', default=ADAPTER_CONFIG_PATH, help="适配器配置文件路径")
+    args = parser.parse_args(argv)
+
+    try:
+        config = config_store.load_toml(args.config)
+    except Exception as e:
+        print(f"❌ 读取配置文件失败: {e}")
+        return 1
+    lists = ChatLists(config)
+
+    if args.action == 'export':
+        count = export_ids(lists[args.list_key], args.path, args.list_key)
+        print(f"✅ 已导出 {count} 个号码到: {args.path}")
+        return 0
+
+    try:
+        added, duplicates, invalid = import_ids(lists[args.list_key], args.path, args.list_key)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"❌ 导入失败: {e}")
+        return 1
+    if lists.sync():
+        config_store.save_toml(args.config, config)
+    print(f"✅ 导入完成：{format_import_summary(added, duplicates, invalid)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,16 @@
+import argparse
 import os
 import shutil
+import sys
+import time
 import tomlkit
-from dotenv import dotenv_values
+
+from chat_lists import ChatLists, IdList, export_ids, format_import_summary, import_ids
+from config_merge import MERGE_TARGETS
+from config_snapshots import SHORT_HASH_LENGTH, snapshot_file
+from config_store import config_store
+from config_validator import check_value_type
+from env_document import EnvDocument
 
 try:
     from modules.MaiBot.src.common.logger import get_logger
@@ -14,10 +23,12 @@ except ImportError:
 # 配置文件路径
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_PATH = os.path.join(BASE_DIR, "modules", "MaiBot", "config", "bot_config.toml")
-CONFIG_BACKUP_PATH = f"{CONFIG_PATH}.bak"
 LPMM_CONFIG_PATH = os.path.join(BASE_DIR, "modules", "MaiBot", "config", "lpmm_config.toml")
-LPMM_BACKUP_PATH = f"{LPMM_CONFIG_PATH}.bak"
 NAPCAT_CONFIG_PATH = os.path.join(BASE_DIR, "modules", "MaiBot-Napcat-Adapter", "config.toml")
+ENV_PATH = os.path.join(BASE_DIR, "modules", "MaiBot", ".env")
+CHAT_MODES = ['normal', 'focus', 'auto']
+# 声明式配置文件中 [wizard] 段支持的字段（对应配置向导的步骤）
+WIZARD_KEYS = ('api_key', 'groups', 'recommended_defaults')
 
 def get_absolute_path(relative_path: str) -> str:
     """获取绝对路径
@@ -166,20 +177,12 @@ def get_text_input(prompt, default="", required=False):
         return user_input
 
 def backup_config():
-    """备份配置文件"""
+    """为配置文件保存快照（内容未变化时不会重复保存）"""
     try:
-        if os.path.exists(CONFIG_PATH) and not os.path.exists(CONFIG_BACKUP_PATH):
-            os.makedirs(os.path.dirname(CONFIG_PATH), exist_ok=True)
-            shutil.copy(CONFIG_PATH, CONFIG_BACKUP_PATH)
-            logger.info(f"已创建配置文件备份：{CONFIG_BACKUP_PATH}")
-        else:
-            logger.info("配置备份文件已存在，跳过备份")
-        if os.path.exists(LPMM_CONFIG_PATH) and not os.path.exists(LPMM_BACKUP_PATH):
-            os.makedirs(os.path.dirname(LPMM_CONFIG_PATH), exist_ok=True)
-            shutil.copy(LPMM_CONFIG_PATH, LPMM_BACKUP_PATH)
-            logger.info(f"已创建LPMM配置文件备份：{LPMM_BACKUP_PATH}")
-        else:
-            logger.info("LPMM配置备份文件已存在，跳过备份")
+        for path in (CONFIG_PATH, LPMM_CONFIG_PATH):
+            content_hash = snapshot_file(path, reason='配置向导开始前')
+            if content_hash:
+                logger.info(f"已保存配置快照：{os.path.basename(path)} @ {content_hash[:SHORT_HASH_LENGTH]}")
     except Exception as e:
         logger.error(f"备份失败: {str(e)}")
         raise
@@ -199,8 +202,7 @@ def load_config():
                 logger.error(f"找不到配置文件和模板文件 {CONFIG_PATH}")
                 raise FileNotFoundError(f"配置文件 {CONFIG_PATH} 未找到")
         
-        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-            return tomlkit.load(f)
+        return config_store.load_toml(CONFIG_PATH)
             
     except tomlkit.exceptions.TOMLKitError as e:
         logger.error(f"配置文件格式错误: {str(e)}")
@@ -212,9 +214,7 @@ def load_config():
 def save_config(config):
     """保存配置文件"""
     try:
-        os.makedirs(os.path.dirname(CONFIG_PATH), exist_ok=True)
-        with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-            tomlkit.dump(config, f)
+        config_store.save_toml(CONFIG_PATH, config)
         logger.info("配置文件已保存")
     except Exception as e:
         logger.error(f"保存配置失败: {str(e)}")
@@ -235,8 +235,7 @@ def ensure_lpmm_config_exists():
             basic_config = tomlkit.document()
             basic_config["info_extraction"] = {"workers": 10}
             basic_config["llm_providers"] = []
-            with open(LPMM_CONFIG_PATH, "w", encoding="utf-8") as f:
-                tomlkit.dump(basic_config, f)
+            config_store.save_toml(LPMM_CONFIG_PATH, basic_config)
             logger.info(f"已创建基本LPMM配置文件: {LPMM_CONFIG_PATH}")
 
 def step_basic_info(config):
@@ -397,7 +396,7 @@ def step_chat_mode(config):
     while True:
         mode = input("请选择聊天模式 [normal/focus/auto]（默认：normal）：").strip().lower() or 'normal'
         
-        if mode in ['normal', 'focus', 'auto']:
+        if mode in CHAT_MODES:
             chat['chat_mode'] = mode
             break
         else:
@@ -462,8 +461,7 @@ def step_groups(config):
     current_groups = []
     try:
         if os.path.exists(NAPCAT_CONFIG_PATH):
-            with open(NAPCAT_CONFIG_PATH, "r", encoding="utf-8") as f:
-                napcat_config = tomlkit.load(f)
+            napcat_config = config_store.load_toml(NAPCAT_CONFIG_PATH)
             current_groups = napcat_config.get('chat', {}).get('group_list', [])
     except Exception as e:
         logger.warning(f"无法读取适配器配置: {str(e)}")
@@ -478,14 +476,10 @@ def step_groups(config):
         # 更新 MaiBot-Napcat-Adapter 配置
         try:
             if os.path.exists(NAPCAT_CONFIG_PATH):
-                with open(NAPCAT_CONFIG_PATH, "r", encoding="utf-8") as f:
-                    napcat_config = tomlkit.load(f)
-                
-                chat_config = napcat_config.setdefault('chat', {})
-                chat_config['group_list'] = groups
+                napcat_config = config_store.load_toml(NAPCAT_CONFIG_PATH)
                 
-                with open(NAPCAT_CONFIG_PATH, "w", encoding="utf-8") as f:
-                    tomlkit.dump(napcat_config, f)
+                set_group_list(napcat_config, groups)
+                config_store.save_toml(NAPCAT_CONFIG_PATH, napcat_config)
                 logger.info("已配置群组到MaiBot-Napcat-Adapter")
                 print(f"已配置 {len(groups)} 个群聊")
             else:
@@ -497,6 +491,32 @@ def step_groups(config):
     
     return config
 
+def set_group_list(napcat_config, groups):
+    """设置适配器配置中可发消息的群聊"""
+    # 通过名单模型写回，几千个群号时也不会因逐个追加数组元素而变慢
+    lists = ChatLists(napcat_config)
+    lists['group_list'].clear()
+    lists['group_list'].add_many(groups)
+    lists.sync()
+
+def set_api_key(env_document, lpmm_data, new_key):
+    """将 SiliconFlow API密钥写入 .env 文档，并同步到 LPMM 配置的 siliconflow 提供商"""
+    env_document.set("SILICONFLOW_KEY", new_key)
+    
+    providers = lpmm_data.setdefault("llm_providers", [])
+    
+    # 更新或添加 SiliconFlow 提供商
+    for provider in providers:
+        if provider.get("name") == "siliconflow":
+            provider["api_key"] = new_key
+            return
+    
+    providers.append({
+        "name": "siliconflow",
+        "base_url": "https://api.siliconflow.cn/v1/",
+        "api_key": new_key
+    })
+
 def step_api_key(config):
     """配置API密钥"""
     print("\n=== 第7步：配置API密钥 ===")
@@ -504,7 +524,7 @@ def step_api_key(config):
     print("这是必需的，机器人需要API密钥才能正常工作")
     
     env_path = os.path.join(BASE_DIR, "modules", "MaiBot", ".env")
-    current_env = dotenv_values(env_path) if os.path.exists(env_path) else {}
+    current_env = config_store.load_env_document(env_path) if os.path.exists(env_path) else EnvDocument()
     current_key = current_env.get("SILICONFLOW_KEY", "")
     
     if current_key:
@@ -520,59 +540,77 @@ def step_api_key(config):
             env_dir = os.path.dirname(env_path)
             os.makedirs(env_dir, exist_ok=True)
             
-            env_lines = []
-            if os.path.exists(env_path):
-                with open(env_path, "r", encoding="utf-8") as f:
-                    env_lines = f.readlines()
-            
-            # 更新或添加 API 密钥
-            found = False
-            for i, line in enumerate(env_lines):
-                if line.startswith("SILICONFLOW_KEY="):
-                    env_lines[i] = f"SILICONFLOW_KEY={new_key}\n"
-                    found = True
-                    break
-            
-            if not found:
-                env_lines.append(f"\nSILICONFLOW_KEY={new_key}\n")
-            
-            with open(env_path, "w", encoding="utf-8") as f:
-                f.writelines(env_lines)
-            
-            # 同步到 LPMM 配置
+            env_document = config_store.load_env_document(env_path) if os.path.exists(env_path) else EnvDocument()
             ensure_lpmm_config_exists()
-            with open(LPMM_CONFIG_PATH, "r", encoding="utf-8") as f:
-                lpmm_data = tomlkit.load(f)
-            
-            providers = lpmm_data.setdefault("llm_providers", [])
-            
-            # 更新或添加 SiliconFlow 提供商
-            updated = False
-            for provider in providers:
-                if provider.get("name") == "siliconflow":
-                    provider["api_key"] = new_key
-                    updated = True
-                    break
+            lpmm_data = config_store.load_toml(LPMM_CONFIG_PATH)
             
-            if not updated:
-                providers.append({
-                    "name": "siliconflow",
-                    "base_url": "https://api.siliconflow.cn/v1/",
-                    "api_key": new_key
-                })
+            set_api_key(env_document, lpmm_data, new_key)
             
-            with open(LPMM_CONFIG_PATH, "w", encoding="utf-8") as f:
-                tomlkit.dump(lpmm_data, f)
+            config_store.save_env_document(env_path, env_document)
+            config_store.save_toml(LPMM_CONFIG_PATH, lpmm_data)
             
             logger.info("API密钥配置成功")
             print("API密钥配置成功")
             
         except Exception as e:
+            # 丢弃缓存中未写入成功的修改
+            config_store.invalidate(env_path)
+            config_store.invalidate(LPMM_CONFIG_PATH)
             logger.error(f"API密钥配置失败: {str(e)}")
             print(f"API密钥配置失败: {str(e)}")
     
     return config
 
+def apply_recommended_defaults(config):
+    """为未配置的高级设置填入推荐默认值（已有的配置保持不变）"""
+    config.setdefault('emoji', {
+        'max_reg_num': 60,
+        'do_replace': True,
+        'steal_emoji': True,
+        'check_interval': 10
+    })
+
+    config.setdefault('memory', {'enable_memory': True})
+    config.setdefault('relationship', {'enable_relationship': True})
+    config.setdefault('lpmm_knowledge', {'enable': True})
+    config.setdefault('chinese_typo', {'enable': True})
+    config.setdefault('response_post_process', {'enable_response_post_process': True})
+    config.setdefault('mood', {'enable_mood': False})  # 新功能默认关闭
+    config.setdefault('keyword_reaction', {'enable': False})  # 新功能默认关闭
+    config.setdefault('experimental', {
+        'enable_friend_chat': False,
+        'debug_show_chat_mode': False
+    })
+
+    # 新增配置项默认值
+    config.setdefault('message_receive', {
+        'enable_at_filter': True,
+        'enable_keyword_filter': False
+    })
+
+    config.setdefault('focus_chat_processor', {
+        'enable_processor': True,
+        'processor_threshold': 0.8
+    })
+
+    config.setdefault('response_splitter', {
+        'enable_split': True,
+        'max_length': 500,
+        'split_strategy': 'smart'
+    })
+
+    config.setdefault('model', {
+        'default_model': 'Qwen/Qwen2.5-7B-Instruct',
+        'temperature': 0.7,
+        'max_tokens': 2048
+    })
+
+    config.setdefault('log', {
+        'level': 'INFO',
+        'enable_file_log': True,
+        'max_log_files': 10
+    })
+
 def step_advanced_settings(config):
     """高级设置（可选）"""
     print("\n=== 第8步：高级设置（可选）===")
@@ -580,55 +618,7 @@ def step_advanced_settings(config):
     if not get_yes_no_input("是否配置高级设置", False):
         print("跳过高级设置，使用推荐默认配置")
         
-        # 设置新版本重要的默认值
-        config.setdefault('emoji', {
-            'max_reg_num': 60,
-            'do_replace': True,
-            'steal_emoji': True,
-            'check_interval': 10
-        })
-        
-        config.setdefault('memory', {'enable_memory': True})
-        config.setdefault('relationship', {'enable_relationship': True})
-        config.setdefault('lpmm_knowledge', {'enable': True})
-        config.setdefault('chinese_typo', {'enable': True})
-        config.setdefault('response_post_process', {'enable_response_post_process': True})
-        config.setdefault('mood', {'enable_mood': False})  # 新功能默认关闭
-        config.setdefault('keyword_reaction', {'enable': False})  # 新功能默认关闭
-        config.setdefault('experimental', {
-            'enable_friend_chat': False,
-            'debug_show_chat_mode': False
-        })
-        
-        # 新增配置项默认值
-        config.setdefault('message_receive', {
-            'enable_at_filter': True,
-            'enable_keyword_filter': False
-        })
-        
-        config.setdefault('focus_chat_processor', {
-            'enable_processor': True,
-            'processor_threshold': 0.8
-        })
-        
-        config.setdefault('response_splitter', {
-            'enable_split': True,
-            'max_length': 500,
-            'split_strategy': 'smart'
-        })
-        
-        config.setdefault('model', {
-            'default_model': 'Qwen/Qwen2.5-7B-Instruct',
-            'temperature': 0.7,
-            'max_tokens': 2048
-        })
-        
-        config.setdefault('log', {
-            'level': 'INFO',
-            'enable_file_log': True,
-            'max_log_files': 10
-        })
-        
+        apply_recommended_defaults(config)
         return config
     
     print("\n配置表情包设置：")
@@ -808,15 +798,35 @@ def get_group_list_input(prompt, current_list=None):
     print("  • 输入 'a' 或 'add' - 添加群聊")
     print("  • 输入 'd' 或 'del' - 删除群聊")
     print("  • 输入 'l' 或 'list' - 查看当前群聊")
+    print("  • 输入 'i' 或 'import' - 从CSV/TXT/JSON文件批量导入群聊")
+    print("  • 输入 'e' 或 'export' - 导出群聊列表到文件")
     print("  • 直接回车 - 完成配置")
     print("  • 输入 'help' - 显示帮助")
     
     while True:
         try:
-            command = input("\n请选择操作 [a添加/d删除/l查看/回车完成]: ").strip().lower()
+            command = input("\n请选择操作 [a添加/d删除/l查看/i导入/e导出/回车完成]: ").strip().lower()
             
             if not command:
                 break
+            
+            elif command in ['i', 'import', '导入']:
+                path = input("请输入文件路径（CSV/TXT/JSON）: ").strip().strip('"')
+                if not os.path.isfile(path):
+                    print(f"文件不存在: {path}")
+                    continue
+                # 以已有群聊建立索引，导入时逐行去重，保持已有群聊的顺序
+                id_list = IdList(result_list)
+                before = set(id_list.sorted())
+                added, duplicates, invalid = import_ids(id_list, path, 'group_list')
+                result_list.extend(group_id for group_id in id_list.sorted() if group_id not in before)
+                print(f"导入完成：{format_import_summary(added, duplicates, invalid)}，当前共 {len(result_list)} 个群聊")
+            
+            elif command in ['e', 'export', '导出']:
+                path = input("请输入导出文件路径（.txt/.csv/.json）: ").strip().strip('"')
+                if path:
+                    count = export_ids(IdList(result_list), path, 'group_list')
+                    print(f"已导出 {count} 个群聊到: {os.path.abspath(path)}")
                 
             elif command in ['a', 'add', '添加']:
                 group_input = input("请输入群号: ").strip()
@@ -866,6 +876,8 @@ def get_group_list_input(prompt, current_list=None):
                 print("  • a/add/添加 - 添加新的群聊")
                 print("  • d/del/删除 - 删除现有群聊")
                 print("  • l/list/查看 - 查看当前所有群聊")
+                print("  • i/import/导入 - 从CSV/TXT/JSON文件批量导入群聊")
+                print("  • e/export/导出 - 导出群聊列表到文件")
                 print("  • 直接回车 - 完成群聊配置")
                 
             else:
@@ -879,6 +891,155 @@ def get_group_list_input(prompt, current_list=None):
     
     return result_list
 
+def merge_profile_values(document, values, template, path=(), errors=None):
+    """将声明式配置中的值深度合并到配置文档，并按模板检查类型
+
+    Returns:
+        list: 类型错误信息
+    """
+    if errors is None:
+        errors = []
+    for key, value in values.items():
+        key_path = '.'.join(path + (key,))
+        expected = template.get(key) if isinstance(template, dict) else None
+        if expected is not None and check_value_type(expected, value) == 'error':
+            errors.append(f"{key_path} 类型错误：应与模板中的 {expected!r} 类型一致，实际为 {value!r}")
+            continue
+        if isinstance(value, dict) and isinstance(document.get(key), dict):
+            merge_profile_values(document[key], value, expected, path + (key,), errors)
+        else:
+            document[key] = value
+    return errors
+
+def _load_template(target):
+    if not os.path.exists(target['template']):
+        return {}
+    with open(target['template'], 'r', encoding='utf-8') as f:
+        return tomlkit.parse(f.read()).unwrap()
+
+def _validate_bot_config(config):
+    """检查配置向导中会校验的字段"""
+    errors = []
+    qq_account = config.get('bot', {}).get('qq_account')
+    if qq_account is not None and not str(qq_account).isdigit():
+        errors.append(f"bot.qq_account 必须是数字，实际为 {qq_account!r}")
+    chat_mode = config.get('chat', {}).get('chat_mode')
+    if chat_mode is not None and chat_mode not in CHAT_MODES:
+        errors.append(f"chat.chat_mode 必须是 {'/'.join(CHAT_MODES)} 之一，实际为 {chat_mode!r}")
+    return errors
+
+def apply_profile(profile_path):
+    """非交互地应用声明式配置文件
+    
+    配置文件的 [bot_config]、[lpmm_config]、[adapter_config] 段按对应配置文件的结构深度合并，
+    [env] 段写入 .env，[wizard] 段复用配置向导的步骤：
+    api_key（第7步，写入 .env 并同步到 LPMM）、groups（第6步，可发消息的群聊）、
+    recommended_defaults（第8步，填入推荐的高级设置默认值）。
+    
+    所有改动校验通过后才写入，任何一个文件写入失败时回滚已写入的文件。
+    
+    Returns:
+        bool: 是否应用成功
+    """
+    start_time = time.perf_counter()
+    try:
+        with open(profile_path, 'r', encoding='utf-8') as f:
+            profile = tomlkit.parse(f.read()).unwrap()
+    except (OSError, tomlkit.exceptions.TOMLKitError) as e:
+        print(f"读取声明式配置失败: {e}")
+        return False
+    
+    targets = {target['key']: target for target in MERGE_TARGETS}
+    errors = [f"未知的配置段 [{section}]" for section in profile
+              if section not in targets and section not in ('env', 'wizard')]
+    wizard = profile.get('wizard', {})
+    errors.extend(f"未知的 [wizard] 字段 {key}" for key in wizard if key not in WIZARD_KEYS)
+    if errors:
+        for message in errors:
+            print(f"错误: {message}")
+        return False
+    
+    check_and_create_config_files()
+    ensure_lpmm_config_exists()
+    
+    # 读取所有需要修改的文档
+    documents = {}
+    paths = {key: target['path'] for key, target in targets.items()}
+    paths['env'] = ENV_PATH
+    try:
+        for key, target in targets.items():
+            if key in profile or (key == 'bot_config' and wizard.get('recommended_defaults')) \
+                    or (key == 'lpmm_config' and 'api_key' in wizard) \
+                    or (key == 'adapter_config' and 'groups' in wizard):
+                documents[key] = config_store.load_toml(target['path'])
+        if 'env' in profile or 'api_key' in wizard:
+            documents['env'] = config_store.load_env_document(ENV_PATH) if os.path.exists(ENV_PATH) else EnvDocument()
+    except (OSError, tomlkit.exceptions.TOMLKitError) as e:
+        print(f"读取配置文件失败: {e}")
+        return False
+    
+    def discard():
+        for key in documents:
+            config_store.invalidate(paths[key])
+    
+    # 在内存中应用全部修改
+    try:
+        for key, target in targets.items():
+            if key in profile:
+                errors.extend(f"[{key}] {message}" for message in
+                              merge_profile_values(documents[key], profile[key], _load_template(target)))
+        for name, value in profile.get('env', {}).items():
+            documents['env'].set(name, value if isinstance(value, str) else str(value))
+        if 'api_key' in wizard:
+            set_api_key(documents['env'], documents['lpmm_config'], str(wizard['api_key']))
+        if 'groups' in wizard:
+            set_group_list(documents['adapter_config'], wizard['groups'])
+        if wizard.get('recommended_defaults'):
+            apply_recommended_defaults(documents['bot_config'])
+        if 'bot_config' in documents:
+            errors.extend(f"[bot_config] {message}" for message in _validate_bot_config(documents['bot_config']))
+    except Exception as e:
+        errors.append(str(e))
+    
+    if errors:
+        discard()
+        for message in errors:
+            print(f"错误: {message}")
+        print("声明式配置未应用，配置文件没有任何改动")
+        return False
+    
+    # 序列化后统一写入，失败时恢复已写入的文件
+    texts = {key: document.dumps() if key == 'env' else tomlkit.dumps(document)
+             for key, document in documents.items()}
+    originals = {}
+    for key in texts:
+        try:
+            with open(paths[key], 'r', encoding='utf-8') as f:
+                originals[key] = f.read()
+        except OSError:
+            originals[key] = None
+    written = []
+    try:
+        for key, text in texts.items():
+            if config_store.save_text(paths[key], text):
+                written.append(key)
+    except Exception as e:
+        for written_key in written:
+            if originals[written_key] is None:
+                os.remove(paths[written_key])
+            else:
+                config_store.save_text(paths[written_key], originals[written_key])
+        discard()
+        print(f"写入 {paths[key]} 失败，已回滚: {e}")
+        return False
+    discard()
+    
+    elapsed = time.perf_counter() - start_time
+    print(f"已应用声明式配置 {profile_path}：修改了 {len(written)} 个配置文件，用时 {elapsed:.3f} 秒")
+    for key in written:
+        print(f"  {paths[key]}")
+    return True
+
 def main():
     """主配置流程"""
     try:
@@ -921,4 +1082,9 @@ def main():
         print("请检查错误信息或寻求帮助")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MaiBot 配置向导")
+    parser.add_argument('--apply', metavar='PROFILE', help="非交互地应用声明式配置文件（TOML）")
+    args = parser.parse_args()
+    if args.apply:
+        sys.exit(0 if apply_profile(args.apply) else 1)
     main()
@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+"""
+配置模板三方合并
+功能：上游更新配置模板后，把新增的配置项合并到用户已有的配置文件中
+
+以上一次合并时的模板为基准（旧模板），对比新模板和用户配置：
+- 新模板新增、用户配置缺少的配置项：从新模板添加到与新模板相同的位置（连同上方的注释、空行和行尾注释）
+- 用户未修改过（与旧模板相同）而新模板改了默认值的配置项：更新为新默认值
+- 用户未修改过而新模板删除的配置项：删除；整个表（如 [[model.x]]）被删除时保留并提示，由用户确认后手动删除
+- 用户修改过、新模板也改动了的配置项：保留用户的值，报告为冲突
+首次合并时没有旧模板，只添加缺少的配置项，不改动用户已有的值。
+配置文件格式版本（inner.version）同样按上述规则处理，用户改过的版本号不会被覆盖，而是报告为冲突。
+
+合并只修改用户配置中需要变化的配置项，其余内容和注释保持原样。
+模板和配置文件都未变化时直接跳过，每次启动运行也几乎没有开销。
+"""
+
+import copy
+import hashlib
+import json
+import os
+import shutil
+
+import tomlkit
+from tomlkit.items import AoT, Comment, Null, Table, Whitespace
+
+from config_store import atomic_write_text, config_store
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 上一次合并时使用的模板副本，作为下一次三方合并的基准
+TEMPLATE_BASE_DIR = os.path.join(BASE_DIR, 'runtime', 'config_templates')
+# 合并状态（模板和配置文件的哈希），两者都未变化时跳过合并
+MERGE_STATE_PATH = os.path.join(BASE_DIR, 'runtime', 'config_merge_state.json')
+
+# 需要合并的配置文件
+MERGE_TARGETS = [
+    {
+        'name': 'MaiBot主配置文件',
+        'key': 'bot_config',
+        'path': os.path.join(BASE_DIR, 'modules', 'MaiBot', 'config', 'bot_config.toml'),
+        'template': os.path.join(BASE_DIR, 'modules', 'MaiBot', 'template', 'bot_config_template.toml'),
+    },
+    {
+        'name': 'MaiBot-LPMM配置文件',
+        'key': 'lpmm_config',
+        'path': os.path.join(BASE_DIR, 'modules', 'MaiBot', 'config', 'lpmm_config.toml'),
+        'template': os.path.join(BASE_DIR, 'modules', 'MaiBot', 'template', 'lpmm_config_template.toml'),
+    },
+    {
+        'name': 'NapCat适配器配置文件',
+        'key': 'adapter_config',
+        'path': os.path.join(BASE_DIR, 'modules', 'MaiBot-Napcat-Adapter', 'config.toml'),
+        'template': os.path.join(BASE_DIR, 'modules', 'MaiBot-Napcat-Adapter', 'template.toml'),
+    },
+]
+
+
+def _plain(value):
+    """将tomlkit对象转换为普通Python值，用于比较"""
+    return value.unwrap() if hasattr(value, 'unwrap') else value
+
+
+def _is_table(value) -> bool:
+    return isinstance(value, dict)
+
+
+def _format_path(path) -> str:
+    return '.'.join(path)
+
+
+def _is_section(value) -> bool:
+    return isinstance(value, (Table, AoT))
+
+
+def _body(container) -> list:
+    """表或文档的条目列表 [(键或None, 值)]，数组表取最后一个表"""
+    if isinstance(container, AoT):
+        container = container.body[-1]
+    return container.value.body if isinstance(container, Table) else container.body
+
+
+def _trailing_start(body, end=None) -> int:
+    """body[:end] 末尾连续的注释和空行的起始位置"""
+    start = len(body) if end is None else end
+    while start > 0 and body[start - 1][0] is None and isinstance(body[start - 1][1], (Comment, Whitespace, Null)):
+        start -= 1
+    return start
+
+
+def _tail_body(section) -> list:
+    """表的末尾所在的条目列表：表以子表结尾时，其后的注释和空行在最后一个子表中"""
+    body = _body(section)
+    start = _trailing_start(body)
+    while start > 0 and _is_section(body[start - 1][1]) and all(isinstance(item, Null) for _, item in body[start:]):
+        body = _body(body[start - 1][1])
+        start = _trailing_start(body)
+    return body
+
+
+def _take_trailing(section) -> list:
+    """取出表末尾的注释和空行（在 tomlkit 中它们属于该表，实际是下一个表头上方的内容）"""
+    body = _tail_body(section)
+    start = _trailing_start(body)
+    trailing = body[start:]
+    del body[start:]
+    return trailing
+
+
+def _leading_text(container, key) -> str:
+    """新模板中配置项上方的注释和空行
+
+    表头上方的注释和空行在 tomlkit 中属于上一个表的末尾，添加表时从上一个表中取。
+    """
+    body = _body(container)
+    index = next((i for i, (item_key, _) in enumerate(body) if item_key is not None and item_key.key == key), None)
+    if index is None:
+        return ''
+    start = _trailing_start(body, index)
+    leading = body[start:index]
+    if start == index > 0 and _is_section(body[index][1]) and _is_section(body[index - 1][1]):
+        previous = _tail_body(body[index - 1][1])
+        leading = previous[_trailing_start(previous):]
+    return ''.join(item.as_string() for _, item in leading)
+
+
+def _first_header(section):
+    """表头实际输出的第一个表：数组表取第一个表，只含子表的父表（不输出表头）取第一个子表"""
+    while True:
+        if isinstance(section, AoT):
+            section = section.body[0]
+            continue
+        children = [item for _, item in section.value.body if not isinstance(item, (Whitespace, Null))]
+        if section.is_super_table() and children and all(_is_section(item) for item in children):
+            section = children[0]
+            continue
+        return section
+
+
+def _key_index(body, key) -> int:
+    """配置项在条目列表中的位置（数组表等分成多段时取最后一段）"""
+    return max(i for i, (item_key, _) in enumerate(body) if item_key is not None and item_key.key == key)
+
+
+def _match_comments(entries, text: str) -> int:
+    """entries 开头的若干条注释和空行拼接后以 text 结尾（优先完全相同，其次忽略首尾空行）时返回条目数，否则返回0"""
+    prefixes = []
+    joined = ''
+    for _, value in entries:
+        joined += value.as_string()
+        prefixes.append(joined)
+    for matches in (lambda prefix: prefix.endswith(text), lambda prefix: prefix.strip().endswith(text.strip())):
+        count = next((count for count, prefix in enumerate(prefixes, 1) if matches(prefix)), 0)
+        if count:
+            return count
+    return 0
+
+
+def _add_item(template, container, key) -> None:
+    """将新模板中的配置项按新模板的布局添加到用户配置中
+
+    配置项放在新模板中排在它前面、用户配置中也有的同类配置项（普通配置项或表）之后，没有时放在同类配置项最前面，
+    并带上新模板中其上方的注释和空行。添加表时，原本位于插入位置的注释和空行（属于后面的表头）移到新表末尾。
+    """
+    item = copy.deepcopy(template.item(key))
+    is_section = _is_section(item)
+    body = _body(container)
+    keys = list(template.keys())
+    previous = next((name for name in reversed(keys[:keys.index(key)])
+                     if name in container and _is_section(container.item(name)) == is_section), None)
+
+    # 添加的表末尾的内容，None 表示沿用新模板中该表末尾的空行
+    trailing = []
+    if previous is not None:
+        index = _key_index(body, previous) + 1
+        if is_section:
+            trailing = _take_trailing(container.item(previous))
+    else:
+        first = next((i for i, (item_key, value) in enumerate(body)
+                      if item_key is not None and _is_section(value) == is_section), None)
+        if first is not None:
+            index = first
+            # 同类配置项上方的注释属于它本身，插在注释之前
+            while index > 0 and body[index - 1][0] is None and isinstance(body[index - 1][1], Comment):
+                index -= 1
+            trailing = None
+        elif is_section:
+            # 没有表时放在末尾
+            index = _trailing_start(body)
+            trailing = body[index:]
+            del body[index:]
+        else:
+            # 没有普通配置项时放在所有表（及其上方的注释和空行）之前
+            first = next((i for i, (item_key, value) in enumerate(body)
+                          if item_key is not None and _is_section(value)), len(body))
+            index = _trailing_start(body, first)
+
+    leading = _leading_text(template, key)
+    if leading.strip():
+        # 插入位置附近已有同样的注释（如用户删除配置项时留下的注释、文件开头的说明）时不重复添加
+        start = _trailing_start(body, index)
+        end = next((i for i in range(index, len(body)) if body[i][0] is not None), len(body))
+        count = _match_comments(body[start:end], leading)
+        if count:
+            index, leading = start + count, ''
+        elif trailing:
+            trailing = trailing[_match_comments(trailing, leading):]
+
+    if is_section:
+        # 新模板中表末尾的注释和空行属于新模板中的下一个表，换成插入位置原有的内容
+        own = _take_trailing(item)
+        if trailing is None:
+            trailing = []
+            for entry in own:
+                if isinstance(entry[1], Comment):
+                    break
+                trailing.append(entry)
+        _tail_body(item).extend(trailing)
+    header = _first_header(item) if is_section else item
+    header.trivia.indent = leading + header.trivia.indent
+
+    if index >= len(body):
+        container[key] = item
+    else:
+        (container.value if isinstance(container, Table) else container)._insert_at(index, key, item)
+        if isinstance(container, Table):
+            dict.__setitem__(container, key, item)
+
+
+def merge_documents(base, new, user, path=(), result=None):
+    """对 base（旧模板）、new（新模板）和 user（用户配置）进行三方合并，直接修改 user
+
+    base 为None时只添加缺少的配置项。添加和更新的配置项从新模板复制原始的tomlkit对象，保留行尾注释；
+    添加的配置项放在与新模板相同的位置，并带上新模板中其上方的注释和空行。
+
+    Returns:
+        dict: {'added': [...], 'updated': [...], 'removed': [...], 'conflicts': [(配置项, 原因)]}
+    """
+    if result is None:
+        result = {'added': [], 'updated': [], 'removed': [], 'conflicts': []}
+
+    for key, new_value in new.items():
+        key_path = path + (key,)
+        base_value = base.get(key) if base is not None else None
+        if key not in user:
+            # 新模板新增的配置项，或用户删掉的必需项
+            _add_item(new, user, key)
+            result['added'].append(_format_path(key_path))
+            continue
+
+        user_value = user[key]
+        if _is_table(new_value) and _is_table(user_value):
+            merge_documents(base_value if _is_table(base_value) else None, new_value, user_value, key_path, result)
+            continue
+
+        if base is None or key not in base:
+            # 没有基准无法判断用户是否修改过，保留用户的值
+            continue
+
+        plain_base, plain_new, plain_user = _plain(base_value), _plain(new_value), _plain(user_value)
+        if plain_new == plain_base or plain_user == plain_new:
+            continue
+        if plain_user == plain_base:
+            # 用户未修改过，跟随新模板的默认值
+            user[key] = copy.deepcopy(new.item(key))
+            result['updated'].append(_format_path(key_path))
+        else:
+            result['conflicts'].append((_format_path(key_path), "模板默认值已变化，但你修改过此配置项，已保留你的值"))
+
+    if base is not None:
+        for key in list(base.keys()):
+            if key in new or key not in user:
+                continue
+            key_path = path + (key,)
+            if _is_table(base[key]) or isinstance(base[key], AoT):
+                # 整个表被删除时不自动删除，避免丢失用户依赖的配置（如模型配置）
+                result['conflicts'].append((_format_path(key_path), "新模板已删除整个表，已保留；确认不再需要后请手动删除"))
+            elif _plain(user[key]) == _plain(base[key]):
+                del user[key]
+                result['removed'].append(_format_path(key_path))
+            else:
+                result['conflicts'].append((_format_path(key_path), "新模板已删除此配置项，但你修改过它，已保留"))
+
+    return result
+
+
+def _file_hash(path) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _load_state() -> dict:
+    try:
+        with open(MERGE_STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _base_path(target) -> str:
+    return os.path.join(TEMPLATE_BASE_DIR, os.path.basename(target['template']) + f".{target['key']}")
+
+
+def merge_output_paths(targets=None) -> list:
+    """合并时可能写入的文件：用户配置、作为基准的模板副本和合并状态，供更新事务回滚时恢复"""
+    paths = []
+    for target in targets or MERGE_TARGETS:
+        paths.extend([target['path'], _base_path(target)])
+    paths.append(MERGE_STATE_PATH)
+    return paths
+
+
+def merge_config_file(target, state=None):
+    """合并单个配置文件
+
+    Returns:
+        dict: 合并结果，配置或模板不存在、或都未变化时返回None
+    """
+    if not os.path.exists(target['path']) or not os.path.exists(target['template']):
+        return None
+
+    state = state if state is not None else {}
+    template_hash = _file_hash(target['template'])
+    config_hash = _file_hash(target['path'])
+    previous = state.get(target['key'], {})
+    if previous.get('template') == template_hash and previous.get('config') == config_hash:
+        return None
+
+    base_path = _base_path(target)
+    base = None
+    if os.path.exists(base_path):
+        with open(base_path, 'r', encoding='utf-8') as f:
+            base = tomlkit.parse(f.read())
+
+    with open(target['template'], 'r', encoding='utf-8') as f:
+        new = tomlkit.parse(f.read())
+    user = config_store.load_toml(target['path'])
+    result = merge_documents(base, new, user)
+    result['name'] = target['name']
+
+    if result['added'] or result['updated'] or result['removed']:
+        config_store.save_toml(target['path'], user)
+    else:
+        # 没有改动，丢弃可能被修改过的缓存文档
+        config_store.invalidate(target['path'])
+
+    # 记录本次的模板作为下一次合并的基准
+    os.makedirs(TEMPLATE_BASE_DIR, exist_ok=True)
+    shutil.copyfile(target['template'], base_path)
+    state[target['key']] = {'template': template_hash, 'config': _file_hash(target['path'])}
+    return result
+
+
+def merge_config_templates(targets=None, report=print):
+    """合并所有配置文件的模板更新，并输出合并结果
+
+    Args:
+        targets: 需要合并的配置文件列表，默认为 MERGE_TARGETS
+        report: 输出函数，默认为print
+
+    Returns:
+        list: 各配置文件的合并结果（跳过的文件不包含在内）
+    """
+    state = _load_state()
+    results = []
+    for target in targets or MERGE_TARGETS:
+        try:
+            result = merge_config_file(target, state)
+        except Exception as e:
+            report(f"❌ 合并 {target['name']} 的模板更新失败: {e}")
+            continue
+        if result is None:
+            continue
+        results.append(result)
+        changes = len(result['added']) + len(result['updated']) + len(result['removed'])
+        if changes:
+            report(f"✅ {result['name']}：新增 {len(result['added'])} 项，"
+                   f"更新默认值 {len(result['updated'])} 项，删除 {len(result['removed'])} 项")
+            for key_path in result['added']:
+                report(f"   + {key_path}")
+            for key_path in result['updated']:
+                report(f"   ~ {key_path}")
+            for key_path in result['removed']:
+                report(f"   - {key_path}")
+        for key_path, reason in result['conflicts']:
+            report(f"⚠️  {result['name']} 冲突 {key_path}：{reason}")
+
+    if results:
+        atomic_write_text(MERGE_STATE_PATH, json.dumps(state, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == '__main__':
+    merge_config_templates()
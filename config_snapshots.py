@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+配置文件快照
+功能：每次写入受管理的配置文件前自动保存一份快照，支持查看历史、对比差异和恢复
+
+快照按内容寻址：文件内容的 SHA-256 作为对象名，内容经 zlib 压缩后保存在
+runtime/config_snapshots/objects 下，相同内容只保存一份，重复的版本几乎没有开销。
+每个配置文件的历史记录（时间、哈希、大小、原因）保存在 index.json 中，
+列出历史只需读取索引，不需要解压任何快照。
+
+命令行用法：
+- python config_snapshots.py list [文件]: 列出有快照的配置文件，或指定文件的历史版本
+- python config_snapshots.py diff <文件> <版本> [版本]: 对比快照与当前文件（或另一个快照）
+- python config_snapshots.py restore <文件> <版本>: 恢复到指定版本（恢复前会先为当前内容保存快照）
+版本为 list 输出中的序号（1为最新），或哈希的前缀。
+"""
+
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+
+from config_store import atomic_write_text, config_store
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.path.join(BASE_DIR, 'runtime', 'config_snapshots')
+SNAPSHOT_OBJECTS_DIR = os.path.join(SNAPSHOT_DIR, 'objects')
+SNAPSHOT_INDEX_PATH = os.path.join(SNAPSHOT_DIR, 'index.json')
+# 每个配置文件保留的历史版本数
+SNAPSHOT_HISTORY_LIMIT = 500
+# 哈希前缀的显示长度
+SHORT_HASH_LENGTH = 10
+
+_lock = threading.RLock()
+
+
+def snapshot_key(path) -> str:
+    """配置文件在快照索引中的名称：项目内的文件使用相对路径"""
+    path = os.path.abspath(os.fspath(path))
+    try:
+        relative = os.path.relpath(path, BASE_DIR)
+    except ValueError:
+        # Windows 上不同盘符的路径无法取相对路径
+        return path.replace('\\', '/')
+    if relative.startswith('..'):
+        return path.replace('\\', '/')
+    return relative.replace('\\', '/')
+
+
+def _resolve_path(key: str) -> str:
+    return key if os.path.isabs(key) else os.path.join(BASE_DIR, key)
+
+
+def _object_path(content_hash: str) -> str:
+    return os.path.join(SNAPSHOT_OBJECTS_DIR, content_hash[:2], content_hash[2:])
+
+
+def _load_index() -> dict:
+    try:
+        with open(SNAPSHOT_INDEX_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(index: dict) -> None:
+    atomic_write_text(SNAPSHOT_INDEX_PATH, json.dumps(index, ensure_ascii=False, indent=1))
+
+
+def _write_object(data: bytes) -> str:
+    content_hash = hashlib.sha256(data).hexdigest()
+    object_path = _object_path(content_hash)
+    if not os.path.exists(object_path):
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        temp_path = f"{object_path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(zlib.compress(data, 6))
+        os.replace(temp_path, object_path)
+    return content_hash
+
+
+def read_snapshot(content_hash: str) -> str:
+    """读取快照内容
+
+    Raises:
+        FileNotFoundError: 快照对象不存在
+    """
+    with open(_object_path(content_hash), 'rb') as f:
+        return zlib.decompress(f.read()).decode('utf-8')
+
+
+def _prune(index: dict, key: str) -> None:
+    """超出保留数量时删除最旧的历史记录，以及不再被任何记录引用的快照对象"""
+    history = index[key]
+    if len(history) <= SNAPSHOT_HISTORY_LIMIT:
+        return
+    removed = history[:-SNAPSHOT_HISTORY_LIMIT]
+    index[key] = history[-SNAPSHOT_HISTORY_LIMIT:]
+    referenced = {entry['hash'] for entries in index.values() for entry in entries}
+    for entry in removed:
+        if entry['hash'] not in referenced:
+            try:
+                os.remove(_object_path(entry['hash']))
+            except OSError:
+                pass
+            referenced.add(entry['hash'])
+
+
+def snapshot_text(path, text: str, reason: str = '') -> str:
+    """为配置文件的指定内容保存快照，与最新快照相同时不重复记录
+
+    Returns:
+        str: 快照的内容哈希
+    """
+    key = snapshot_key(path)
+    data = text.encode('utf-8')
+    with _lock:
+        content_hash = _write_object(data)
+        index = _load_index()
+        history = index.setdefault(key, [])
+        if history and history[-1]['hash'] == content_hash:
+            return content_hash
+        history.append({'hash': content_hash, 'time': time.time(), 'size': len(data), 'reason': reason})
+        _prune(index, key)
+        _save_index(index)
+        return content_hash
+
+
+def snapshot_file(path, reason: str = ''):
+    """为配置文件的当前内容保存快照，文件不存在时返回None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except OSError:
+        return None
+    return snapshot_text(path, text, reason)
+
+
+def list_snapshot_files() -> list:
+    """列出有快照的配置文件
+
+    Returns:
+        list: [(文件名称, 快照数量, 最新快照时间)]，按最近修改排序
+    """
+    index = _load_index()
+    files = [(key, len(history), history[-1]['time']) for key, history in index.items() if history]
+    return sorted(files, key=lambda item: item[2], reverse=True)
+
+
+def list_snapshots(path) -> list:
+    """列出配置文件的历史版本，最新的在前
+
+    Returns:
+        list: [{'hash', 'time', 'size', 'reason'}]
+    """
+    return list(reversed(_load_index().get(snapshot_key(path), [])))
+
+
+def find_snapshot(path, version: str):
+    """按序号（1为最新）或哈希前缀查找快照
+
+    Returns:
+        dict: 快照记录，未找到或哈希前缀不唯一时返回None
+    """
+    snapshots = list_snapshots(path)
+    version = str(version).strip()
+    if version.isdigit() and 1 <= int(version) <= len(snapshots) and len(version) < 4:
+        return snapshots[int(version) - 1]
+    matches = {entry['hash']: entry for entry in snapshots if entry['hash'].startswith(version.lower())}
+    return next(iter(matches.values())) if len(matches) == 1 else None
+
+
+def diff_snapshot(path, old_hash: str, new_hash: str = None) -> str:
+    """对比快照与当前文件（new_hash为None时）或另一个快照，返回 unified diff 文本"""
+    key = snapshot_key(path)
+    old_text = read_snapshot(old_hash)
+    if new_hash is None:
+        try:
+            with open(_resolve_path(key), 'r', encoding='utf-8') as f:
+                new_text = f.read()
+        except OSError:
+            new_text = ''
+        new_label = f"{key} (当前)"
+    else:
+        new_text = read_snapshot(new_hash)
+        new_label = f"{key} @ {new_hash[:SHORT_HASH_LENGTH]}"
+    return ''.join(difflib.unified_diff(
+        old_text.splitlines(keepends=True), new_text.splitlines(keepends=True),
+        fromfile=f"{key} @ {old_hash[:SHORT_HASH_LENGTH]}", tofile=new_label))
+
+
+def restore_snapshot(path, content_hash: str) -> bool:
+    """将配置文件恢复为快照内容，写入前当前内容会自动保存快照，恢复操作本身也可撤销
+
+    Returns:
+        bool: 文件内容是否发生了变化
+    """
+    text = read_snapshot(content_hash)
+    path = _resolve_path(snapshot_key(path))
+    changed = config_store.save_text(path, text)
+    config_store.invalidate(path)
+    return changed
+
+
+def format_snapshot(number: int, entry: dict) -> str:
+    timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['time']))
+    reason = f"  {entry['reason']}" if entry.get('reason') else ''
+    return f"{number:3d}. {timestamp}  {entry['hash'][:SHORT_HASH_LENGTH]}  {entry['size']:>8} 字节{reason}"
+
+
+def main(argv=None) -> int:
+    """命令行查看、对比和恢复配置快照"""
+    parser = argparse.ArgumentParser(description="查看、对比和恢复配置文件快照")
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    list_parser = subparsers.add_parser('list', help="列出配置文件或历史版本")
+    list_parser.add_argument('path', nargs='?', help="配置文件路径")
+    diff_parser = subparsers.add_parser('diff', help="对比快照")
+    diff_parser.add_argument('path', help="配置文件路径")
+    diff_parser.add_argument('old', help="版本序号或哈希前缀")
+    diff_parser.add_argument('new', nargs='?', help="对比的版本，默认为当前文件")
+    restore_parser = subparsers.add_parser('restore', help="恢复到指定版本")
+    restore_parser.add_argument('path', help="配置文件路径")
+    restore_parser.add_argument('version', help="版本序号或哈希前缀")
+    args = parser.parse_args(argv)
+
+    if args.action == 'list':
+        if not args.path:
+            for key, count, _ in list_snapshot_files():
+                print(f"{key}  ({count} 个快照)")
+            return 0
+        for number, entry in enumerate(list_snapshots(args.path), 1):
+            print(format_snapshot(number, entry))
+        return 0
+
+    versions = [args.old, args.new] if args.action == 'diff' else [args.version]
+    entries = []
+    for version in versions:
+        if version is None:
+            entries.append(None)
+            continue
+        entry = find_snapshot(args.path, version)
+        if entry is None:
+            print(f"❌ 找不到快照: {version}")
+            return 1
+        entries.append(entry)
+
+    if args.action == 'diff':
+        new_hash = entries[1]['hash'] if entries[1] else None
+        print(diff_snapshot(args.path, entries[0]['hash'], new_hash) or "没有差异")
+        return 0
+
+    if restore_snapshot(args.path, entries[0]['hash']):
+        print(f"✅ 已恢复 {snapshot_key(args.path)} 到 {entries[0]['hash'][:SHORT_HASH_LENGTH]}")
+    else:
+        print("当前内容与该快照相同，无需恢复")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+配置文件缓存与写入
+功能：缓存解析后的TOML文档和.env文档，按文件的修改时间和大小判断是否需要重新解析；
+以原子方式写回配置，交互菜单中的多次修改可以在退出菜单时合并为一次写入
+
+bot_config.toml 等大文件用 tomlkit 解析较慢，控制台和配置工具的各个功能
+都通过同一个 config_store 读取，文件未变化时直接返回已解析的同一个文档。
+修改后的文档需通过 save_toml 立即写回，或通过 mark_dirty 标记、在退出菜单时由 flush 写回；
+放弃修改时调用 invalidate 丢弃缓存。没有后台线程和退出时的自动写回：
+未经确认的修改（如中途按 Ctrl+C）不会被写入文件。
+
+写入时先写临时文件并 fsync，再替换原文件，适配器等进程读取时不会读到写了一半的配置；
+序列化结果与文件内容相同时跳过写入。覆盖已有文件前会先为原内容保存快照（见 config_snapshots）。
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import tomlkit
+
+from env_document import EnvDocument
+
+# Windows 上目标文件被其他进程占用时替换会失败，重试的次数和间隔（秒）
+REPLACE_RETRIES = 5
+REPLACE_RETRY_INTERVAL = 0.1
+
+
+def atomic_write_text(path, text: str) -> None:
+    """以原子方式写入文本文件：写临时文件、fsync、替换原文件"""
+    path = os.path.abspath(os.fspath(path))
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            # mkstemp 创建的临时文件权限为0600，保持原文件的权限
+            shutil.copymode(path, temp_path)
+        for attempt in range(REPLACE_RETRIES):
+            try:
+                os.replace(temp_path, path)
+                break
+            except PermissionError:
+                if attempt == REPLACE_RETRIES - 1:
+                    raise
+                time.sleep(REPLACE_RETRY_INTERVAL)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ConfigStore:
+    """按文件路径缓存解析结果的配置存储"""
+
+    def __init__(self):
+        # {绝对路径: {'stat': (修改时间ns, 文件大小), 'text': 文件内容, 'document': 解析结果}}
+        self._entries = {}
+        # {绝对路径: 已修改、等待 flush 写回的文档}
+        self._dirty = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(path) -> str:
+        return os.path.abspath(os.fspath(path))
+
+    @staticmethod
+    def _stat(path):
+        """返回文件的 (修改时间ns, 大小)，文件不存在时返回None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, path, parser):
+        key = self._key(path)
+        with self._lock:
+            stat = self._stat(key)
+            if stat is None:
+                self._entries.pop(key, None)
+                raise FileNotFoundError(f"配置文件不存在: {key}")
+            cached = self._entries.get(key)
+            if cached and cached['stat'] == stat:
+                return cached['document']
+            with open(key, 'r', encoding='utf-8') as f:
+                text = f.read()
+            document = parser(text)
+            self._entries[key] = {'stat': stat, 'text': text, 'document': document}
+            return document
+
+    def load_toml(self, path) -> tomlkit.TOMLDocument:
+        """读取TOML文档，文件未变化时返回缓存的同一个文档
+
+        Raises:
+            FileNotFoundError: 文件不存在
+            tomlkit.exceptions.TOMLKitError: 文件格式错误
+        """
+        key = self._key(path)
+        with self._lock:
+            # 尚未写回的文档比文件内容更新
+            if key in self._dirty:
+                return self._dirty[key]
+            return self._load(key, tomlkit.parse)
+
+    def load_env_document(self, path) -> EnvDocument:
+        """读取.env文档（保留注释和顺序），文件未变化时返回缓存的同一个文档
+
+        Raises:
+            FileNotFoundError: 文件不存在
+        """
+        return self._load(path, EnvDocument.parse)
+
+    def load_env(self, path) -> dict:
+        """读取.env文件的键值
+
+        Raises:
+            FileNotFoundError: 文件不存在
+        """
+        return self.load_env_document(path).as_dict()
+
+    def save_text(self, path, text: str) -> bool:
+        """以原子方式写入文本，内容与文件相同时跳过
+
+        Returns:
+            bool: 是否实际写入了文件
+        """
+        key = self._key(path)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached['stat'] != self._stat(key):
+                try:
+                    with open(key, 'r', encoding='utf-8') as f:
+                        current = f.read()
+                except OSError:
+                    current = None
+            else:
+                current = cached['text']
+            if current == text:
+                return False
+            if current is not None:
+                self._snapshot(key, current)
+            atomic_write_text(key, text)
+            # 缓存的解析结果已与文件不一致，下次读取时重新解析
+            self._entries.pop(key, None)
+            return True
+
+    @staticmethod
+    def _snapshot(key, text: str) -> None:
+        """写入前为原内容保存快照，快照失败不影响配置写入"""
+        from config_snapshots import snapshot_text
+
+        try:
+            snapshot_text(key, text, reason='写入前自动快照')
+        except OSError:
+            pass
+
+    def _save_document(self, key, document, text: str) -> bool:
+        written = self.save_text(key, text)
+        self._entries[key] = {'stat': self._stat(key), 'text': text, 'document': document}
+        return written
+
+    def save_toml(self, path, document) -> bool:
+        """立即将TOML文档写回文件，并以写入后的文件状态更新缓存
+
+        Returns:
+            bool: 是否实际写入了文件（内容未变化时不写入）
+        """
+        key = self._key(path)
+        with self._lock:
+            self._cancel_pending(key)
+            return self._save_document(key, document, tomlkit.dumps(document))
+
+    def save_env_document(self, path, document: EnvDocument) -> bool:
+        """以原子方式将.env文档写回文件，并以写入后的文件状态更新缓存
+
+        Returns:
+            bool: 是否实际写入了文件（内容未变化时不写入）
+        """
+        key = self._key(path)
+        with self._lock:
+            return self._save_document(key, document, document.dumps())
+
+    def mark_dirty(self, path, document) -> None:
+        """标记文档已修改，等到 flush 时再写回文件（多次修改只写入一次）"""
+        key = self._key(path)
+        with self._lock:
+            self._dirty[key] = document
+
+    def flush(self, path=None) -> int:
+        """立即写回已修改的文档，path为None时写回全部
+
+        Returns:
+            int: 实际写入的文件数
+        """
+        with self._lock:
+            keys = list(self._dirty) if path is None else [self._key(path)]
+            written = 0
+            for key in keys:
+                document = self._dirty.get(key)
+                if document is not None and self.save_toml(key, document):
+                    written += 1
+            return written
+
+    def _cancel_pending(self, key) -> None:
+        self._dirty.pop(key, None)
+
+    def invalidate(self, path=None) -> None:
+        """丢弃指定文件的缓存和未写回的修改，path为None时全部丢弃"""
+        with self._lock:
+            keys = list(set(self._entries) | set(self._dirty)) if path is None else [self._key(path)]
+            for key in keys:
+                self._cancel_pending(key)
+                self._entries.pop(key, None)
+
+
+# 全局共享的配置存储实例
+config_store = ConfigStore()
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+启动前配置校验
+功能：在启动各组件前检查所有配置文件，避免组件启动后才因配置错误崩溃
+
+以配置模板作为结构定义进行检查：
+- TOML 语法错误
+- 模板中的配置项缺失、类型与模板不一致
+- 模板中没有的配置项（可能是拼写错误，仅提示）
+- .env 缺少模板中的变量
+- 模型配置段引用的API服务商在 .env 中不存在
+
+校验结果按配置文件（及其模板、相关的 .env）的内容哈希缓存，文件未变化时直接使用缓存结果。
+"""
+
+import hashlib
+import json
+import os
+
+import tomlkit
+
+from config_merge import MERGE_TARGETS
+from config_store import atomic_write_text, config_store
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 校验结果缓存
+VALIDATION_CACHE_PATH = os.path.join(BASE_DIR, 'runtime', 'config_validation_cache.json')
+# 校验规则版本，规则变化时使缓存失效
+VALIDATOR_VERSION = 1
+
+ENV_TARGET = {
+    'name': 'MaiBot环境文件',
+    'key': 'env',
+    'path': os.path.join(BASE_DIR, 'modules', 'MaiBot', '.env'),
+    'template': os.path.join(BASE_DIR, 'modules', 'MaiBot', 'template', 'template.env'),
+}
+# 模型配置段所在的配置文件
+MODEL_CONFIG_KEY = 'bot_config'
+
+
+def _type_name(value) -> str:
+    if isinstance(value, bool):
+        return '布尔值'
+    if isinstance(value, int):
+        return '整数'
+    if isinstance(value, float):
+        return '小数'
+    if isinstance(value, str):
+        return '字符串'
+    if isinstance(value, dict):
+        return '表'
+    if isinstance(value, list):
+        return '数组'
+    return type(value).__name__
+
+
+def check_value_type(expected, actual):
+    """比较模板值与配置值的类型
+
+    Returns:
+        str: 'ok'、'warning'（可自动转换的整数/小数/数字字符串）或 'error'
+    """
+    if isinstance(expected, bool) or isinstance(actual, bool):
+        return 'ok' if isinstance(expected, bool) and isinstance(actual, bool) else 'error'
+    if isinstance(expected, float) and isinstance(actual, int):
+        return 'ok'
+    if isinstance(expected, int) and isinstance(actual, float):
+        return 'warning'
+    if isinstance(expected, int) and isinstance(actual, str) and actual.strip().isdigit():
+        # 如控制台写入的字符串形式的QQ号，MaiBot读取时会转换为整数
+        return 'warning'
+    for kind in (str, int, float, dict, list):
+        if isinstance(expected, kind):
+            return 'ok' if isinstance(actual, kind) else 'error'
+    return 'ok'
+
+
+def validate_against_template(template, config, path=(), result=None):
+    """按模板检查配置的配置项和类型
+
+    Returns:
+        dict: {'errors': [...], 'warnings': [...]}
+    """
+    if result is None:
+        result = {'errors': [], 'warnings': []}
+
+    for key, expected in template.items():
+        key_path = '.'.join(path + (key,))
+        if key not in config:
+            result['errors'].append(f"缺少配置项 {key_path}")
+            continue
+        actual = config[key]
+        check = check_value_type(expected, actual)
+        if check == 'error':
+            result['errors'].append(
+                f"配置项 {key_path} 类型错误：应为{_type_name(expected)}，实际为{_type_name(actual)}")
+        elif check == 'warning':
+            result['warnings'].append(f"配置项 {key_path} 应为整数，实际为{_type_name(actual)} {actual!r}")
+        elif isinstance(expected, dict):
+            validate_against_template(expected, actual, path + (key,), result)
+
+    for key in config:
+        if key not in template:
+            result['warnings'].append(f"未知配置项 {'.'.join(path + (key,))}（模板中不存在，可能是拼写错误）")
+
+    return result
+
+
+def validate_model_providers(config, env_values):
+    """检查模型配置段引用的API服务商是否已在 .env 中配置"""
+    errors = []
+    for section_name, section in (config.get('model') or {}).items():
+        if not isinstance(section, dict) or 'provider' not in section:
+            continue
+        provider = str(section['provider'])
+        if f"{provider}_BASE_URL" not in env_values or f"{provider}_KEY" not in env_values:
+            errors.append(f"模型 [model.{section_name}] 使用的API服务商 {provider} 未在 .env 中配置"
+                          f"（缺少 {provider}_BASE_URL 或 {provider}_KEY）")
+        elif not env_values.get(f"{provider}_KEY"):
+            errors.append(f"模型 [model.{section_name}] 使用的API服务商 {provider} 的密钥 {provider}_KEY 为空")
+    return errors
+
+
+def _read_bytes(path) -> bytes:
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return b''
+
+
+def _content_hash(*paths) -> str:
+    digest = hashlib.sha256(str(VALIDATOR_VERSION).encode())
+    for path in paths:
+        digest.update(path.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(_read_bytes(path))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _validate_toml_target(target):
+    result = {'errors': [], 'warnings': []}
+    if not os.path.exists(target['path']):
+        result['errors'].append(f"配置文件不存在: {target['path']}")
+        return result
+    try:
+        config = config_store.load_toml(target['path']).unwrap()
+    except tomlkit.exceptions.TOMLKitError as e:
+        result['errors'].append(f"配置文件语法错误：{e}")
+        return result
+
+    if os.path.exists(target['template']):
+        with open(target['template'], 'r', encoding='utf-8') as f:
+            template = tomlkit.parse(f.read()).unwrap()
+        validate_against_template(template, config, result=result)
+
+    if target['key'] == MODEL_CONFIG_KEY:
+        env_values = config_store.load_env(ENV_TARGET['path']) if os.path.exists(ENV_TARGET['path']) else {}
+        result['errors'].extend(validate_model_providers(config, env_values))
+    return result
+
+
+def _validate_env_target(target):
+    result = {'errors': [], 'warnings': []}
+    if not os.path.exists(target['path']):
+        result['errors'].append(f"环境文件不存在: {target['path']}")
+        return result
+    env_values = config_store.load_env(target['path'])
+    if os.path.exists(target['template']):
+        for key in config_store.load_env(target['template']):
+            if key not in env_values:
+                result['warnings'].append(f"缺少环境变量 {key}")
+    return result
+
+
+def _load_cache() -> dict:
+    try:
+        with open(VALIDATION_CACHE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def validate_all_configs():
+    """校验所有配置文件，未变化的配置直接使用缓存的结果
+
+    Returns:
+        list: [{'name': 配置名称, 'errors': [...], 'warnings': [...], 'cached': bool}]
+    """
+    cache = _load_cache()
+    cache_changed = False
+    results = []
+    for target in MERGE_TARGETS + [ENV_TARGET]:
+        hash_paths = [target['path'], target['template']]
+        if target['key'] == MODEL_CONFIG_KEY:
+            hash_paths.append(ENV_TARGET['path'])
+        content_hash = _content_hash(*hash_paths)
+
+        cached = cache.get(target['key'])
+        if cached and cached.get('hash') == content_hash:
+            results.append({'name': target['name'], 'errors': cached['errors'],
+                            'warnings': cached['warnings'], 'cached': True})
+            continue
+
+        try:
+            if target is ENV_TARGET:
+                result = _validate_env_target(target)
+            else:
+                result = _validate_toml_target(target)
+        except UnicodeDecodeError as e:
+            result = {'errors': [f"文件不是UTF-8编码，无法读取：{e}"], 'warnings': []}
+        except OSError as e:
+            # 读取失败（如权限不足、文件被占用）可能是暂时的，不缓存结果
+            results.append({'name': target['name'], 'cached': False,
+                            'errors': [f"读取配置文件失败：{e}"], 'warnings': []})
+            continue
+        cache[target['key']] = {'hash': content_hash, **result}
+        cache_changed = True
+        results.append({'name': target['name'], 'cached': False, **result})
+
+    if cache_changed:
+        atomic_write_text(VALIDATION_CACHE_PATH, json.dumps(cache, ensure_ascii=False, indent=2))
+    return results
+
+
+if __name__ == '__main__':
+    has_errors = False
+    for item in validate_all_configs():
+        status = "❌" if item['errors'] else "✅"
+        print(f"{status} {item['name']}{'（缓存）' if item['cached'] else ''}")
+        for message in item['errors']:
+            print(f"   错误: {message}")
+        for message in item['warnings']:
+            print(f"   提示: {message}")
+        has_errors = has_errors or bool(item['errors'])
+    raise SystemExit(1 if has_errors else 0)
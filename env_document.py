@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+.env 文档模型
+功能：一次解析 .env 文件，保留注释、空行和变量顺序，支持按变量名查找、原位修改和删除
+
+每一行解析为一个条目，变量名建立索引，查找和修改都是O(1)；
+只有被修改的行会重新生成，其余行按原样写回，序列化结果与原文件逐字节相同。
+解析规则与 python-dotenv 一致：支持 export 前缀、单双引号（双引号内的转义和跨行值）、
+未加引号的值后面以 " #" 开始的行内注释，以及 ${VAR} 和 ${VAR:-默认值} 形式的变量插值
+（与 python-dotenv 一样，单引号内的值按字面读取，不做插值）。
+引号到文件末尾都未闭合时与 python-dotenv 一样忽略该行，不会吞掉后续内容。
+
+读取返回插值后的值，插值先查找文件中前面定义的变量，再查找 os.environ；
+读取不会修改 os.environ，同一会话中的修改立即可见。修改变量时保留该行的行内注释。
+"""
+
+import os
+import re
+
+# KEY=VALUE 行，允许 export 前缀和等号两侧的空白
+_ENTRY_PATTERN = re.compile(r'^(?P<prefix>\s*(?:export\s+)?)(?P<key>[A-Za-z_][A-Za-z0-9_.\-]*)\s*=\s*(?P<value>.*)$',
+                            re.DOTALL)
+_DOUBLE_QUOTE_ESCAPES = {'n': '\n', 'r': '\r', 't': '\t', '"': '"', '\\': '\\', "'": "'"}
+# 值中包含这些字符时写入需要加双引号
+_NEEDS_QUOTES = re.compile(r'[\s#"\'\\]')
+# ${VAR} 或 ${VAR:-默认值}
+_VARIABLE_PATTERN = re.compile(r'\$\{(?P<name>[^}:]*)(?::-(?P<default>[^}]*))?\}')
+
+
+def _unescape_double_quoted(value: str) -> str:
+    return re.sub(r'\\(.)', lambda m: _DOUBLE_QUOTE_ESCAPES.get(m.group(1), m.group(0)), value, flags=re.DOTALL)
+
+
+def _find_closing_quote(text: str, quote: str) -> int:
+    """返回与 text[0] 的引号配对的结束引号位置，未闭合时返回-1"""
+    index = 1
+    while index < len(text):
+        char = text[index]
+        if char == '\\' and quote == '"':
+            index += 2
+            continue
+        if char == quote:
+            return index
+        index += 1
+    return -1
+
+
+def _split_value(raw: str):
+    """将等号右侧的原始文本拆分为变量值和值后面的行内注释（含前导空白）"""
+    raw = raw.rstrip()
+    stripped = raw.lstrip()
+    if stripped[:1] in ('"', "'"):
+        quote = stripped[0]
+        end = _find_closing_quote(stripped, quote)
+        if end != -1:
+            inner = stripped[1:end]
+            value = _unescape_double_quoted(inner) if quote == '"' else inner
+            return value, stripped[end + 1:]
+    # 未加引号的值：" #" 之后为注释
+    comment = re.search(r'\s#', stripped)
+    if comment:
+        return stripped[:comment.start()].strip(), stripped[comment.start():]
+    return stripped, ''
+
+
+def parse_value(raw: str) -> str:
+    """解析等号右侧的原始文本，返回变量值（未插值）"""
+    return _split_value(raw)[0]
+
+
+def interpolate(value: str, env: dict) -> str:
+    """展开值中的 ${VAR} 和 ${VAR:-默认值}，未定义且没有默认值的变量展开为空字符串"""
+    def replace(match):
+        result = env.get(match.group('name'))
+        if result is None:
+            result = match.group('default') or ''
+        return result
+    return _VARIABLE_PATTERN.sub(replace, value)
+
+
+def format_value(value: str) -> str:
+    """将变量值格式化为 .env 中的文本，必要时加双引号并转义"""
+    value = '' if value is None else str(value)
+    if not _NEEDS_QUOTES.search(value):
+        return value
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+    return f'"{escaped}"'
+
+
+class EnvDocument:
+    """保留格式的 .env 文档"""
+
+    def __init__(self, text: str = ''):
+        # 每个条目为 {'raw': 原始文本（含换行）, 'key': 变量名或None, 'value': 未插值的变量值, 'comment': 行内注释,
+        #            'interpolate': 读取时是否插值（单引号内的值为False）}
+        self._lines = []
+        # {变量名: 条目}，重复定义时以最后一个为准（与 python-dotenv 一致）
+        self._index = {}
+        # 插值后的变量值，文档被修改时清空
+        self._resolved = None
+        self._parse(text)
+
+    @classmethod
+    def parse(cls, text: str) -> 'EnvDocument':
+        return cls(text)
+
+    def _parse(self, text: str) -> None:
+        lines = text.splitlines(keepends=True)
+        position = 0
+        while position < len(lines):
+            raw = lines[position]
+            position += 1
+            match = _ENTRY_PATTERN.match(raw.rstrip('\r\n'))
+            if not match:
+                self._lines.append({'raw': raw, 'key': None, 'value': None})
+                continue
+
+            value_text = match.group('value')
+            quote = value_text[:1]
+            if quote in ('"', "'") and _find_closing_quote(value_text, quote) == -1:
+                # 引号未在本行闭合时，值延续到闭合引号所在的行；直到文件末尾都未闭合时忽略本行
+                end = position
+                continued_raw, continued_text = raw, value_text
+                while end < len(lines) and _find_closing_quote(continued_text, quote) == -1:
+                    continued_raw += lines[end]
+                    continued_text = continued_raw[match.start('value'):].rstrip('\r\n')
+                    end += 1
+                if _find_closing_quote(continued_text, quote) == -1:
+                    self._lines.append({'raw': raw, 'key': None, 'value': None})
+                    continue
+                raw, value_text, position = continued_raw, continued_text, end
+            value, comment = _split_value(value_text)
+            entry = {'raw': raw, 'key': match.group('key'), 'value': value, 'comment': comment,
+                     'prefix': match.group('prefix'), 'interpolate': quote != "'"}
+            self._lines.append(entry)
+            self._index[entry['key']] = entry
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    def __getitem__(self, key: str) -> str:
+        return self._resolve()[key]
+
+    def __setitem__(self, key: str, value: str) -> None:
+        self.set(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        if not self.delete(key):
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _resolve(self) -> dict:
+        """按文件顺序插值所有变量（单引号内的值除外），与 python-dotenv 一样先查找前面定义的变量，再查找环境变量"""
+        if self._resolved is None:
+            resolved = {}
+            for line in self._lines:
+                if line['key'] is None:
+                    continue
+                value = line['value']
+                if line['interpolate'] and '${' in value:
+                    value = interpolate(value, {**os.environ, **resolved})
+                resolved[line['key']] = value
+            self._resolved = resolved
+        return self._resolved
+
+    def get(self, key: str, default=None):
+        return self._resolve().get(key, default)
+
+    def keys(self) -> list:
+        """按文件中的顺序返回变量名"""
+        return [line['key'] for line in self._lines if line['key'] is not None and self._index.get(line['key']) is line]
+
+    def items(self) -> list:
+        resolved = self._resolve()
+        return [(key, resolved[key]) for key in self.keys()]
+
+    def as_dict(self) -> dict:
+        return dict(self.items())
+
+    def providers(self) -> dict:
+        """文档中的API服务商（{服务商}_BASE_URL / {服务商}_KEY 变量）
+
+        Returns:
+            dict: {服务商名称: {'base_url': 地址, 'key': 密钥}}，按变量在文件中首次出现的顺序
+        """
+        providers = {}
+        for key in self.keys():
+            if key.endswith('_BASE_URL') or key.endswith('_KEY'):
+                provider = key.replace('_BASE_URL', '').replace('_KEY', '')
+                providers[provider] = {
+                    'base_url': self.get(f"{provider}_BASE_URL") or '',
+                    'key': self.get(f"{provider}_KEY") or '',
+                }
+        return providers
+
+    def set(self, key: str, value: str) -> bool:
+        """设置变量值：已存在时原位修改该行（保留 export 前缀和行内注释），否则追加到文件末尾
+
+        值按字面写入，其中的 ${VAR} 在读取时同样会被插值。
+
+        Returns:
+            bool: 值是否发生了变化
+        """
+        value = '' if value is None else str(value)
+        entry = self._index.get(key)
+        if entry is not None:
+            if entry['value'] == value:
+                return False
+            newline = '\r\n' if entry['raw'].endswith('\r\n') else '\n'
+            entry['raw'] = f"{entry['prefix']}{key}={format_value(value)}{entry['comment']}{newline}"
+            entry['value'] = value
+            # format_value 不会生成单引号，新的值读取时插值
+            entry['interpolate'] = True
+            self._resolved = None
+            return True
+
+        if self._lines and not self._lines[-1]['raw'].endswith(('\n', '\r')):
+            self._lines[-1]['raw'] += '\n'
+        entry = {'raw': f"{key}={format_value(value)}\n", 'key': key, 'value': value, 'comment': '', 'prefix': '',
+                 'interpolate': True}
+        self._lines.append(entry)
+        self._index[key] = entry
+        self._resolved = None
+        return True
+
+    def update(self, values: dict) -> bool:
+        """批量设置变量，返回是否有值发生变化"""
+        changed = False
+        for key, value in values.items():
+            changed = self.set(key, value) or changed
+        return changed
+
+    def delete(self, key: str) -> bool:
+        """删除变量（包括重复定义的行）
+
+        Returns:
+            bool: 变量是否存在
+        """
+        if key not in self._index:
+            return False
+        del self._index[key]
+        self._lines = [line for line in self._lines if line['key'] != key]
+        self._resolved = None
+        return True
+
+    def dumps(self) -> str:
+        """序列化为文本，未修改的行保持原样"""
+        return ''.join(line['raw'] for line in self._lines)
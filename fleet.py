@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+多实例部署
+功能：以当前一键包为母版，批量创建多个机器人实例目录
+
+运行环境和代码（runtime/python31211、PortableGit、NapCat、MaiBot 和适配器的代码）在实例间共享：
+默认以硬链接方式创建，几乎不占用额外磁盘空间，也不需要复制数据；
+也可以使用 reflink（写时复制，需要文件系统支持，不支持时自动改为复制）或直接复制。
+配置文件、.env、data/、日志和 NapCat 配置目录在每个实例中独立，
+NapCat 配置和QQ号由实例自己的 init_napcat 生成；每个实例分配各自的适配器端口和麦麦主程序端口
+（与多账号使用相同的分配方式，见 accounts.allocate_ports），多个实例可以同时运行。
+
+硬链接的文件与母版是同一份数据：一键包的配置写入、pip 和 git 都是先写新文件再替换，
+不会影响母版；但不要在实例中直接编辑共享的代码文件，需要修改代码时请使用 --mode copy。
+
+命令行用法：
+- python fleet.py provision <目标目录> --qq 111,222,333 [--mode hardlink|reflink|copy]
+- python fleet.py list
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from config_store import atomic_write_text
+from napcat_versions import PER_QQ_CONFIG_PATTERN
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FLEET_STATE_PATH = os.path.join(BASE_DIR, 'runtime', 'fleet.json')
+PROVISION_MODES = ('hardlink', 'reflink', 'copy')
+
+# runtime 目录中共享的子目录，其余（快照、缓存、状态文件）属于母版自身，不复制到实例
+SHARED_RUNTIME_DIRS = ('python31211', 'PortableGit', 'wheelhouse')
+# 每个实例独立的路径（相对于一键包根目录，支持通配符）：复制而不是链接
+PER_INSTANCE_COPY = [
+    'modules/MaiBot/config',
+    'modules/MaiBot/.env',
+    'modules/MaiBot-Napcat-Adapter/config.toml',
+    'modules/napcat/versions/*/resources/app/napcat/config',
+    'modules/napcatframework/versions/*/resources/app/LiteLoader/plugins/NapCat/config',
+]
+# 每个实例独立的运行数据目录：在实例中创建为空目录
+PER_INSTANCE_EMPTY = [
+    'modules/MaiBot/data',
+    'modules/MaiBot/logs',
+    'modules/MaiBot-Napcat-Adapter/logs',
+    'modules/napcat/logs',
+    'modules/napcatframework/logs',
+]
+# 不复制到实例的路径（Python 会在实例中重新生成 __pycache__）
+EXCLUDED = ['instances', 'accounts', 'shards', '__pycache__', '*/__pycache__']
+
+# Linux 上 FICLONE ioctl 的请求码
+_FICLONE = 0x40049409
+
+
+def _matches(relative_path: str, patterns) -> bool:
+    return any(fnmatch.fnmatchcase(relative_path, pattern) for pattern in patterns)
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """以写时复制方式克隆文件，文件系统不支持时返回False"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, 'rb') as source, open(dst, 'wb') as target:
+            fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+
+def _place_file(src: str, dst: str, mode: str, stats: dict) -> None:
+    """按模式在实例中放置共享文件，不支持时退回复制"""
+    if mode == 'hardlink':
+        try:
+            os.link(src, dst)
+            stats['linked'] += 1
+            return
+        except OSError:
+            # 跨分区或文件系统不支持硬链接
+            pass
+    elif mode == 'reflink' and _reflink(src, dst):
+        stats['linked'] += 1
+        return
+    shutil.copy2(src, dst)
+    stats['copied'] += 1
+    stats['bytes_copied'] += os.path.getsize(dst)
+
+
+def _copy_private(src: str, dst: str, stats: dict) -> None:
+    """复制实例独立的文件或目录，跳过母版账号的 NapCat 配置"""
+    if os.path.isdir(src):
+        os.makedirs(dst, exist_ok=True)
+        for entry in os.scandir(src):
+            if entry.is_file() and PER_QQ_CONFIG_PATTERN.match(entry.name):
+                continue
+            _copy_private(entry.path, os.path.join(dst, entry.name), stats)
+    else:
+        shutil.copy2(src, dst)
+        stats['copied'] += 1
+        stats['bytes_copied'] += os.path.getsize(dst)
+
+
+def _mirror_tree(src_dir: str, dst_dir: str, relative: str, mode: str, stats: dict, skip: set) -> None:
+    os.makedirs(dst_dir, exist_ok=True)
+    for entry in os.scandir(src_dir):
+        entry_relative = f"{relative}/{entry.name}" if relative else entry.name
+        target = os.path.join(dst_dir, entry.name)
+        if _matches(entry_relative, EXCLUDED) or _matches(entry_relative, PER_INSTANCE_EMPTY):
+            continue
+        if os.path.abspath(entry.path) in skip:
+            # 实例目录位于一键包内时跳过，避免把实例（包括正在创建的实例）复制进自身
+            continue
+        if relative == 'runtime' and entry.name not in SHARED_RUNTIME_DIRS:
+            continue
+        if _matches(entry_relative, PER_INSTANCE_COPY):
+            _copy_private(entry.path, target, stats)
+        elif entry.is_dir(follow_symlinks=False):
+            _mirror_tree(entry.path, target, entry_relative, mode, stats, skip)
+        elif entry.is_file(follow_symlinks=False):
+            _place_file(entry.path, target, mode, stats)
+
+
+def mirror_module(relative: str, dst_dir: str, mode: str = 'hardlink') -> dict:
+    """以母版中的一个目录（如 modules/MaiBot）创建共享代码、独立配置和数据的副本
+
+    Returns:
+        dict: {'linked', 'copied', 'bytes_copied'}
+    """
+    stats = {'linked': 0, 'copied': 0, 'bytes_copied': 0}
+    src_dir = os.path.join(BASE_DIR, relative)
+    dst_dir = os.path.abspath(dst_dir)
+    _mirror_tree(src_dir, dst_dir, relative.replace('\\', '/').strip('/'), mode, stats, skip={dst_dir})
+    for empty in PER_INSTANCE_EMPTY:
+        if empty.startswith(f"{relative}/") and os.path.isdir(os.path.join(BASE_DIR, empty)):
+            os.makedirs(os.path.join(dst_dir, os.path.relpath(empty, relative)), exist_ok=True)
+    return stats
+
+
+def _is_current(src: str, dst: str, mode: str) -> bool:
+    """目标文件是否已是源文件的当前版本：硬链接比较是否为同一文件，复制比较大小和修改时间"""
+    try:
+        if mode == 'hardlink':
+            return os.path.samefile(src, dst)
+        src_stat, dst_stat = os.stat(src), os.stat(dst)
+    except OSError:
+        return False
+    return src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+
+
+def _sync_tree(src_dir: str, dst_dir: str, relative: str, mode: str, stats: dict) -> None:
+    os.makedirs(dst_dir, exist_ok=True)
+    for entry in os.scandir(src_dir):
+        entry_relative = f"{relative}/{entry.name}" if relative else entry.name
+        target = os.path.join(dst_dir, entry.name)
+        if _matches(entry_relative, EXCLUDED) or _matches(entry_relative, PER_INSTANCE_EMPTY):
+            continue
+        if _matches(entry_relative, PER_INSTANCE_COPY):
+            # 独立的配置只在缺失时复制，不覆盖副本自己的修改
+            if not os.path.exists(target):
+                _copy_private(entry.path, target, stats)
+        elif entry.is_dir(follow_symlinks=False):
+            _sync_tree(entry.path, target, entry_relative, mode, stats)
+        elif entry.is_file(follow_symlinks=False) and not _is_current(entry.path, target, mode):
+            # 先在旁边放好新文件再替换，替换失败（如文件被运行中的进程占用）时保留旧文件
+            temp_path = f"{target}.sync.tmp"
+            try:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                _place_file(entry.path, temp_path, mode, stats)
+                os.replace(temp_path, target)
+            except OSError:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                stats['failed'].append(entry_relative)
+
+
+def sync_module(relative: str, dst_dir: str, mode: str = 'hardlink') -> dict:
+    """将 mirror_module 创建的副本同步到母版当前的代码
+
+    git 和 pip 更新时以新文件替换旧文件，副本中的硬链接仍指向旧文件，新增的文件也不会出现在副本中。
+    同步时重新链接（或复制）发生变化和新增的文件；副本的配置和数据不变，上游删除的文件保留在副本中。
+
+    Returns:
+        dict: {'linked', 'copied', 'bytes_copied', 'failed': [无法替换的文件]}
+    """
+    stats = {'linked': 0, 'copied': 0, 'bytes_copied': 0, 'failed': []}
+    _sync_tree(os.path.join(BASE_DIR, relative), os.path.abspath(dst_dir),
+               relative.replace('\\', '/').strip('/'), mode, stats)
+    for empty in PER_INSTANCE_EMPTY:
+        if empty.startswith(f"{relative}/") and os.path.isdir(os.path.join(BASE_DIR, empty)):
+            os.makedirs(os.path.join(dst_dir, os.path.relpath(empty, relative)), exist_ok=True)
+    return stats
+
+
+def _configure_instance(instance_dir: str, qq_number: str, adapter_port: int, core_port: int) -> None:
+    """写入实例的端口，并在实例中运行 init_napcat 的配置函数，生成该实例的QQ号和 NapCat 配置"""
+    from accounts import get_account_paths, write_ports  # accounts 依赖本模块，延迟导入
+
+    write_ports(get_account_paths({'dir': os.path.join(instance_dir, 'modules')}), adapter_port, core_port)
+    script = (
+        "import sys\n"
+        "from init_napcat import create_napcat_config, create_onebot_config, update_qq_in_config\n"
+        "qq = sys.argv[1]\n"
+        "update_qq_in_config('modules/MaiBot/config/bot_config.toml', int(qq))\n"
+        "create_napcat_config(qq)\n"
+        "create_onebot_config(qq, adapter_port=int(sys.argv[2]))\n"
+    )
+    subprocess.run([sys.executable, '-c', script, qq_number, str(adapter_port)], cwd=instance_dir, check=True)
+
+
+def provision_instance(instance_dir: str, qq_number: str, mode: str = 'hardlink', reserved: set = None) -> dict:
+    """以当前一键包为母版创建一个实例，创建失败时删除已创建的部分
+
+    Args:
+        reserved: 已分配给其他实例的端口，新分配的端口会加入其中
+
+    Returns:
+        dict: {'path', 'qq', 'mode', 'adapter_port', 'core_port', 'linked', 'copied', 'bytes_copied', 'seconds'}
+    """
+    from accounts import allocate_ports
+
+    if mode not in PROVISION_MODES:
+        raise ValueError(f"未知的部署方式: {mode}")
+    instance_dir = os.path.abspath(instance_dir)
+    existed = os.path.exists(instance_dir)
+    if existed and os.listdir(instance_dir):
+        raise FileExistsError(f"实例目录已存在且不为空: {instance_dir}")
+    reserved = set() if reserved is None else reserved
+    adapter_port, core_port = allocate_ports(reserved)
+    reserved.update((adapter_port, core_port))
+    # 其他实例也可能位于一键包内，同样不能复制进新实例
+    skip = {instance_dir} | {os.path.abspath(path) for path in load_fleet()}
+
+    start = time.perf_counter()
+    stats = {'linked': 0, 'copied': 0, 'bytes_copied': 0}
+    try:
+        _mirror_tree(BASE_DIR, instance_dir, '', mode, stats, skip=skip)
+        for relative in PER_INSTANCE_EMPTY:
+            if os.path.isdir(os.path.join(BASE_DIR, relative)):
+                os.makedirs(os.path.join(instance_dir, relative), exist_ok=True)
+        _configure_instance(instance_dir, str(qq_number), adapter_port, core_port)
+    except BaseException:
+        # 删除创建了一半的实例，重试时不会因目录不为空而被拒绝
+        shutil.rmtree(instance_dir, ignore_errors=True)
+        if existed:
+            os.makedirs(instance_dir, exist_ok=True)
+        raise
+
+    return {'path': instance_dir, 'qq': str(qq_number), 'mode': mode, 'adapter_port': adapter_port,
+            'core_port': core_port, **stats, 'seconds': round(time.perf_counter() - start, 2)}
+
+
+def load_fleet() -> dict:
+    try:
+        with open(FLEET_STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def provision_fleet(target_root: str, qq_numbers, mode: str = 'hardlink', report=print) -> list:
+    """为每个QQ号创建一个实例目录 <目标目录>/bot_<QQ号>
+
+    Returns:
+        list: 各实例的创建结果
+    """
+    fleet = load_fleet()
+    # 已有实例的端口不再分配（它们不在多账号的登记中）
+    reserved = {info[key] for info in fleet.values() for key in ('adapter_port', 'core_port') if key in info}
+    results = []
+    for qq_number in qq_numbers:
+        instance_dir = os.path.join(target_root, f"bot_{qq_number}")
+        try:
+            result = provision_instance(instance_dir, qq_number, mode, reserved)
+        except (OSError, subprocess.CalledProcessError, ValueError) as e:
+            report(f"❌ 创建实例 {instance_dir} 失败: {e}")
+            continue
+        results.append(result)
+        fleet[result['path']] = {**result, 'created': time.strftime('%Y-%m-%d %H:%M:%S')}
+        # 每创建一个实例就保存，之后创建的实例会跳过它
+        atomic_write_text(FLEET_STATE_PATH, json.dumps(fleet, ensure_ascii=False, indent=2))
+        report(f"✅ 已创建实例 {result['path']}（QQ {qq_number}，适配器端口 {result['adapter_port']}，"
+               f"麦麦主程序端口 {result['core_port']}）：共享 {result['linked']} 个文件，"
+               f"复制 {result['copied']} 个文件 / {result['bytes_copied'] / 1024 / 1024:.1f} MB，"
+               f"用时 {result['seconds']} 秒")
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="以当前一键包为母版批量创建机器人实例")
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    provision_parser = subparsers.add_parser('provision', help="创建实例")
+    provision_parser.add_argument('target', help="实例所在的目录，每个实例为其中的 bot_<QQ号> 子目录")
+    provision_parser.add_argument('--qq', required=True, help="以逗号分隔的QQ号，每个QQ号创建一个实例")
+    provision_parser.add_argument('--mode', choices=PROVISION_MODES, default='hardlink', help="共享文件的创建方式")
+    subparsers.add_parser('list', help="列出已创建的实例")
+    args = parser.parse_args(argv)
+
+    if args.action == 'list':
+        for path, info in load_fleet().items():
+            status = '' if os.path.isdir(path) else '（目录已不存在）'
+            print(f"{path}  QQ {info['qq']}  {info['mode']}  {info['created']}{status}")
+        return 0
+
+    qq_numbers = [qq.strip() for qq in args.qq.split(',') if qq.strip()]
+    invalid = [qq for qq in qq_numbers if not qq.isdigit()]
+    if invalid or not qq_numbers:
+        print(f"❌ 无效的QQ号: {', '.join(invalid) or '（空）'}")
+        return 1
+    results = provision_fleet(args.target, qq_numbers, args.mode)
+    return 0 if len(results) == len(qq_numbers) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
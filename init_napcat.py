@@ -3,10 +3,29 @@ import json
 import tomlkit  # 替换 tomli
 from pathlib import Path
 
+from config_store import config_store
+from napcat_versions import find_stale_configs, get_active_config_dirs
+from onebot_profiles import apply_client_settings, get_client_settings
+
 def is_valid_qq(qq_str):
     # 检查是否为纯数字
     return bool(re.match(r'^\d+$', qq_str))
 
+def write_json_config(path, config):
+    # 通过 config_store 原子写入JSON配置，覆盖前自动保存快照
+    config_store.save_text(path, json.dumps(config, indent=2, ensure_ascii=False))
+
+def write_per_qq_config(filename, config):
+    # 写入所有NapCat安装目录当前版本的配置目录（版本目录自动发现，升级NapCat后无需修改）
+    for tree, version, config_dir in get_active_config_dirs():
+        Path(config_dir).mkdir(parents=True, exist_ok=True)
+        write_json_config(Path(config_dir) / filename, config)
+
+    # 旧版本目录中的同名配置不会再被读取，提示用户
+    for name, version, path in find_stale_configs():
+        if Path(path).name == filename:
+            print(f"提示：{name} 旧版本 {version} 中残留配置文件 {path}，当前版本不会读取它")
+
 def create_napcat_config(qq_number):
     # 创建napcat配置文件
     config = {
@@ -19,26 +38,10 @@ def create_napcat_config(qq_number):
         "o3HookMode": 1
     }
     
-    # 确保目录存在
-    config_dir_1 = Path('./modules/napcat/versions/9.9.19-34740/resources/app/napcat/config') #路径已更新
-    config_dir_1.mkdir(parents=True, exist_ok=True)
-    
-    # 创建配置文件
-    config_path_1 = config_dir_1 / f'napcat_{qq_number}.json'
-    with open(config_path_1, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
-
-    # 新增第二个配置路径
-    config_dir_2 = Path('./modules/napcatframework/versions/9.9.19-34740/resources/app/LiteLoader/plugins/NapCat/config')
-    config_dir_2.mkdir(parents=True, exist_ok=True)
+    write_per_qq_config(f'napcat_{qq_number}.json', config)
 
-    # 在第二个路径创建配置文件
-    config_path_2 = config_dir_2 / f'napcat_{qq_number}.json'
-    with open(config_path_2, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
-
-def create_onebot_config(qq_number):
-    # 创建OneBot11配置文件
+def create_onebot_config(qq_number, adapter_port=8095):
+    # 创建OneBot11配置文件，adapter_port 为该账号的适配器监听端口
     config = {
     "network": {
         "httpServers": [],
@@ -49,7 +52,7 @@ def create_onebot_config(qq_number):
             {
                 "enable": True,
                 "name": "MaiBot Main",
-                "url": "ws://localhost:8095",
+                "url": f"ws://localhost:{adapter_port}",
                 "reportSelfMessage": False,
                 "messagePostFormat": "array",
                 "token": "",
@@ -64,23 +67,9 @@ def create_onebot_config(qq_number):
     "enableLocalFile2Url": False,
     "parseMultMsg": False
     }
-      # 确保目录存在
-    config_dir_1 = Path('./modules/napcat/versions/9.9.19-34740/resources/app/napcat/config') #路径已更新
-    config_dir_1.mkdir(parents=True, exist_ok=True)
-    
-    # 创建配置文件
-    config_path_1 = config_dir_1 / f'onebot11_{qq_number}.json'
-    with open(config_path_1, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
-
-    # 新增第二个配置路径
-    config_dir_2 = Path('./modules/napcatframework/versions/9.9.19-34740/resources/app/LiteLoader/plugins/NapCat/config')
-    config_dir_2.mkdir(parents=True, exist_ok=True)
-
-    # 在第二个路径创建配置文件
-    config_path_2 = config_dir_2 / f'onebot11_{qq_number}.json'
-    with open(config_path_2, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
+    # 心跳、重连间隔等使用所选的连接配置方案
+    apply_client_settings(config, get_client_settings())
+    write_per_qq_config(f'onebot11_{qq_number}.json', config)
 
 def update_qq_in_config(path: str, qq_number: int):  # 确保 qq_number 是整数
     config_path = Path(path)
@@ -97,12 +86,8 @@ def update_qq_in_config(path: str, qq_number: int):  # 确保 qq_number 是整
             print(f"已从模板创建配置文件: {config_path}")
     
     try:
-        # 读取原始文件内容
-        with open(config_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # 解析 TOML 内容
-        doc = tomlkit.parse(content)
+        # 读取并解析 TOML 内容
+        doc = config_store.load_toml(config_path)
         
         # 更新 qq 值
         if 'bot' not in doc:
@@ -110,8 +95,7 @@ def update_qq_in_config(path: str, qq_number: int):  # 确保 qq_number 是整
         doc['bot']['qq_account'] = qq_number  # qq_number 已经是整数
         
         # 写入更新后的内容
-        with open(config_path, 'w', encoding='utf-8') as f:
-            tomlkit.dump(doc, f)
+        config_store.save_toml(config_path, doc)
             
     except FileNotFoundError:
         print(f"错误：配置文件 {config_path} 未找到。")
@@ -136,6 +120,9 @@ def main():
             update_qq_in_config('./modules/MaiBot/template/bot_config_template.toml', qq_number_int)
             create_onebot_config(qq_input)  # create_onebot_config 和 create_napcat_config 需要字符串类型的 qq
             create_napcat_config(qq_input)
+            # 该账号部署了分片时，补回被覆盖的分片客户端（分片模块依赖本模块，延迟导入）
+            from shards import restore_napcat_clients
+            restore_napcat_clients(qq_input)
             print(f'成功更新QQ号为：{qq_input}并创建所有必要的配置文件')
             break
         except Exception as e:
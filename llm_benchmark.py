@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""
+API服务商测速
+功能：对 .env 中每个 {服务商}_BASE_URL / {服务商}_KEY 和麦麦模型配置中用到的模型，
+以指定的并发数发送流式对话请求，测量首字延迟、生成速度、错误率、429（限流）比例和延迟分位数，
+按结果排名，帮助选择回复更快的服务商和模型
+
+测速使用 OpenAI 兼容的 /chat/completions 流式接口：
+- 首字延迟（TTFT）：发出请求到收到第一段回复内容
+- 生成速度：回复的 token 数 / 从第一段内容到结束的时间（服务商不返回 usage 时按内容分段数估算）
+- 延迟：发出请求到回复结束
+排名时错误率不超过 MAX_RANKED_ERROR_RATE 的组合按 p95 延迟从低到高排列，其余按错误率排在后面。
+结果以 JSON 和 Markdown 表格保存在 runtime/llm_benchmark_reports。
+
+自带一个本地的 OpenAI 兼容模拟服务（模型 stub-fast / stub-slow），可离线检查测速流程。
+
+命令行用法：
+- python llm_benchmark.py run [--concurrency 4] [--requests 20] [--max-tokens 64] [--model 服务商:模型]
+- python llm_benchmark.py run --offline: 对本地模拟服务测速
+- python llm_benchmark.py stub [--port 8765]: 运行本地模拟服务
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+from config_store import config_store
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ENV_PATH = os.path.join(BASE_DIR, 'modules', 'MaiBot', '.env')
+BOT_CONFIG_PATH = os.path.join(BASE_DIR, 'modules', 'MaiBot', 'config', 'bot_config.toml')
+BENCHMARK_REPORT_DIR = Path(BASE_DIR) / 'runtime' / 'llm_benchmark_reports'
+BENCHMARK_REPORT_HISTORY_LIMIT = 50
+DEFAULT_CONCURRENCY = 4
+DEFAULT_REQUESTS = 20
+DEFAULT_MAX_TOKENS = 64
+# 单个请求的超时时间（秒）
+REQUEST_TIMEOUT = 60
+# 错误率超过此值的组合不参与延迟排名
+MAX_RANKED_ERROR_RATE = 0.1
+BENCHMARK_PROMPT = '请用大约五十个字介绍一下你自己。'
+
+# 本地模拟服务的模型：首字延迟、每个token的间隔（秒）和返回429的概率
+STUB_MODELS = {
+    'stub-fast': {'ttft': 0.05, 'token_interval': 0.002, 'rate_limit': 0.0},
+    'stub-slow': {'ttft': 0.3, 'token_interval': 0.01, 'rate_limit': 0.1},
+}
+STUB_PROVIDER = 'STUB'
+
+
+def load_configured_models(config_path: str = BOT_CONFIG_PATH) -> list:
+    """麦麦模型配置中用到的 (服务商, 模型) 组合，去重并保持配置中的顺序"""
+    try:
+        model_config = config_store.load_toml(config_path).get('model', {})
+    except Exception:
+        return []
+    pairs = []
+    for section in model_config.values():
+        if isinstance(section, dict) and section.get('provider') and section.get('name'):
+            pair = (str(section['provider']), str(section['name']))
+            if pair not in pairs:
+                pairs.append(pair)
+    return pairs
+
+
+def build_targets(models=None, env_path: str = ENV_PATH, config_path: str = BOT_CONFIG_PATH):
+    """生成测速目标
+
+    Args:
+        models: [(服务商, 模型)]，为None时使用麦麦模型配置中的组合
+
+    Returns:
+        tuple: ([{'provider', 'model', 'base_url', 'key'}], [缺少地址的服务商])
+    """
+    providers = config_store.load_env_document(env_path).providers() if os.path.exists(env_path) else {}
+    targets, missing = [], []
+    for provider, model in (models if models is not None else load_configured_models(config_path)):
+        info = providers.get(provider)
+        if not info or not info['base_url']:
+            if provider not in missing:
+                missing.append(provider)
+            continue
+        targets.append({'provider': provider, 'model': model, **info})
+    return targets, missing
+
+
+def percentile(values, p: float):
+    """线性插值的分位数，values为空时返回None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def run_request(target: dict, max_tokens: int = DEFAULT_MAX_TOKENS, prompt: str = BENCHMARK_PROMPT) -> dict:
+    """发送一个流式请求并计时
+
+    Returns:
+        dict: {'ok', 'status', 'error', 'ttft', 'latency', 'tokens', 'tokens_per_second'}
+    """
+    url = f"{target['base_url'].rstrip('/')}/chat/completions"
+    payload = {
+        'model': target['model'],
+        'messages': [{'role': 'user', 'content': prompt}],
+        'max_tokens': max_tokens,
+        'stream': True,
+        'stream_options': {'include_usage': True},
+    }
+    headers = {'Authorization': f"Bearer {target['key']}", 'Content-Type': 'application/json'}
+    result = {'ok': False, 'status': None, 'error': None, 'ttft': None, 'latency': None,
+              'tokens': 0, 'tokens_per_second': None}
+    start = time.perf_counter()
+    first_token = None
+    chunks = 0
+    usage_tokens = None
+    try:
+        with requests.post(url, json=payload, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            result['status'] = response.status_code
+            if response.status_code != 200:
+                result['error'] = f"HTTP {response.status_code}: {response.text[:200]}"
+                return result
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                event = json.loads(data)
+                if event.get('usage'):
+                    usage_tokens = event['usage'].get('completion_tokens')
+                for choice in event.get('choices') or []:
+                    delta = choice.get('delta') or {}
+                    if delta.get('content') or delta.get('reasoning_content'):
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                        chunks += 1
+    except (requests.RequestException, ValueError) as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+        return result
+
+    end = time.perf_counter()
+    if first_token is None:
+        result['error'] = '回复为空'
+        return result
+    tokens = usage_tokens or chunks
+    result.update(ok=True, ttft=first_token - start, latency=end - start, tokens=tokens,
+                  tokens_per_second=tokens / (end - first_token) if end > first_token else None)
+    return result
+
+
+def summarize_results(target: dict, results: list, concurrency: int, wall_time: float) -> dict:
+    """汇总一个组合的测速结果"""
+    succeeded = [result for result in results if result['ok']]
+    rate_limited = sum(1 for result in results if result['status'] == 429)
+    speeds = [result['tokens_per_second'] for result in succeeded if result['tokens_per_second']]
+
+    def rounded(value, digits=3):
+        return round(value, digits) if value is not None else None
+
+    errors = {}
+    for result in results:
+        if not result['ok']:
+            errors[result['error']] = errors.get(result['error'], 0) + 1
+    return {
+        'provider': target['provider'],
+        'model': target['model'],
+        'concurrency': concurrency,
+        'requests': len(results),
+        'succeeded': len(succeeded),
+        'error_rate': rounded(1 - len(succeeded) / len(results)) if results else None,
+        'rate_limit_rate': rounded(rate_limited / len(results)) if results else None,
+        'ttft_p50': rounded(percentile([result['ttft'] for result in succeeded], 50)),
+        'ttft_p95': rounded(percentile([result['ttft'] for result in succeeded], 95)),
+        'latency_p50': rounded(percentile([result['latency'] for result in succeeded], 50)),
+        'latency_p95': rounded(percentile([result['latency'] for result in succeeded], 95)),
+        'tokens_per_second': rounded(sum(speeds) / len(speeds), 1) if speeds else None,
+        # 所有并发请求合计的生成速度
+        'throughput': rounded(sum(result['tokens'] for result in succeeded) / wall_time, 1) if wall_time else None,
+        'errors': [{'error': error, 'count': count} for error, count in
+                   sorted(errors.items(), key=lambda item: -item[1])[:5]],
+    }
+
+
+def benchmark_target(target: dict, concurrency: int = DEFAULT_CONCURRENCY, requests_count: int = DEFAULT_REQUESTS,
+                     max_tokens: int = DEFAULT_MAX_TOKENS) -> dict:
+    """以指定并发数对一个 (服务商, 模型) 组合发送 requests_count 个请求"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: run_request(target, max_tokens), range(requests_count)))
+    return summarize_results(target, results, concurrency, time.perf_counter() - start)
+
+
+def rank_summaries(summaries: list) -> list:
+    """错误率不超过 MAX_RANKED_ERROR_RATE 的按 p95 延迟、p50 首字延迟排序，其余按错误率排在后面"""
+    def sort_key(summary):
+        if summary['succeeded'] and summary['error_rate'] <= MAX_RANKED_ERROR_RATE:
+            return (0, summary['latency_p95'], summary['ttft_p50'])
+        return (1, summary['error_rate'], summary['latency_p95'] or float('inf'))
+    return sorted(summaries, key=sort_key)
+
+
+def format_table(summaries: list) -> str:
+    """排名后的 Markdown 表格"""
+    def show(value, suffix=''):
+        return '-' if value is None else f"{value}{suffix}"
+
+    def percent(value):
+        return '-' if value is None else f"{value * 100:.1f}%"
+
+    lines = [
+        '| 排名 | 服务商 | 模型 | 并发 | 成功/请求 | 错误率 | 429 | 首字 p50 | 首字 p95 | 延迟 p50 | 延迟 p95 | 生成速度 | 合计吞吐 |',
+        '| --- | --- | --- | --- | --- | --- | --- | --- | --- | --- | --- | --- | --- |',
+    ]
+    for rank, summary in enumerate(summaries, 1):
+        lines.append(
+            f"| {rank} | {summary['provider']} | {summary['model']} | {summary['concurrency']} "
+            f"| {summary['succeeded']}/{summary['requests']} | {percent(summary['error_rate'])} "
+            f"| {percent(summary['rate_limit_rate'])} | {show(summary['ttft_p50'], 's')} | {show(summary['ttft_p95'], 's')} "
+            f"| {show(summary['latency_p50'], 's')} | {show(summary['latency_p95'], 's')} "
+            f"| {show(summary['tokens_per_second'], ' tok/s')} | {show(summary['throughput'], ' tok/s')} |")
+    return '\n'.join(lines)
+
+
+def save_report(summaries: list, settings: dict):
+    """保存 JSON 结果和 Markdown 表格，清理过旧的报告
+
+    Returns:
+        tuple: (JSON文件路径, Markdown文件路径)
+    """
+    BENCHMARK_REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    # 同一秒内的多次测速以毫秒和进程ID区分，不会互相覆盖
+    now = time.time()
+    name = f"benchmark_{time.strftime('%Y%m%d_%H%M%S', time.localtime(now))}_{int(now * 1000) % 1000:03d}_{os.getpid()}"
+    json_path = BENCHMARK_REPORT_DIR / f"{name}.json"
+    markdown_path = BENCHMARK_REPORT_DIR / f"{name}.md"
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'settings': settings, 'results': summaries},
+                  f, ensure_ascii=False, indent=2)
+    with open(markdown_path, 'w', encoding='utf-8') as f:
+        f.write(f"# API服务商测速 {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+                f"并发 {settings['concurrency']}，每个组合 {settings['requests']} 个请求，"
+                f"max_tokens {settings['max_tokens']}\n\n{format_table(summaries)}\n")
+
+    # 文件名包含时间戳，按名称排序即为时间顺序
+    history = sorted(BENCHMARK_REPORT_DIR.glob('benchmark_*.json'))
+    for old_report in history[:-BENCHMARK_REPORT_HISTORY_LIMIT]:
+        old_report.unlink()
+        old_report.with_suffix('.md').unlink(missing_ok=True)
+    return json_path, markdown_path
+
+
+def run_benchmark(targets: list, concurrency: int = DEFAULT_CONCURRENCY, requests_count: int = DEFAULT_REQUESTS,
+                  max_tokens: int = DEFAULT_MAX_TOKENS, report=print):
+    """依次对每个组合测速（组合之间不并行，避免相互影响），排名并保存报告
+
+    Returns:
+        tuple: (排名后的结果, JSON文件路径, Markdown文件路径)
+    """
+    summaries = []
+    for target in targets:
+        report(f"正在测速 {target['provider']} / {target['model']}（并发 {concurrency}，{requests_count} 个请求）...")
+        summary = benchmark_target(target, concurrency, requests_count, max_tokens)
+        report(f"成功 {summary['succeeded']}/{summary['requests']}，延迟 p50 {summary['latency_p50']} 秒，"
+               f"首字 p50 {summary['ttft_p50']} 秒")
+        summaries.append(summary)
+    summaries = rank_summaries(summaries)
+    settings = {'concurrency': concurrency, 'requests': requests_count, 'max_tokens': max_tokens}
+    return (summaries, *save_report(summaries, settings))
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """OpenAI 兼容的 /chat/completions 模拟接口"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        model = STUB_MODELS.get(request.get('model'))
+        if model is None:
+            self._send_json(404, {'error': {'message': f"model {request.get('model')} not found"}})
+            return
+        if random.random() < model['rate_limit']:
+            self._send_json(429, {'error': {'message': 'rate limited'}})
+            return
+        tokens = int(request.get('max_tokens') or DEFAULT_MAX_TOKENS)
+        time.sleep(model['ttft'])
+        if not request.get('stream'):
+            self._send_json(200, {'choices': [{'message': {'role': 'assistant', 'content': '测' * tokens}}],
+                                  'usage': {'completion_tokens': tokens}})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for index in range(tokens):
+            if index:
+                time.sleep(model['token_interval'])
+            event = {'choices': [{'index': 0, 'delta': {'content': '测'}}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        if (request.get('stream_options') or {}).get('include_usage'):
+            event = {'choices': [], 'usage': {'completion_tokens': tokens}}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_stub_server(port: int = 0) -> ThreadingHTTPServer:
+    """在后台线程中启动本地模拟服务，port为0时自动选择端口"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), _StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def get_stub_targets(server: ThreadingHTTPServer) -> list:
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    return [{'provider': STUB_PROVIDER, 'model': model, 'base_url': base_url, 'key': 'stub'} for model in STUB_MODELS]
+
+
+def parse_model_option(value: str):
+    """解析 服务商:模型"""
+    provider, separator, model = value.partition(':')
+    if not separator or not provider or not model:
+        raise argparse.ArgumentTypeError(f"格式应为 服务商:模型，例如 SILICONFLOW:Qwen/Qwen3-8B，而不是 {value}")
+    return provider, model
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="测量各API服务商和模型的延迟与生成速度")
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    run_parser = subparsers.add_parser('run', help="测速并保存排名")
+    run_parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="每个组合的并发请求数")
+    run_parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="每个组合的请求总数")
+    run_parser.add_argument('--max-tokens', type=int, default=DEFAULT_MAX_TOKENS, help="每个请求的最大生成长度")
+    run_parser.add_argument('--model', type=parse_model_option, action='append',
+                            help="指定测速的 服务商:模型（可重复），默认使用麦麦模型配置中的组合")
+    run_parser.add_argument('--offline', action='store_true', help="对本地模拟服务测速，不访问任何服务商")
+    stub_parser = subparsers.add_parser('stub', help="运行本地 OpenAI 兼容模拟服务")
+    stub_parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    if args.action == 'stub':
+        server = ThreadingHTTPServer(('127.0.0.1', args.port), _StubHandler)
+        print(f"模拟服务已启动: http://127.0.0.1:{args.port}/v1，模型 {', '.join(STUB_MODELS)}，按 Ctrl+C 停止")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.concurrency < 1 or args.requests < 1:
+        print("❌ 并发数和请求数需要大于0")
+        return 1
+    server = None
+    if args.offline:
+        server = start_stub_server()
+        targets = get_stub_targets(server)
+    else:
+        targets, missing = build_targets(args.model)
+        for provider in missing:
+            print(f"⚠️  .env 中没有服务商 {provider} 的 BASE_URL，跳过")
+        if not targets:
+            print("❌ 没有可测速的服务商和模型")
+            return 1
+    try:
+        summaries, json_path, markdown_path = run_benchmark(
+            targets, args.concurrency, args.requests, args.max_tokens)
+    finally:
+        if server is not None:
+            server.shutdown()
+    print()
+    print(format_table(summaries))
+    print(f"\n📊 测速报告: {markdown_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+NapCat 版本目录发现
+功能：查找 modules/napcat 和 modules/napcatframework 中已安装的 QQ/NapCat 版本目录，
+确定当前使用的版本，供生成 NapCat 配置时写入正确的目录
+
+当前版本优先读取 versions/config.json 中的 curVersion（QQ 启动时使用的版本），
+没有时取版本号最高的目录。扫描结果按 versions 目录的修改时间缓存，
+升级 NapCat（新增或删除版本目录）后会自动重新扫描。
+"""
+
+import json
+import os
+import re
+
+from config_store import atomic_write_text
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 版本扫描结果缓存
+VERSION_CACHE_PATH = os.path.join(BASE_DIR, 'runtime', 'napcat_versions.json')
+# 未找到任何版本目录时使用的版本（一键包自带的版本）
+DEFAULT_NAPCAT_VERSION = '9.9.19-34740'
+# NapCat 配置文件的文件名模式
+PER_QQ_CONFIG_PATTERN = re.compile(r'^(napcat|onebot11)_(\d+)\.json$')
+
+# NapCat 安装目录及其版本目录下的配置目录
+NAPCAT_TREES = [
+    {
+        'name': 'NapCat',
+        'key': 'napcat',
+        'root': os.path.join(BASE_DIR, 'modules', 'napcat'),
+        'config_subdir': os.path.join('resources', 'app', 'napcat', 'config'),
+    },
+    {
+        'name': 'NapCat有头模式',
+        'key': 'napcatframework',
+        'root': os.path.join(BASE_DIR, 'modules', 'napcatframework'),
+        'config_subdir': os.path.join('resources', 'app', 'LiteLoader', 'plugins', 'NapCat', 'config'),
+    },
+]
+
+
+def version_sort_key(version: str):
+    """按数字比较版本号，如 9.9.19-34740 < 9.9.20-35184"""
+    return [int(part) for part in re.findall(r'\d+', version)]
+
+
+def _versions_dir(tree) -> str:
+    return os.path.join(tree['root'], 'versions')
+
+
+def _dir_signature(tree):
+    """versions 目录及其 config.json 的修改时间，用于判断缓存是否有效"""
+    signature = []
+    for path in (_versions_dir(tree), os.path.join(_versions_dir(tree), 'config.json')):
+        try:
+            signature.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return signature
+
+
+def _read_current_version(tree):
+    try:
+        with open(os.path.join(_versions_dir(tree), 'config.json'), 'r', encoding='utf-8') as f:
+            return json.load(f).get('curVersion')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def scan_tree(tree) -> dict:
+    """扫描安装目录中的版本目录
+
+    Returns:
+        dict: {'versions': [按版本号排序的版本目录名], 'active': 当前版本或None}
+    """
+    versions_dir = _versions_dir(tree)
+    try:
+        names = os.listdir(versions_dir)
+    except OSError:
+        names = []
+    versions = sorted(
+        (name for name in names
+         if re.match(r'^\d+(\.\d+)+', name) and os.path.isdir(os.path.join(versions_dir, name, 'resources'))),
+        key=version_sort_key)
+
+    active = _read_current_version(tree)
+    if active not in versions:
+        active = versions[-1] if versions else None
+    return {'versions': versions, 'active': active}
+
+
+def _load_cache() -> dict:
+    try:
+        with open(VERSION_CACHE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def get_version_index(refresh: bool = False) -> dict:
+    """获取所有安装目录的版本索引，目录未变化时使用缓存
+
+    Returns:
+        dict: {安装目录key: {'versions': [...], 'active': 当前版本或None, 'signature': [...]}}
+    """
+    cache = {} if refresh else _load_cache()
+    index = {}
+    changed = False
+    for tree in NAPCAT_TREES:
+        signature = _dir_signature(tree)
+        cached = cache.get(tree['key'])
+        if cached and cached.get('signature') == signature:
+            index[tree['key']] = cached
+            continue
+        index[tree['key']] = {**scan_tree(tree), 'signature': signature}
+        changed = True
+    if changed:
+        atomic_write_text(VERSION_CACHE_PATH, json.dumps(index, ensure_ascii=False, indent=2))
+    return index
+
+
+def get_active_config_dirs() -> list:
+    """当前版本的配置目录
+
+    Returns:
+        list: [(安装目录信息, 版本, 配置目录)]，没有任何版本目录时使用 DEFAULT_NAPCAT_VERSION
+    """
+    index = get_version_index()
+    result = []
+    for tree in NAPCAT_TREES:
+        version = index[tree['key']]['active'] or DEFAULT_NAPCAT_VERSION
+        result.append((tree, version, os.path.join(_versions_dir(tree), version, tree['config_subdir'])))
+    return result
+
+
+def find_stale_configs(qq_number=None) -> list:
+    """查找旧版本目录中残留的 napcat_<QQ>.json / onebot11_<QQ>.json，这些文件不会再被读取
+
+    Returns:
+        list: [(安装目录名称, 版本, 文件路径)]
+    """
+    index = get_version_index()
+    stale = []
+    for tree in NAPCAT_TREES:
+        entry = index[tree['key']]
+        for version in entry['versions']:
+            if version == entry['active']:
+                continue
+            config_dir = os.path.join(_versions_dir(tree), version, tree['config_subdir'])
+            try:
+                names = os.listdir(config_dir)
+            except OSError:
+                continue
+            for name in sorted(names):
+                match = PER_QQ_CONFIG_PATTERN.match(name)
+                if match and (qq_number is None or match.group(2) == str(qq_number)):
+                    stale.append((tree['name'], version, os.path.join(config_dir, name)))
+    return stale
+
+
+if __name__ == '__main__':
+    version_index = get_version_index(refresh=True)
+    for tree in NAPCAT_TREES:
+        entry = version_index[tree['key']]
+        print(f"{tree['name']}: 当前版本 {entry['active'] or '未安装'}，已安装 {', '.join(entry['versions']) or '无'}")
+    for name, version, path in find_stale_configs():
+        print(f"⚠️  旧版本残留配置（{name} {version}）: {path}")
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+OneBot 连接配置方案
+功能：为 NapCat 连接适配器的 websocket 客户端（MaiBot Main）提供命名的连接配置方案，
+并测量适配器重启后 NapCat 实际重连所需的时间
+
+方案设置心跳间隔（heartInterval）、重连间隔（reconnectInterval）、debug 和 reportSelfMessage：
+- low-latency: 适配器重启后约1秒内重连，心跳更频繁
+- balanced: 兼顾重连速度和流量
+- low-traffic: 默认方案，与旧版固定配置相同的30秒间隔，流量最少，但适配器重启后最多丢失30秒消息
+
+未选择方案时使用 low-traffic，升级后已有的连接行为不变；需要更快重连时在菜单中切换方案。
+
+所选方案保存在 runtime/onebot_profile.json，生成 onebot11_<QQ>.json 时使用，
+也可以直接应用到已有的配置文件（NapCat 重启后生效）。
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from config_store import atomic_write_text, config_store
+from napcat_versions import get_active_config_dirs
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_SELECTION_PATH = os.path.join(BASE_DIR, 'runtime', 'onebot_profile.json')
+RECONNECT_MEASUREMENTS_PATH = os.path.join(BASE_DIR, 'runtime', 'onebot_reconnect_measurements.json')
+ADAPTER_DIR = os.path.join(BASE_DIR, 'modules', 'MaiBot-Napcat-Adapter')
+ADAPTER_CONFIG_PATH = os.path.join(ADAPTER_DIR, 'config.toml')
+ADAPTER_PYTHON_PATH = os.path.join(BASE_DIR, 'runtime', 'python31211', 'bin', 'python.exe')
+# 适配器监听的默认端口（适配器配置 [napcat_server] 段）
+DEFAULT_ADAPTER_PORT = 8095
+# MaiBot 使用的 websocket 客户端名称，分片部署时其他分片的客户端名称为 "MaiBot Main 分片N"
+CLIENT_NAME = 'MaiBot Main'
+# 保留的测量记录数
+MEASUREMENT_HISTORY_LIMIT = 100
+# 检测连接状态的间隔（秒）
+POLL_INTERVAL = 0.1
+
+CONNECTION_PROFILES = {
+    'low-latency': {
+        'name': '低延迟',
+        'description': '适配器重启后约1秒内重连，心跳5秒',
+        'heartInterval': 5000,
+        'reconnectInterval': 1000,
+        'debug': False,
+        'reportSelfMessage': False,
+    },
+    'balanced': {
+        'name': '均衡',
+        'description': '重连间隔5秒，心跳15秒，适配器重启后更快恢复',
+        'heartInterval': 15000,
+        'reconnectInterval': 5000,
+        'debug': False,
+        'reportSelfMessage': False,
+    },
+    'low-traffic': {
+        'name': '低流量',
+        'description': '重连和心跳间隔均为30秒（默认，与旧版相同），适配器重启后最多丢失30秒消息',
+        'heartInterval': 30000,
+        'reconnectInterval': 30000,
+        'debug': False,
+        'reportSelfMessage': False,
+    },
+}
+DEFAULT_PROFILE = 'low-traffic'
+# 方案中写入 websocket 客户端配置的字段
+CLIENT_SETTING_KEYS = ('heartInterval', 'reconnectInterval', 'debug', 'reportSelfMessage')
+
+
+def load_profile_selection() -> dict:
+    """读取所选方案和单独设置的 debug / reportSelfMessage
+
+    Returns:
+        dict: {'profile': 方案名, 'overrides': {字段: 值}}
+    """
+    try:
+        with open(PROFILE_SELECTION_PATH, 'r', encoding='utf-8') as f:
+            selection = json.load(f)
+    except (OSError, ValueError):
+        selection = {}
+    if selection.get('profile') not in CONNECTION_PROFILES:
+        selection['profile'] = DEFAULT_PROFILE
+    selection['overrides'] = {key: value for key, value in (selection.get('overrides') or {}).items()
+                              if key in ('debug', 'reportSelfMessage')}
+    return selection
+
+
+def save_profile_selection(profile: str, overrides: dict = None) -> None:
+    if profile not in CONNECTION_PROFILES:
+        raise ValueError(f"未知的连接配置方案: {profile}")
+    atomic_write_text(PROFILE_SELECTION_PATH, json.dumps(
+        {'profile': profile, 'overrides': overrides or {}}, ensure_ascii=False, indent=2))
+
+
+def get_client_settings(profile: str = None) -> dict:
+    """所选方案（或指定方案）的 websocket 客户端设置"""
+    selection = load_profile_selection()
+    profile = profile or selection['profile']
+    settings = {key: CONNECTION_PROFILES[profile][key] for key in CLIENT_SETTING_KEYS}
+    settings.update(selection['overrides'])
+    return settings
+
+
+def is_maibot_client(client: dict) -> bool:
+    """websocket 客户端是否连接 MaiBot 适配器（包括分片的客户端）"""
+    name = client.get('name') or ''
+    return name == CLIENT_NAME or name.startswith(f"{CLIENT_NAME} ")
+
+
+def apply_client_settings(config: dict, settings: dict) -> bool:
+    """将设置写入 OneBot 配置中连接 MaiBot 适配器的 websocket 客户端
+
+    Returns:
+        bool: 配置是否发生了变化
+    """
+    changed = False
+    for client in config.get('network', {}).get('websocketClients', []):
+        if not is_maibot_client(client):
+            continue
+        for key, value in settings.items():
+            if client.get(key) != value:
+                client[key] = value
+                changed = True
+    return changed
+
+
+def apply_profile_to_existing_configs(profile: str = None) -> list:
+    """将方案应用到当前版本 NapCat 配置目录中已有的 onebot11_<QQ>.json
+
+    Returns:
+        list: 被修改的文件路径
+    """
+    settings = get_client_settings(profile)
+    updated = []
+    for _, _, config_dir in get_active_config_dirs():
+        try:
+            names = sorted(os.listdir(config_dir))
+        except OSError:
+            continue
+        for name in names:
+            if not re.match(r'^onebot11_\d+\.json$', name):
+                continue
+            path = os.path.join(config_dir, name)
+            with open(path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            if apply_client_settings(config, settings):
+                config_store.save_text(path, json.dumps(config, indent=2, ensure_ascii=False))
+                updated.append(path)
+    return updated
+
+
+def get_adapter_port() -> int:
+    """读取适配器监听的端口"""
+    try:
+        config = config_store.load_toml(ADAPTER_CONFIG_PATH)
+        return int(config.get('napcat_server', {}).get('port', DEFAULT_ADAPTER_PORT))
+    except Exception:
+        return DEFAULT_ADAPTER_PORT
+
+
+def get_port_table() -> dict:
+    """通过一次 netstat 获取本机所有端口的TCP连接状态
+
+    Returns:
+        dict: {本地端口: {'LISTENING', 'ESTABLISHED', ...}}
+    """
+    try:
+        output = subprocess.run(['netstat', '-an'], capture_output=True, text=True,
+                                errors='ignore', timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return {}
+    table = {}
+    for line in output.splitlines():
+        parts = line.split()
+        if not parts or not parts[0].upper().startswith('TCP'):
+            continue
+        # 第一个地址为本地地址（Windows 与 Linux 的 netstat 列数不同，macOS 用 . 分隔端口）
+        addresses = [part for part in parts[1:] if re.search(r'[:.](\d+|\*)$', part)]
+        if len(addresses) < 2:
+            continue
+        port = re.search(r'[:.](\d+)$', addresses[0])
+        if port:
+            state = parts[-1].upper()
+            table.setdefault(int(port.group(1)), set()).add('LISTENING' if state == 'LISTEN' else state)
+    return table
+
+
+def get_port_states(port: int) -> set:
+    """获取本机端口的TCP连接状态，如 {'LISTENING', 'ESTABLISHED'}（只看本地一侧）"""
+    return get_port_table().get(port, set())
+
+
+def _wait_for_state(port: int, state: str, timeout: float, process=None):
+    """等待端口进入指定状态，返回等待的秒数，超时或适配器退出时返回None"""
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if process is not None and process.poll() is not None:
+            return None
+        if state in get_port_states(port):
+            return time.monotonic() - start
+        time.sleep(POLL_INTERVAL)
+    return None
+
+
+def _start_adapter():
+    python_path = ADAPTER_PYTHON_PATH if os.path.exists(ADAPTER_PYTHON_PATH) else sys.executable
+    return subprocess.Popen([python_path, 'main.py'], cwd=ADAPTER_DIR,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL)
+
+
+def _stop_adapter(process) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def measure_reconnect(trials: int = 3, report=print) -> dict:
+    """重启适配器若干次，测量每次适配器开始监听后 NapCat 重新连上所需的时间
+
+    测量前需要关闭已运行的适配器，并确保 NapCat 已在运行且使用了所选方案（修改方案后需重启 NapCat）。
+
+    Returns:
+        dict: 测量记录 {'profile', 'settings', 'samples', 'timeouts', 'average', 'max', 'time'}
+    """
+    selection = load_profile_selection()
+    settings = get_client_settings()
+    port = get_adapter_port()
+    # 最长等待两个重连间隔
+    timeout = max(settings['reconnectInterval'] * 2 / 1000, 10)
+    samples, timeouts = [], 0
+
+    if 'LISTENING' in get_port_states(port):
+        raise RuntimeError(f"端口 {port} 已被占用，请先关闭正在运行的适配器")
+
+    process = _start_adapter()
+    try:
+        # 首次启动：等待 NapCat 连上，作为后续测量的起点
+        if _wait_for_state(port, 'LISTENING', 60, process) is None:
+            raise RuntimeError("适配器未能启动，请先单独启动适配器检查错误")
+        if _wait_for_state(port, 'ESTABLISHED', timeout, process) is None:
+            raise RuntimeError("NapCat 未连接到适配器，请确认 NapCat 已启动")
+
+        for trial in range(1, trials + 1):
+            _stop_adapter(process)
+            process = _start_adapter()
+            if _wait_for_state(port, 'LISTENING', 60, process) is None:
+                raise RuntimeError("适配器重启失败")
+            elapsed = _wait_for_state(port, 'ESTABLISHED', timeout, process)
+            if elapsed is None:
+                timeouts += 1
+                report(f"第 {trial} 次：{timeout:.0f} 秒内未重连")
+            else:
+                samples.append(round(elapsed, 2))
+                report(f"第 {trial} 次：重连耗时 {elapsed:.2f} 秒")
+    finally:
+        _stop_adapter(process)
+
+    record = {
+        'profile': selection['profile'],
+        'settings': settings,
+        'samples': samples,
+        'timeouts': timeouts,
+        'average': round(sum(samples) / len(samples), 2) if samples else None,
+        'max': max(samples) if samples else None,
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    history = load_measurements()
+    history.append(record)
+    atomic_write_text(RECONNECT_MEASUREMENTS_PATH, json.dumps(
+        history[-MEASUREMENT_HISTORY_LIMIT:], ensure_ascii=False, indent=2))
+    return record
+
+
+def load_measurements() -> list:
+    try:
+        with open(RECONNECT_MEASUREMENTS_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def summarize_measurements() -> dict:
+    """按方案汇总历史测量结果
+
+    Returns:
+        dict: {方案名: {'runs': 次数, 'average': 平均重连秒数, 'max': 最长重连秒数, 'timeouts': 超时次数}}
+    """
+    summary = {}
+    for record in load_measurements():
+        item = summary.setdefault(record['profile'], {'samples': [], 'timeouts': 0, 'runs': 0})
+        item['samples'].extend(record['samples'])
+        item['timeouts'] += record['timeouts']
+        item['runs'] += 1
+    for item in summary.values():
+        samples = item.pop('samples')
+        item['average'] = round(sum(samples) / len(samples), 2) if samples else None
+        item['max'] = max(samples) if samples else None
+    return summary
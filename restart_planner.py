@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+按配置改动重启组件
+功能：对比各组件启动时的配置快照与当前配置，把改动的配置项对应到所属的组件，
+只按依赖顺序重启受影响的组件
+
+组件启动时记录当时各配置文件的内容哈希（内容保存在配置快照中）。
+生成重启计划时逐个配置项对比，按 OWNERSHIP_RULES 找到配置项所属的组件：
+例如只修改适配器的群聊白名单时只需重启适配器，NapCat 无需重新登录；
+修改麦麦的模型配置段只需重启麦麦主程序。
+
+重启顺序按依赖排列：麦麦主程序（适配器连接它）→ 适配器（NapCat 连接它）→ NapCat。
+组件启动时记录其窗口（cmd）进程的PID，重启时结束整个进程树，窗口随之关闭；
+没有记录PID的组件按其监听的端口找到进程。找不到旧实例时不会启动新实例，避免同时运行两份。
+"""
+
+import fnmatch
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+
+import tomlkit
+
+from config_snapshots import read_snapshot, snapshot_text
+from config_store import atomic_write_text, config_store
+from env_document import EnvDocument
+from napcat_versions import PER_QQ_CONFIG_PATTERN, get_active_config_dirs
+from onebot_profiles import get_adapter_port
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 各组件启动时的配置文件哈希
+RESTART_BASELINE_PATH = os.path.join(BASE_DIR, 'runtime', 'restart_baseline.json')
+ENV_PATH = os.path.join(BASE_DIR, 'modules', 'MaiBot', '.env')
+# 麦麦主程序默认监听端口（.env 中的 PORT）
+DEFAULT_MAIN_BOT_PORT = 8000
+# NapCat WebUI 端口，用于找到 NapCat 进程
+NAPCAT_WEBUI_PORT = 6099
+# 结束进程后等待端口释放的最长时间（秒）
+PORT_RELEASE_TIMEOUT = 15
+
+# 组件按依赖顺序排列，重启时按此顺序进行
+RESTART_COMPONENTS = [
+    {'key': 'main_bot', 'name': '麦麦主程序'},
+    {'key': 'adapter', 'name': 'NapCat适配器'},
+    {'key': 'napcat', 'name': 'NapCat', 'relogin': True},
+]
+
+# 受管理的配置文件：配置项按规则顺序匹配（第一条匹配的规则生效），* 匹配任意配置项
+OWNERSHIP_RULES = [
+    {
+        'key': 'bot_config',
+        'path': os.path.join(BASE_DIR, 'modules', 'MaiBot', 'config', 'bot_config.toml'),
+        'format': 'toml',
+        'rules': [
+            # 更换QQ号需要 NapCat 重新登录
+            ('bot.qq_account', ['main_bot', 'napcat']),
+            ('*', ['main_bot']),
+        ],
+    },
+    {
+        'key': 'lpmm_config',
+        'path': os.path.join(BASE_DIR, 'modules', 'MaiBot', 'config', 'lpmm_config.toml'),
+        'format': 'toml',
+        'rules': [('*', ['main_bot'])],
+    },
+    {
+        'key': 'env',
+        'path': ENV_PATH,
+        'format': 'env',
+        'rules': [('*', ['main_bot'])],
+    },
+    {
+        'key': 'adapter_config',
+        'path': os.path.join(BASE_DIR, 'modules', 'MaiBot-Napcat-Adapter', 'config.toml'),
+        'format': 'toml',
+        'rules': [('*', ['adapter'])],
+    },
+]
+# NapCat 的 napcat_<QQ>.json / onebot11_<QQ>.json 由 NapCat 读取
+NAPCAT_CONFIG_RULES = [('*', ['napcat'])]
+
+
+def get_tracked_configs() -> list:
+    """受管理的配置文件，包括当前版本 NapCat 配置目录中的每个QQ号配置"""
+    configs = list(OWNERSHIP_RULES)
+    for tree, _, config_dir in get_active_config_dirs():
+        try:
+            names = sorted(os.listdir(config_dir))
+        except OSError:
+            continue
+        for name in names:
+            if PER_QQ_CONFIG_PATTERN.match(name):
+                configs.append({
+                    'key': f"{tree['key']}/{name}",
+                    'path': os.path.join(config_dir, name),
+                    'format': 'json',
+                    'rules': NAPCAT_CONFIG_RULES,
+                })
+    return configs
+
+
+def _read_text(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def parse_config_text(text: str, config_format: str) -> dict:
+    if config_format == 'toml':
+        return tomlkit.parse(text).unwrap()
+    if config_format == 'json':
+        return json.loads(text)
+    return EnvDocument(text).as_dict()
+
+
+def flatten_config(config, prefix: str = '') -> dict:
+    """将嵌套的配置展开为 {'a.b.c': 值}，数组作为一个整体"""
+    flat = {}
+    for key, value in config.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict) and value:
+            flat.update(flatten_config(value, path))
+        else:
+            flat[path] = value
+    return flat
+
+
+def diff_config_keys(old_text: str, new_text: str, config_format: str) -> list:
+    """对比两个版本的配置，返回新增、删除或值发生变化的配置项"""
+    old = flatten_config(parse_config_text(old_text, config_format))
+    new = flatten_config(parse_config_text(new_text, config_format))
+    return sorted(key for key in set(old) | set(new) if old.get(key, object()) != new.get(key, object()))
+
+
+def owners_of(key_path: str, rules) -> list:
+    for pattern, components in rules:
+        if fnmatch.fnmatchcase(key_path, pattern):
+            return components
+    return []
+
+
+def _load_baseline() -> dict:
+    try:
+        with open(RESTART_BASELINE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_launch_baseline(component: str, pid: int = None) -> None:
+    """组件启动时记录各配置文件当前内容的快照和窗口进程的PID，作为之后对比和重启的基准"""
+    baseline = _load_baseline()
+    hashes = {}
+    for config in get_tracked_configs():
+        text = _read_text(config['path'])
+        if text is not None:
+            hashes[config['key']] = snapshot_text(config['path'], text, reason=f'启动 {component} 时')
+    baseline[component] = {'time': time.time(), 'configs': hashes, 'pid': pid}
+    atomic_write_text(RESTART_BASELINE_PATH, json.dumps(baseline, ensure_ascii=False, indent=2))
+
+
+def plan_restart() -> dict:
+    """根据配置改动生成重启计划
+
+    Returns:
+        dict: {'restart': [按依赖顺序需要重启的组件], 'reasons': {组件: [(配置文件, 配置项)]},
+               'untracked': [未通过控制台启动、没有启动基准的组件]}
+    """
+    baseline = _load_baseline()
+    reasons = {}
+    untracked = [component['key'] for component in RESTART_COMPONENTS if component['key'] not in baseline]
+    changed_keys = {}
+    order = [component['key'] for component in RESTART_COMPONENTS]
+
+    for config in get_tracked_configs():
+        current = _read_text(config['path'])
+        if current is None:
+            continue
+        current_hash = None
+        for component in RESTART_COMPONENTS:
+            launched = baseline.get(component['key'])
+            if launched is None:
+                continue
+            base_hash = launched['configs'].get(config['key'])
+            if current_hash is None:
+                current_hash = snapshot_text(config['path'], current, reason='生成重启计划时')
+            if base_hash == current_hash:
+                continue
+            if base_hash is None:
+                # 组件启动后新建的配置文件，视为全部配置项都有改动
+                keys = sorted(flatten_config(parse_config_text(current, config['format'])))
+            else:
+                cache_key = (config['key'], base_hash)
+                if cache_key not in changed_keys:
+                    try:
+                        changed_keys[cache_key] = diff_config_keys(
+                            read_snapshot(base_hash), current, config['format'])
+                    except Exception:
+                        # 基准快照缺失或无法解析时无法判断改动的配置项
+                        changed_keys[cache_key] = ['*']
+                keys = changed_keys[cache_key]
+            for key_path in keys:
+                owners = order if key_path == '*' else owners_of(key_path, config['rules'])
+                if component['key'] in owners:
+                    reasons.setdefault(component['key'], []).append((config['key'], key_path))
+
+    return {
+        'restart': [key for key in order if key in reasons],
+        'reasons': reasons,
+        'untracked': untracked,
+    }
+
+
+def get_component(key: str) -> dict:
+    return next(component for component in RESTART_COMPONENTS if component['key'] == key)
+
+
+def get_component_port(key: str) -> int:
+    if key == 'adapter':
+        return get_adapter_port()
+    if key == 'napcat':
+        return NAPCAT_WEBUI_PORT
+    try:
+        return int(config_store.load_env(ENV_PATH).get('PORT') or DEFAULT_MAIN_BOT_PORT)
+    except (OSError, ValueError):
+        return DEFAULT_MAIN_BOT_PORT
+
+
+def get_listening_pids(port: int) -> set:
+    """通过 netstat 找到监听指定端口的进程ID"""
+    args = ['netstat', '-ano'] if sys.platform == 'win32' else ['netstat', '-anp']
+    try:
+        output = subprocess.run(args, capture_output=True, text=True, errors='ignore', timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return set()
+    pattern = re.compile(rf'[:.]{port}$')
+    pids = set()
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) < 4 or not parts[0].upper().startswith('TCP'):
+            continue
+        if not any(state in parts for state in ('LISTENING', 'LISTEN')):
+            continue
+        local = next((part for part in parts[1:] if ':' in part or pattern.search(part)), '')
+        if not pattern.search(local):
+            continue
+        # Windows 最后一列为PID，Linux 为 "PID/程序名"
+        pid = parts[-1].split('/')[0]
+        if pid.isdigit() and int(pid) > 0:
+            pids.add(int(pid))
+    return pids
+
+
+def is_process_alive(pid: int) -> bool:
+    """进程是否仍在运行；Windows 上同时检查是否为 cmd 窗口进程，避免PID被复用后误判"""
+    if sys.platform == 'win32':
+        try:
+            output = subprocess.run(['tasklist', '/FI', f'PID eq {pid}', '/FI', 'IMAGENAME eq cmd.exe', '/NH'],
+                                    capture_output=True, text=True, errors='ignore', timeout=10).stdout
+        except (OSError, subprocess.SubprocessError):
+            return False
+        return str(pid) in output.split()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _kill_process_tree(pid: int) -> None:
+    """结束进程及其子进程：Windows 使用 taskkill /T，其他系统结束以该进程为首的进程组"""
+    if sys.platform == 'win32':
+        subprocess.run(['taskkill', '/PID', str(pid), '/T', '/F'], capture_output=True)
+        return
+    try:
+        # 控制台启动的组件是独立进程组的组长（start_new_session），进程组ID即其PID
+        os.killpg(pid, signal.SIGTERM)
+    except OSError:
+        # 按端口找到的进程不一定是组长，只能结束该进程
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+
+def stop_component(key: str):
+    """结束组件：优先结束启动时记录的窗口进程树，没有记录时结束监听组件端口的进程，并等待端口释放
+
+    Returns:
+        True: 组件在运行并已结束
+        False: 组件已不在运行（启动的窗口已关闭，端口也无人监听）
+        None: 找不到组件的旧实例或无法结束（如端口已改变），此时不应启动新实例
+    """
+    launched_pid = _load_baseline().get(key, {}).get('pid')
+    port = get_component_port(key)
+    if launched_pid and is_process_alive(launched_pid):
+        _kill_process_tree(launched_pid)
+        deadline = time.monotonic() + PORT_RELEASE_TIMEOUT
+        while is_process_alive(launched_pid):
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.2)
+    else:
+        pids = get_listening_pids(port)
+        if not pids:
+            # 启动的窗口已关闭即为不在运行；没有记录窗口时无法确认旧实例是否在其他端口运行
+            return False if launched_pid else None
+        for pid in pids:
+            _kill_process_tree(pid)
+    deadline = time.monotonic() + PORT_RELEASE_TIMEOUT
+    while get_listening_pids(port) and time.monotonic() < deadline:
+        time.sleep(0.2)
+    return True if not get_listening_pids(port) else None
+
+
+def execute_restart_plan(plan: dict, launchers: dict, report=print) -> bool:
+    """按依赖顺序重启计划中的组件
+
+    Args:
+        plan: plan_restart 的结果
+        launchers: {组件: 启动函数}，启动函数返回是否成功
+        report: 输出函数
+
+    Returns:
+        bool: 所有组件是否都重启成功
+    """
+    success = True
+    for key in plan['restart']:
+        name = get_component(key)['name']
+        stopped = stop_component(key)
+        if stopped is None:
+            report(f"❌ 找不到或无法结束正在运行的 {name}（端口可能已改变），为避免同时运行两份已跳过，"
+                   f"请手动关闭其窗口后重新启动")
+            success = False
+            continue
+        if stopped:
+            report(f"已停止 {name}")
+        if launchers[key]():
+            report(f"✅ 已重启 {name}")
+        else:
+            report(f"❌ 重启 {name} 失败")
+            success = False
+    return success
@@ -0,0 +1,541 @@
+# -*- coding: utf-8 -*-
+"""
+分群部署
+功能：一个QQ账号（一个 NapCat）后面运行多个麦麦主程序，按群分担消息处理
+
+每个分片是一组麦麦主程序和适配器：分片1就是该账号原有的目录，其余分片位于 shards/<QQ号>/<分片号>/，
+代码以硬链接共享（见 fleet.mirror_module），配置从分片1复制，数据库和日志各自独立。
+NapCat 为每个分片的适配器各建一个 websocket 客户端，所有消息都会发给每个适配器，
+适配器再按各自的群聊白名单（group_list_type = whitelist）只处理分到本分片的群；
+私聊只由分片1处理。
+
+各分片的群聊白名单合起来是该账号的全部群：在任一分片的白名单中添加的群会在下次重新分配时加入，
+从所有分片移除群请使用 remove_groups。
+重新分配时从各分片的数据库统计最近一段时间每个群的消息数，
+只在最忙的分片超过平均负载一定比例时才移动群，且每次移动尽量少的群——
+群移动到其他分片后，麦麦在该群的聊天记录和记忆留在原分片的数据库中。
+更新模块（或回滚）后 update_modules 会调用 sync_shards，让各分片使用更新后的代码。
+
+命令行用法：
+- python shards.py set <QQ号> <分片数> [--mode hardlink|reflink|copy]
+- python shards.py rebalance <QQ号> [--hours 24] [--tolerance 0.2] [--dry-run]
+- python shards.py status <QQ号>
+- python shards.py sync: 将所有分片的代码同步到 modules/ 中的当前版本
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import tomlkit
+
+from accounts import allocate_ports, find_account, get_account_paths, report_sync, sync_account_code, write_ports
+from chat_lists import ChatLists
+from config_store import atomic_write_text, config_store
+from fleet import PROVISION_MODES, mirror_module
+from init_napcat import create_onebot_config
+from napcat_versions import get_active_config_dirs
+from onebot_profiles import CLIENT_NAME, get_client_settings, get_port_table
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARDS_DIR = os.path.join(BASE_DIR, 'shards')
+SHARDS_STATE_PATH = os.path.join(BASE_DIR, 'runtime', 'shards.json')
+MAX_SHARDS = 8
+# 统计消息数的默认时间范围（小时）
+DEFAULT_RATE_WINDOW_HOURS = 24
+# 最忙的分片超过平均负载的比例不大于此值时不移动群
+DEFAULT_TOLERANCE = 0.2
+# 分片的 websocket 客户端名称前缀，分片1使用 CLIENT_NAME
+SHARD_CLIENT_PREFIX = f"{CLIENT_NAME} 分片"
+
+
+def load_shards() -> dict:
+    """读取分片部署
+
+    Returns:
+        dict: {QQ号: {'qq', 'shards': [{'dir', 'adapter_port', 'core_port', 'mode'}], 'assignment': {群号: 分片序号},
+               'rates': {群号: 消息数}, 'rebalanced'}}，shards 中第一个元素为分片1，dir 为None
+    """
+    try:
+        with open(SHARDS_STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_shards(deployments: dict) -> None:
+    atomic_write_text(SHARDS_STATE_PATH, json.dumps(deployments, ensure_ascii=False, indent=2))
+
+
+def get_shard_ports() -> set:
+    """分片（不含分片1）占用的端口，供分配端口时避开"""
+    ports = set()
+    for deployment in load_shards().values():
+        for shard in deployment['shards'][1:]:
+            ports.update((shard['adapter_port'], shard['core_port']))
+    return ports
+
+
+def get_shard_list(qq_number) -> list:
+    """账号的所有分片，包括分片1（账号原有的目录）
+
+    Returns:
+        list: [{'number', 'adapter_port', 'core_port', 'paths'}]，未部署分片时只有分片1
+
+    Raises:
+        ValueError: 账号不存在
+    """
+    account = find_account(qq_number)
+    if account is None:
+        raise ValueError(f"账号 {qq_number} 不存在")
+    result = [{'number': 1, 'adapter_port': account['adapter_port'], 'core_port': account['core_port'],
+               'paths': get_account_paths(account)}]
+    deployment = load_shards().get(str(qq_number))
+    for number, shard in enumerate(deployment['shards'][1:] if deployment else [], 2):
+        result.append({'number': number, 'adapter_port': shard['adapter_port'], 'core_port': shard['core_port'],
+                       'paths': get_account_paths(shard)})
+    return result
+
+
+def _load_chat_lists(shard: dict):
+    config = config_store.load_toml(shard['paths']['adapter_config'])
+    if 'chat' not in config:
+        config['chat'] = tomlkit.table()
+    return config, ChatLists(config)
+
+
+def collect_groups(shard_list: list) -> set:
+    """各分片群聊白名单的并集，即该账号的全部群"""
+    groups = set()
+    for shard in shard_list:
+        _, lists = _load_chat_lists(shard)
+        groups.update(lists['group_list'])
+    return groups
+
+
+def measure_group_rates(shard_list: list, hours: float = DEFAULT_RATE_WINDOW_HOURS):
+    """从各分片的麦麦数据库统计最近 hours 小时内每个群的消息数
+
+    Returns:
+        tuple: ({群号: 消息数}, [无法读取的数据库及原因])
+    """
+    since = time.time() - hours * 3600
+    counts, errors = {}, []
+    for shard in shard_list:
+        db_path = os.path.join(shard['paths']['data'], 'MaiBot.db')
+        if not os.path.exists(db_path):
+            continue
+        try:
+            connection = sqlite3.connect(f"{Path(db_path).as_uri()}?mode=ro", uri=True)
+            try:
+                rows = connection.execute(
+                    "SELECT chat_info_group_id, COUNT(*) FROM messages "
+                    "WHERE time >= ? AND chat_info_group_id IS NOT NULL GROUP BY chat_info_group_id",
+                    (since,)).fetchall()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            errors.append((db_path, str(e)))
+            continue
+        for group_id, count in rows:
+            group_id = str(group_id).strip()
+            if group_id.isdigit():
+                counts[int(group_id)] = counts.get(int(group_id), 0) + count
+    return counts, errors
+
+
+def plan_rebalance(assignment: dict, groups, rates: dict, shard_count: int,
+                   tolerance: float = DEFAULT_TOLERANCE) -> dict:
+    """计算新的群分配
+
+    已分配的群尽量留在原分片；新群按消息数从多到少分给负载最低的分片；
+    最忙的分片超过平均负载的 (1 + tolerance) 倍时，每次移动一个群到最闲的分片，
+    选择移动后两者负载最接近的群，直到不再超出或无法改善。
+
+    Args:
+        assignment: 当前分配 {群号: 分片序号(从0开始)}
+        groups: 全部群号
+        rates: {群号: 消息数}，没有记录的群按0计算
+        shard_count: 分片数
+
+    Returns:
+        dict: {'assignment': 新分配, 'moves': [(群号, 原分片序号, 新分片序号)], 'loads': [各分片消息数]}
+    """
+    groups = set(groups)
+    new_assignment = {group: shard for group, shard in assignment.items()
+                      if group in groups and 0 <= shard < shard_count}
+    loads = [0] * shard_count
+    sizes = [0] * shard_count
+    for group, shard in new_assignment.items():
+        loads[shard] += rates.get(group, 0)
+        sizes[shard] += 1
+
+    for group in sorted(groups - set(new_assignment), key=lambda item: (-rates.get(item, 0), item)):
+        shard = min(range(shard_count), key=lambda index: (loads[index], sizes[index], index))
+        new_assignment[group] = shard
+        loads[shard] += rates.get(group, 0)
+        sizes[shard] += 1
+
+    average = sum(loads) / shard_count
+    for _ in range(len(groups)):
+        busiest = max(range(shard_count), key=lambda index: loads[index])
+        idlest = min(range(shard_count), key=lambda index: loads[index])
+        gap = loads[busiest] - loads[idlest]
+        if loads[busiest] <= average * (1 + tolerance) or gap <= 0:
+            break
+        # 移动消息数为 r 的群后两者相差 |gap - 2r|，只有 0 < r < gap 时有改善
+        candidates = [group for group, shard in new_assignment.items()
+                      if shard == busiest and 0 < rates.get(group, 0) < gap]
+        if not candidates:
+            break
+        group = min(candidates, key=lambda item: (abs(gap - 2 * rates[item]), item))
+        new_assignment[group] = idlest
+        loads[busiest] -= rates[group]
+        loads[idlest] += rates[group]
+
+    moves = sorted((group, assignment[group], shard) for group, shard in new_assignment.items()
+                   if group in assignment and assignment[group] != shard)
+    return {'assignment': new_assignment, 'moves': moves, 'loads': loads}
+
+
+def _write_assignment(shard_list: list, assignment: dict) -> list:
+    """按分配写入各分片适配器的群聊白名单，私聊只由分片1处理
+
+    Returns:
+        list: 名单有变化（需要重启适配器）的分片号
+    """
+    _, first_lists = _load_chat_lists(shard_list[0])
+    ban_user_id = first_lists['ban_user_id'].sorted()
+    changed = []
+    for index, shard in enumerate(shard_list):
+        config, lists = _load_chat_lists(shard)
+        before = config['chat'].unwrap()
+        config['chat']['group_list_type'] = 'whitelist'
+        lists['group_list'].clear()
+        lists['group_list'].add_many(group for group, target in assignment.items() if target == index)
+        lists['group_list'].dirty = True
+        if index > 0:
+            config['chat']['private_list_type'] = 'whitelist'
+            lists['private_list'].clear()
+            lists['ban_user_id'].clear()
+            lists['ban_user_id'].add_many(ban_user_id)
+            lists['private_list'].dirty = lists['ban_user_id'].dirty = True
+        lists.sync()
+        if config['chat'].unwrap() != before:
+            config_store.save_toml(shard['paths']['adapter_config'], config)
+            changed.append(shard['number'])
+    return changed
+
+
+def _clear_chat_lists(paths: dict) -> None:
+    """清空被移除分片的群聊和私聊白名单，使其仍在运行的适配器不再处理任何消息"""
+    config, lists = _load_chat_lists({'paths': paths})
+    before = config['chat'].unwrap()
+    config['chat']['group_list_type'] = 'whitelist'
+    config['chat']['private_list_type'] = 'whitelist'
+    lists['group_list'].clear()
+    lists['private_list'].clear()
+    lists['group_list'].dirty = lists['private_list'].dirty = True
+    lists.sync()
+    if config['chat'].unwrap() != before:
+        config_store.save_toml(paths['adapter_config'], config)
+
+
+def _default_client() -> dict:
+    """没有名为 CLIENT_NAME 的客户端时，分片客户端使用的默认设置（与新建的 OneBot 配置相同）"""
+    return {'enable': True, 'name': CLIENT_NAME, 'url': '', 'reportSelfMessage': False,
+            'messagePostFormat': 'array', 'token': '', 'debug': False, **get_client_settings()}
+
+
+def _update_napcat_clients(qq_number: str, shard_list: list) -> list:
+    """在账号的 onebot11_<QQ>.json 中为分片2及之后的每个分片维护一个 websocket 客户端
+
+    分片客户端复制名为 CLIENT_NAME 的客户端的设置，该客户端被改名或删除时使用默认设置。
+
+    Returns:
+        list: 被修改的文件路径
+    """
+    paths = [os.path.join(config_dir, f'onebot11_{qq_number}.json') for _, _, config_dir in get_active_config_dirs()]
+    if not any(os.path.exists(path) for path in paths):
+        create_onebot_config(qq_number, adapter_port=shard_list[0]['adapter_port'])
+
+    updated = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        network = config.setdefault('network', {})
+        clients = network.get('websocketClients', [])
+        main_client = next((client for client in clients if client.get('name') == CLIENT_NAME), None)
+        kept = [client for client in clients if not (client.get('name') or '').startswith(SHARD_CLIENT_PREFIX)]
+        template = main_client if main_client is not None else _default_client()
+        for shard in shard_list[1:]:
+            kept.append({**template, 'name': f"{SHARD_CLIENT_PREFIX}{shard['number']}",
+                         'url': f"ws://localhost:{shard['adapter_port']}"})
+        if kept != clients:
+            network['websocketClients'] = kept
+            config_store.save_text(path, json.dumps(config, indent=2, ensure_ascii=False))
+            updated.append(path)
+    return updated
+
+
+def restore_napcat_clients(qq_number) -> list:
+    """重新生成账号的 onebot11_<QQ>.json（create_onebot_config 会覆盖整个文件）后，补回各分片的客户端
+
+    Returns:
+        list: 被修改的文件路径，账号不存在或未部署分片时为空
+    """
+    qq_number = str(qq_number)
+    if qq_number not in load_shards() or find_account(qq_number) is None:
+        return []
+    return _update_napcat_clients(qq_number, get_shard_list(qq_number))
+
+
+def _create_shard(qq_number: str, number: int, source: dict, reserved: set, mode: str) -> dict:
+    """创建一个分片目录：共享代码，复制分片1的配置，分配端口"""
+    shard = {'dir': os.path.join(SHARDS_DIR, qq_number, str(number)), 'mode': mode}
+    adapter_port, core_port = allocate_ports(reserved)
+    reserved.update((adapter_port, core_port))
+    shard.update(adapter_port=adapter_port, core_port=core_port)
+    paths = get_account_paths(shard)
+    source_paths = source['paths']
+    if not os.path.isdir(shard['dir']):
+        # 之前减少分片时保留的目录直接沿用，其中的数据库不受影响
+        mirror_module('modules/MaiBot', paths['main_dir'], mode)
+        mirror_module('modules/MaiBot-Napcat-Adapter', paths['adapter_dir'], mode)
+    config_dir = os.path.dirname(source_paths['bot_config'])
+    sources = [(os.path.join(config_dir, name), os.path.join(os.path.dirname(paths['bot_config']), name))
+               for name in os.listdir(config_dir) if name.endswith('.toml')]
+    sources += [(source_paths[key], paths[key]) for key in ('env', 'adapter_config')]
+    for src, dst in sources:
+        if os.path.isfile(src):
+            with open(src, 'r', encoding='utf-8') as f:
+                config_store.save_text(dst, f.read())
+    write_ports(paths, adapter_port, core_port)
+    os.makedirs(paths['data'], exist_ok=True)
+    return shard
+
+
+def set_shard_count(qq_number, count: int, mode: str = 'hardlink', delete_files: bool = False,
+                    report=print) -> dict:
+    """设置账号的分片数，1表示取消分片（所有群回到分片1）
+
+    增加分片时新分片为空，随后按消息数重新分配；减少分片时被移除分片的群分给其余分片，
+    被移除分片的白名单被清空，其 NapCat 客户端被删除，仍在运行的进程需要手动关闭。
+    被移除的分片目录默认保留（包括数据库），delete_files为True时删除。
+
+    Returns:
+        dict: 重新分配的结果，见 rebalance
+
+    Raises:
+        ValueError: 分片数无效、账号不存在或群聊名单不是白名单模式
+    """
+    qq_number = str(qq_number)
+    if not 1 <= count <= MAX_SHARDS:
+        raise ValueError(f"分片数需要在 1 到 {MAX_SHARDS} 之间")
+    shard_list = get_shard_list(qq_number)
+    first_config, _ = _load_chat_lists(shard_list[0])
+    if first_config['chat'].get('group_list_type', 'whitelist') != 'whitelist':
+        raise ValueError("分群部署需要群聊名单为白名单模式，请先在「修改可发消息群聊&私聊」中切换")
+
+    deployments = load_shards()
+    deployment = deployments.get(qq_number) or {'qq': qq_number, 'shards': [{'dir': None}], 'assignment': {}}
+    groups = collect_groups(shard_list)
+    removed = deployment['shards'][count:]
+    reserved = set()
+    for number in range(len(deployment['shards']) + 1, count + 1):
+        shard = _create_shard(qq_number, number, shard_list[0], reserved, mode)
+        deployment['shards'].append(shard)
+        report(f"已创建分片{number}：适配器端口 {shard['adapter_port']}，麦麦主程序端口 {shard['core_port']}")
+    deployment['shards'] = deployment['shards'][:count]
+    deployments[qq_number] = deployment
+    _save_shards(deployments)
+
+    result = rebalance(qq_number, groups=groups, removed_shards=removed)
+    if count == 1:
+        deployments = load_shards()
+        deployments.pop(qq_number, None)
+        _save_shards(deployments)
+    _update_napcat_clients(qq_number, get_shard_list(qq_number))
+    for number, shard in enumerate(removed, count + 1):
+        if delete_files:
+            shutil.rmtree(shard['dir'], ignore_errors=True)
+        elif os.path.isdir(shard['dir']):
+            _clear_chat_lists(get_account_paths(shard))
+        report(f"已移除分片{number}，请关闭其麦麦主程序和适配器窗口（端口 {shard['core_port']}、{shard['adapter_port']}）")
+    return result
+
+
+def rebalance(qq_number, hours: float = DEFAULT_RATE_WINDOW_HOURS, tolerance: float = DEFAULT_TOLERANCE,
+              dry_run: bool = False, groups=None, removed_shards=()) -> dict:
+    """按最近的消息数重新分配各分片的群
+
+    Returns:
+        dict: {'assignment', 'moves', 'loads', 'rates', 'errors', 'changed': 名单有变化的分片号}
+    """
+    qq_number = str(qq_number)
+    shard_list = get_shard_list(qq_number)
+    deployments = load_shards()
+    deployment = deployments.get(qq_number, {'assignment': {}})
+    if groups is None:
+        groups = collect_groups(shard_list)
+    # 减少分片时，被移除分片的数据库中也有其群的消息
+    measured = shard_list + [{'paths': get_account_paths(shard)} for shard in removed_shards]
+    rates, errors = measure_group_rates(measured, hours)
+    assignment = {int(group): shard for group, shard in deployment['assignment'].items()}
+    if not assignment:
+        # 首次分片时现有的群都在分片1
+        assignment = {group: 0 for group in groups}
+    plan = plan_rebalance(assignment, groups, rates, len(shard_list), tolerance)
+    plan.update(rates={group: rates.get(group, 0) for group in groups}, errors=errors, changed=[])
+    if dry_run:
+        return plan
+
+    plan['changed'] = _write_assignment(shard_list, plan['assignment'])
+    if qq_number in deployments:
+        deployment['assignment'] = {str(group): shard for group, shard in sorted(plan['assignment'].items())}
+        deployment['rates'] = {str(group): count for group, count in sorted(plan['rates'].items())}
+        deployment['rebalanced'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        _save_shards(deployments)
+    return plan
+
+
+def sync_shards(report=print) -> bool:
+    """将所有分片的代码同步到 modules/ 中的当前版本
+
+    Returns:
+        bool: 所有文件是否都已同步
+    """
+    success = True
+    for qq_number, deployment in load_shards().items():
+        for number, shard in enumerate(deployment['shards'][1:], 2):
+            if not os.path.isdir(shard['dir']):
+                continue
+            stats = sync_account_code(shard['dir'], shard.get('mode', 'hardlink'))
+            report_sync(f"账号 {qq_number} 分片{number}", stats, report)
+            success = success and not stats['failed']
+    return success
+
+
+def remove_groups(qq_number, groups) -> int:
+    """从账号所有分片的群聊白名单中移除群
+
+    Returns:
+        int: 被移除的群数
+    """
+    removed = set()
+    for shard in get_shard_list(qq_number):
+        config, lists = _load_chat_lists(shard)
+        present = [group for group in groups if group in lists['group_list']]
+        if present:
+            lists['group_list'].remove_many(present)
+            lists.sync()
+            config_store.save_toml(shard['paths']['adapter_config'], config)
+            removed.update(present)
+    deployments = load_shards()
+    deployment = deployments.get(str(qq_number))
+    if deployment and removed:
+        for group in removed:
+            deployment['assignment'].pop(str(group), None)
+        _save_shards(deployments)
+    return len(removed)
+
+
+def get_shards_status(qq_number) -> list:
+    """账号各分片的运行状态、群数和上次重新分配时统计的消息数（只调用一次 netstat）
+
+    Returns:
+        list: [{'number', 'adapter_port', 'core_port', 'groups', 'messages', 'core', 'adapter', 'napcat'}]
+    """
+    rates = load_shards().get(str(qq_number), {}).get('rates', {})
+    ports = get_port_table()
+    status = []
+    for shard in get_shard_list(qq_number):
+        _, lists = _load_chat_lists(shard)
+        shard_groups = list(lists['group_list'])
+        adapter_states = ports.get(shard['adapter_port'], set())
+        status.append({
+            'number': shard['number'],
+            'adapter_port': shard['adapter_port'],
+            'core_port': shard['core_port'],
+            'groups': len(shard_groups),
+            'messages': sum(rates.get(str(group), 0) for group in shard_groups),
+            'core': 'LISTENING' in ports.get(shard['core_port'], set()),
+            'adapter': 'LISTENING' in adapter_states,
+            'napcat': 'ESTABLISHED' in adapter_states,
+        })
+    return status
+
+
+def format_shard_status(item: dict) -> str:
+    def mark(running):
+        return '✅' if running else '❌'
+    return (f"分片{item['number']}  {item['groups']} 个群 / {item['messages']} 条消息  "
+            f"麦麦主程序 {mark(item['core'])} :{item['core_port']}  "
+            f"适配器 {mark(item['adapter'])} :{item['adapter_port']}  NapCat {mark(item['napcat'])}")
+
+
+def format_rebalance(plan: dict, hours: float = DEFAULT_RATE_WINDOW_HOURS) -> list:
+    """重新分配结果的说明文字"""
+    lines = [f"各分片最近 {hours:g} 小时的消息数: "
+             + '，'.join(f"分片{index + 1} {load}" for index, load in enumerate(plan['loads']))]
+    for group, source, target in plan['moves']:
+        lines.append(f"群 {group}（{plan['rates'].get(group, 0)} 条消息）: 分片{source + 1} → 分片{target + 1}")
+    if not plan['moves']:
+        lines.append("各分片负载均衡，无需移动群")
+    for path, error in plan['errors']:
+        lines.append(f"⚠️  无法读取 {path}: {error}")
+    if plan['changed']:
+        lines.append(f"需要重启以下分片的适配器: {', '.join(f'分片{number}' for number in plan['changed'])}")
+    return lines
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="一个QQ账号后面运行多个麦麦主程序，按群分担消息")
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    set_parser = subparsers.add_parser('set', help="设置分片数（1为取消分片）")
+    set_parser.add_argument('qq', help="QQ号")
+    set_parser.add_argument('count', type=int, help="分片数")
+    set_parser.add_argument('--mode', choices=PROVISION_MODES, default='hardlink', help="共享代码文件的创建方式")
+    set_parser.add_argument('--delete-files', action='store_true', help="删除被移除分片的目录和数据")
+    rebalance_parser = subparsers.add_parser('rebalance', help="按消息数重新分配群")
+    rebalance_parser.add_argument('qq', help="QQ号")
+    rebalance_parser.add_argument('--hours', type=float, default=DEFAULT_RATE_WINDOW_HOURS, help="统计消息数的时间范围")
+    rebalance_parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                                  help="最忙的分片超过平均负载的比例不大于此值时不移动群")
+    rebalance_parser.add_argument('--dry-run', action='store_true', help="只显示分配结果，不写入配置")
+    status_parser = subparsers.add_parser('status', help="查看各分片的状态")
+    status_parser.add_argument('qq', help="QQ号")
+    subparsers.add_parser('sync', help="将所有分片的代码同步到当前版本")
+    args = parser.parse_args(argv)
+
+    if args.action == 'sync':
+        return 0 if sync_shards() else 1
+
+    try:
+        if args.action == 'status':
+            for item in get_shards_status(args.qq):
+                print(format_shard_status(item))
+            return 0
+        if args.action == 'set':
+            plan = set_shard_count(args.qq, args.count, args.mode, args.delete_files)
+            hours = DEFAULT_RATE_WINDOW_HOURS
+        else:
+            plan = rebalance(args.qq, args.hours, args.tolerance, args.dry_run)
+            hours = args.hours
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"❌ {e}")
+        return 1
+    for line in format_rebalance(plan, hours):
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,8 +4,83 @@ import tomlkit  # 替换 tomli
 from typing import Optional, List, Callable
 import re
 import shutil
+import threading
 from contextlib import suppress
+from accounts import (
+    add_account,
+    format_status as format_account_status,
+    get_account_paths,
+    get_accounts_status,
+    list_all_accounts,
+    remove_account,
+)
+from chat_lists import (
+    ChatLists,
+    IdList,
+    export_ids,
+    format_import_summary,
+    import_ids,
+    iter_ids_from_stream,
+    parse_ids,
+)
+from config_merge import merge_config_templates
+from config_snapshots import (
+    SHORT_HASH_LENGTH,
+    diff_snapshot,
+    find_snapshot,
+    format_snapshot,
+    list_snapshot_files,
+    list_snapshots,
+    restore_snapshot,
+    snapshot_file,
+)
+from config_store import config_store
+from config_validator import validate_all_configs
+from env_document import EnvDocument
 from init_napcat import create_napcat_config, create_onebot_config
+from llm_benchmark import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_REQUESTS,
+    build_targets,
+    format_table as format_benchmark_table,
+    run_benchmark,
+)
+from onebot_profiles import (
+    CONNECTION_PROFILES,
+    apply_profile_to_existing_configs,
+    get_client_settings as get_onebot_client_settings,
+    load_profile_selection as load_onebot_profile_selection,
+    measure_reconnect,
+    save_profile_selection as save_onebot_profile_selection,
+    summarize_measurements as summarize_onebot_measurements,
+)
+from restart_planner import (
+    execute_restart_plan,
+    get_component as get_restart_component,
+    plan_restart,
+    record_launch_baseline,
+)
+from shards import (
+    DEFAULT_RATE_WINDOW_HOURS,
+    MAX_SHARDS,
+    format_rebalance,
+    format_shard_status,
+    get_shard_list,
+    get_shards_status,
+    rebalance as rebalance_shards,
+    remove_groups as remove_shard_groups,
+    restore_napcat_clients,
+    set_shard_count,
+)
+from update_modules import (
+    WHEELHOUSE_DIR,
+    build_wheelhouse_install_command,
+    export_wheelhouse,
+    get_available_updates,
+    import_wheelhouse,
+    maintain_repositories,
+    spawn_background_prefetch,
+)
 try:
     from modules.MaiBot.src.common.logger import get_logger  # 确保路径正确
     logger = get_logger("init")
@@ -16,6 +91,18 @@ import requests
 
 ONEKEY_VERSION = "4.1.3" 
 
+
+def _get_prefetch_interval() -> int:
+    """读取后台预取更新的间隔（秒），环境变量 MAIBOT_PREFETCH_INTERVAL 设为0可关闭预取"""
+    try:
+        return max(int(os.environ.get("MAIBOT_PREFETCH_INTERVAL", "3600")), 0)
+    except ValueError:
+        return 3600
+
+
+# 后台预取上游更新的间隔（秒）
+UPDATE_PREFETCH_INTERVAL = _get_prefetch_interval()
+
 def get_absolute_path(relative_path: str) -> str:
     """获取绝对路径
     
@@ -90,8 +177,7 @@ def read_qq_from_config() -> Optional[str]:
         if not os.path.exists(config_path):
             logger.error(f"错误：找不到配置文件 {config_path}")
             return None
-        with open(config_path, 'r', encoding='utf-8') as f:  # 修改为 'r' 和 utf-8 编码
-            config = tomlkit.load(f)  # 使用 tomlkit.load
+        config = config_store.load_toml(config_path)
         if 'bot' not in config or 'qq_account' not in config['bot']:
             logger.error("错误：配置文件格式不正确，缺少 bot.qq_account 配置项")
             return None
@@ -129,9 +215,17 @@ def create_cmd_window(cwd: str, command: str) -> bool:
     Returns:
         bool: 是否成功创建窗口
     """
+    return open_cmd_window(cwd, command) is not None
+
+def open_cmd_window(cwd: str, command: str) -> Optional[int]:
+    """创建新的命令行窗口并执行命令
+    
+    Returns:
+        int: 窗口中 cmd 进程的PID，结束该进程树即可关闭窗口及其中的程序；失败时返回None
+    """
     try:
         if not validate_directory_exists(cwd):
-            return False
+            return None
             
         # 使用项目自带的 Python 环境
         python_path = get_absolute_path('runtime/python31211/bin/python.exe')
@@ -142,15 +236,18 @@ def create_cmd_window(cwd: str, command: str) -> bool:
         elif command == 'python':
             command = f'"{python_path}"'
         
-        full_command = f'start cmd /k "cd /d "{cwd}" && {command}"'
-        subprocess.run(full_command, shell=True, check=True)
-        return True
-    except subprocess.CalledProcessError as e:
+        # 直接以新控制台启动 cmd（与 start cmd /k 相同），以便得到窗口进程的PID
+        full_command = f'cmd /k "cd /d "{cwd}" && {command}"'
+        # 非Windows下放入独立进程组，重启时可以结束整组进程
+        process = subprocess.Popen(full_command, creationflags=getattr(subprocess, 'CREATE_NEW_CONSOLE', 0),
+                                   start_new_session=os.name != 'nt')
+        return process.pid
+    except OSError as e:
         logger.error(f"错误：命令执行失败：{str(e)}")
-        return False
+        return None
     except Exception as e:
         logger.error(f"错误：启动进程时出现异常：{str(e)}")
-        return False
+        return None
 
 def check_napcat() -> bool:
     napcat_path = get_absolute_path('modules/napcat')
@@ -185,6 +282,8 @@ def add_qq_number():
             # 创建NapCat相关配置
             create_napcat_config(qq)
             create_onebot_config(qq)
+            # 该账号部署了分片时，补回被覆盖的分片客户端
+            restore_napcat_clients(qq)
             
             logger.info(f"QQ号 {qq} 配置已更新并创建必要文件！")
             return
@@ -201,8 +300,7 @@ def modify_allowed_chats():
     
     try:
         # 读取配置文件
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = tomlkit.load(f)
+        config = config_store.load_toml(config_path)
         
         # 确保chat配置段存在
         if 'chat' not in config:
@@ -214,49 +312,54 @@ def modify_allowed_chats():
             config['chat']['ban_user_id'] = []
             config['chat']['enable_poke'] = True
         
-        while True:
-            print("\n=== 修改可发消息群聊&私聊配置 ===")
-            print("1. 管理群组聊天配置")
-            print("2. 管理私聊配置")
-            print("3. 管理全局禁止名单")
-            print("4. 查看当前配置")
-            print("0. 返回主菜单")
-            
-            choice = input("请选择操作: ").strip()
-            
-            if choice == '0':
-                logger.info("已退出聊天配置管理")
-                break
-            elif choice == '1':
-                _manage_group_chat_config(config)
-            elif choice == '2':
-                _manage_private_chat_config(config)
-            elif choice == '3':
-                _manage_ban_user_list(config)
-            elif choice == '4':
-                _display_current_config(config)
-            else:
-                logger.error("无效选择，请重新输入")
-                continue
-            
-            # 保存配置
-            with open(config_path, 'w', encoding='utf-8') as f:
-                tomlkit.dump(config, f)
-            logger.info("配置已保存")
+        # 名单的索引模型，查找和增删不再逐个扫描配置数组
+        lists = ChatLists(config)
+        
+        try:
+            while True:
+                print("\n=== 修改可发消息群聊&私聊配置 ===")
+                print("1. 管理群组聊天配置")
+                print("2. 管理私聊配置")
+                print("3. 管理全局禁止名单")
+                print("4. 查看当前配置")
+                print("0. 返回主菜单")
+                
+                choice = input("请选择操作: ").strip()
+                
+                if choice == '0':
+                    logger.info("已退出聊天配置管理")
+                    break
+                elif choice == '1':
+                    _manage_group_chat_config(config, lists)
+                elif choice == '2':
+                    _manage_private_chat_config(config, lists)
+                elif choice == '3':
+                    _manage_ban_user_list(lists)
+                elif choice == '4':
+                    _display_current_config(config, lists)
+                else:
+                    logger.error("无效选择，请重新输入")
+        finally:
+            # 退出菜单时一次写回（Ctrl+C 或出错退出时也写回已完成的修改），内容未变化（如仅查看配置）时不写入
+            lists.sync()
+            config_store.mark_dirty(config_path, config)
+            if config_store.flush(config_path):
+                logger.info("配置已保存")
     
     except Exception as e:
+        # 丢弃未保存的修改，下次从文件重新读取
+        config_store.invalidate(config_path)
         logger.error(f"操作配置文件失败：{str(e)}")
 
 
-def _manage_group_chat_config(config):
+def _manage_group_chat_config(config, lists: ChatLists):
     """管理群组聊天配置"""
     while True:
         print("\n=== 群组聊天配置管理 ===")
         current_type = config.get('chat', {}).get('group_list_type', 'whitelist')
-        current_list = config.get('chat', {}).get('group_list', [])
         
         print(f"当前群组名单类型: {current_type} ({'白名单' if current_type == 'whitelist' else '黑名单'})")
-        print(f"当前群组列表: {list(current_list) if current_list else '(空)'}")
+        print(f"当前群组列表: {lists['group_list'].preview()}")
         
         if current_type == 'whitelist':
             print("白名单模式说明：只有列表中的群组可以聊天")
@@ -269,6 +372,8 @@ def _manage_group_chat_config(config):
         print("3. 删除群号")
         print("4. 清空群组列表")
         print("5. 查看群组列表详情")
+        print("6. 批量导入群号（CSV/TXT/JSON文件或粘贴）")
+        print("7. 导出群组列表到文件")
         print("0. 返回上级菜单")
         
         choice = input("请选择操作: ").strip()
@@ -278,26 +383,29 @@ def _manage_group_chat_config(config):
         elif choice == '1':
             _toggle_group_list_type(config)
         elif choice == '2':
-            _add_group_to_list(config)
+            _add_group_to_list(lists)
         elif choice == '3':
-            _remove_group_from_list(config)
+            _remove_group_from_list(lists)
         elif choice == '4':
-            _clear_group_list(config)
+            _clear_group_list(lists)
         elif choice == '5':
-            _show_group_list_details(config)
+            _show_group_list_details(config, lists)
+        elif choice == '6':
+            _import_id_list(lists, 'group_list', "群组列表")
+        elif choice == '7':
+            _export_id_list(lists, 'group_list', "群组列表")
         else:
             logger.error("无效选择，请重新输入")
 
 
-def _manage_private_chat_config(config):
+def _manage_private_chat_config(config, lists: ChatLists):
     """管理私聊配置"""
     while True:
         print("\n=== 私聊配置管理 ===")
         current_type = config.get('chat', {}).get('private_list_type', 'whitelist')
-        current_list = config.get('chat', {}).get('private_list', [])
         
         print(f"当前私聊名单类型: {current_type} ({'白名单' if current_type == 'whitelist' else '黑名单'})")
-        print(f"当前私聊列表: {list(current_list) if current_list else '(空)'}")
+        print(f"当前私聊列表: {lists['private_list'].preview()}")
         
         if current_type == 'whitelist':
             print("白名单模式说明：只有列表中的用户可以私聊")
@@ -310,6 +418,8 @@ def _manage_private_chat_config(config):
         print("3. 删除用户QQ号")
         print("4. 清空私聊列表")
         print("5. 查看私聊列表详情")
+        print("6. 批量导入用户QQ号（CSV/TXT/JSON文件或粘贴）")
+        print("7. 导出私聊列表到文件")
         print("0. 返回上级菜单")
         
         choice = input("请选择操作: ").strip()
@@ -319,24 +429,27 @@ def _manage_private_chat_config(config):
         elif choice == '1':
             _toggle_private_list_type(config)
         elif choice == '2':
-            _add_user_to_private_list(config)
+            _add_user_to_private_list(lists)
         elif choice == '3':
-            _remove_user_from_private_list(config)
+            _remove_user_from_private_list(lists)
         elif choice == '4':
-            _clear_private_list(config)
+            _clear_private_list(lists)
         elif choice == '5':
-            _show_private_list_details(config)
+            _show_private_list_details(config, lists)
+        elif choice == '6':
+            _import_id_list(lists, 'private_list', "私聊列表")
+        elif choice == '7':
+            _export_id_list(lists, 'private_list', "私聊列表")
         else:
             logger.error("无效选择，请重新输入")
 
 
-def _manage_ban_user_list(config):
+def _manage_ban_user_list(lists: ChatLists):
     """管理全局禁止名单"""
     while True:
         print("\n=== 全局禁止名单管理 ===")
-        current_list = config.get('chat', {}).get('ban_user_id', [])
         
-        print(f"当前全局禁止列表: {list(current_list) if current_list else '(空)'}")
+        print(f"当前全局禁止列表: {lists['ban_user_id'].preview()}")
         print("说明：全局禁止名单中的用户无法进行任何聊天（群聊和私聊）")
         
         print("\n操作选项:")
@@ -344,6 +457,8 @@ def _manage_ban_user_list(config):
         print("2. 从全局禁止名单移除用户")
         print("3. 清空全局禁止名单")
         print("4. 查看全局禁止名单详情")
+        print("5. 批量导入用户QQ号（CSV/TXT/JSON文件或粘贴）")
+        print("6. 导出全局禁止名单到文件")
         print("0. 返回上级菜单")
         
         choice = input("请选择操作: ").strip()
@@ -351,149 +466,212 @@ def _manage_ban_user_list(config):
         if choice == '0':
             break
         elif choice == '1':
-            _add_user_to_ban_list(config)
+            _add_user_to_ban_list(lists)
         elif choice == '2':
-            _remove_user_from_ban_list(config)
+            _remove_user_from_ban_list(lists)
         elif choice == '3':
-            _clear_ban_list(config)
+            _clear_ban_list(lists)
         elif choice == '4':
-            _show_ban_list_details(config)
+            _show_ban_list_details(lists)
+        elif choice == '5':
+            _import_id_list(lists, 'ban_user_id', "全局禁止名单")
+        elif choice == '6':
+            _export_id_list(lists, 'ban_user_id', "全局禁止名单")
         else:
             logger.error("无效选择，请重新输入")
 
 
-def _display_current_config(config):
+def _display_current_config(config, lists: ChatLists):
     """显示当前完整配置"""
     print("\n=== 当前聊天配置总览 ===")
     chat_config = config.get('chat', {})
     
     # 群组配置
     group_type = chat_config.get('group_list_type', 'whitelist')
-    group_list = chat_config.get('group_list', [])
     print("群组配置:")
     print(f"  类型: {group_type} ({'白名单' if group_type == 'whitelist' else '黑名单'})")
-    print(f"  群组列表: {list(group_list) if group_list else '(空)'}")
+    print(f"  群组列表: {lists['group_list'].preview()}")
     
     # 私聊配置
     private_type = chat_config.get('private_list_type', 'whitelist')
-    private_list = chat_config.get('private_list', [])
     print("私聊配置:")
     print(f"  类型: {private_type} ({'白名单' if private_type == 'whitelist' else '黑名单'})")
-    print(f"  用户列表: {list(private_list) if private_list else '(空)'}")
+    print(f"  用户列表: {lists['private_list'].preview()}")
     
     # 全局禁止名单
-    ban_list = chat_config.get('ban_user_id', [])
-    print(f"全局禁止名单: {list(ban_list) if ban_list else '(空)'}")
+    print(f"全局禁止名单: {lists['ban_user_id'].preview()}")
     
     # 戳一戳功能
     enable_poke = chat_config.get('enable_poke', True)
     print(f"戳一戳功能: {'启用' if enable_poke else '禁用'}")
 
 
-def _toggle_group_list_type(config):
-    """切换群组名单类型"""
-    current_type = config.get('chat', {}).get('group_list_type', 'whitelist')
-    new_type = 'blacklist' if current_type == 'whitelist' else 'whitelist'
-    
-    confirm = input(f"确认将群组名单类型从 {current_type}({'白名单' if current_type == 'whitelist' else '黑名单'}) 切换到 {new_type}({'白名单' if new_type == 'whitelist' else '黑名单'})? (y/N): ").strip().lower()
-    
-    if confirm == 'y':
-        config['chat']['group_list_type'] = new_type
-        logger.info(f"群组名单类型已切换为: {new_type}")
-    else:
-        logger.info("操作已取消")
-
-
-def _add_group_to_list(config):
-    """添加群号到群组列表"""
+def _add_ids_to_list(id_list: IdList, prompt: str, item_name: str, list_name: str, continue_prompt: str):
+    """交互式向名单添加号码，一次可输入多个（空格或逗号分隔）"""
     while True:
-        group_id = input("请输入要添加的群号（纯数字，输入0返回）: ").strip()
+        text = input(prompt).strip()
         
-        if group_id == '0':
+        if text == '0':
             break
         
-        if not re.match(r'^\d+$', group_id):
-            logger.error("群号必须为纯数字，请重新输入")
+        ids, invalid = parse_ids(text)
+        if invalid or not ids:
+            logger.error(f"{item_name}必须为纯数字，请重新输入")
             continue
         
-        group_id = int(group_id)
-        current_list = list(config.get('chat', {}).get('group_list', []))
-        
-        if group_id in current_list:
-            logger.warning(f"群号 {group_id} 已存在于列表中")
+        if len(ids) == 1:
+            if id_list.add(ids[0]):
+                logger.info(f"{item_name} {ids[0]} 已添加到{list_name}")
+            else:
+                logger.warning(f"{item_name} {ids[0]} 已存在于{list_name}中")
         else:
-            current_list.append(group_id)
-            config['chat']['group_list'] = current_list
-            logger.info(f"群号 {group_id} 已添加到群组列表")
+            added, duplicates, _ = id_list.add_many(ids)
+            logger.info(f"已添加 {added} 个{item_name}到{list_name}，{duplicates} 个已存在")
         
-        if input("是否继续添加其他群号? (y/N): "):
+        if input(continue_prompt).strip().lower() != 'y':
             break
 
 
-def _remove_group_from_list(config):
-    """从群组列表移除群号"""
-    current_list = list(config.get('chat', {}).get('group_list', []))
-    
-    if not current_list:
-        logger.warning("群组列表为空，无法删除")
+def _remove_ids_from_list(id_list: IdList, prompt: str, item_name: str, list_name: str, continue_prompt: str):
+    """交互式从名单移除号码，一次可输入多个（空格或逗号分隔）"""
+    if not id_list:
+        logger.warning(f"{list_name}为空，无法删除")
         return
     
-    print(f"当前群组列表: {current_list}")
+    print(f"当前{list_name}: {id_list.preview()}")
     
     while True:
-        group_id = input("请输入要删除的群号（纯数字，输入0返回）: ").strip()
+        text = input(prompt).strip()
         
-        if group_id == '0':
+        if text == '0':
             break
         
-        if not re.match(r'^\d+$', group_id):
-            logger.error("群号必须为纯数字，请重新输入")
+        ids, invalid = parse_ids(text)
+        if invalid or not ids:
+            logger.error(f"{item_name}必须为纯数字，请重新输入")
             continue
         
-        group_id = int(group_id)
-        
-        if group_id in current_list:
-            current_list.remove(group_id)
-            config['chat']['group_list'] = current_list
-            logger.info(f"群号 {group_id} 已从群组列表中删除")
+        if len(ids) == 1:
+            if id_list.remove(ids[0]):
+                logger.info(f"{item_name} {ids[0]} 已从{list_name}中删除")
+            else:
+                logger.warning(f"{item_name} {ids[0]} 不在当前{list_name}中")
         else:
-            logger.warning(f"群号 {group_id} 不在当前群组列表中")
+            removed, missing = id_list.remove_many(ids)
+            logger.info(f"已从{list_name}删除 {removed} 个{item_name}，{missing} 个不在名单中")
         
-        if input("是否继续删除其他群号? (y/N): ").strip().lower() != 'y':
+        if input(continue_prompt).strip().lower() != 'y':
             break
 
 
-def _clear_group_list(config):
-    """清空群组列表"""
-    current_list = config.get('chat', {}).get('group_list', [])
-    
-    if not current_list:
-        logger.warning("群组列表已经为空")
+def _clear_id_list(id_list: IdList, list_name: str, unit: str):
+    """确认后清空名单"""
+    if not id_list:
+        logger.warning(f"{list_name}已经为空")
         return
     
-    confirm = input(f"确认清空群组列表吗？当前有 {len(current_list)} 个群组 (y/N): ").strip().lower()
+    confirm = input(f"确认清空{list_name}吗？当前有 {len(id_list)} 个{unit} (y/N): ").strip().lower()
     
     if confirm == 'y':
-        config['chat']['group_list'] = []
-        logger.info("群组列表已清空")
+        id_list.clear()
+        logger.info(f"{list_name}已清空")
     else:
         logger.info("操作已取消")
 
 
-def _show_group_list_details(config):
-    """显示群组列表详情"""
-    current_list = config.get('chat', {}).get('group_list', [])
-    list_type = config.get('chat', {}).get('group_list_type', 'whitelist')
-    
-    print(f"\n群组列表详情（{list_type} - {'白名单' if list_type == 'whitelist' else '黑名单'}）:")
+def _show_id_list_details(id_list: IdList, title: str, summary: str):
+    """显示名单详情"""
+    print(f"\n{title}:")
     
-    if not current_list:
+    if not id_list:
         print("  (列表为空)")
     else:
-        for i, group_id in enumerate(current_list, 1):
-            print(f"  {i}. {group_id}")
+        for i, value in enumerate(id_list, 1):
+            print(f"  {i}. {value}")
+    
+    print(f"总计: {len(id_list)} {summary}")
+
+
+def _read_pasted_lines():
+    """逐行读取粘贴的内容，遇到空行结束"""
+    while True:
+        line = input()
+        if not line.strip():
+            return
+        yield line
+
+
+def _import_id_list(lists: ChatLists, key: str, list_name: str):
+    """从文件或粘贴的内容批量导入号码，自动去重并汇总结果"""
+    print("支持的文件格式：TXT（每行一个或多个号码）、CSV（每个单元格一个号码）、JSON（号码数组）")
+    path = input("请输入文件路径（直接回车改为粘贴号码，粘贴后输入空行结束）: ").strip().strip('"')
+    
+    try:
+        if path:
+            if not os.path.isfile(path):
+                logger.error(f"文件不存在: {path}")
+                return
+            added, duplicates, invalid = import_ids(lists[key], path, key)
+        else:
+            print("请粘贴号码（输入空行结束）:")
+            added, duplicates, invalid = lists[key].add_many(iter_ids_from_stream(_read_pasted_lines()))
+    except (OSError, ValueError, TypeError) as e:
+        logger.error(f"导入失败：{str(e)}")
+        return
+    
+    logger.info(f"{list_name}导入完成：{format_import_summary(added, duplicates, invalid)}，当前共 {len(lists[key])} 个")
+
+
+def _export_id_list(lists: ChatLists, key: str, list_name: str):
+    """按文件扩展名（.txt/.csv/.json）导出名单"""
+    path = input(f"请输入导出文件路径（.txt/.csv/.json，默认 {key}.txt）: ").strip().strip('"') or f"{key}.txt"
+    
+    try:
+        count = export_ids(lists[key], path, key)
+    except OSError as e:
+        logger.error(f"导出失败：{str(e)}")
+        return
     
-    print(f"总计: {len(current_list)} 个群组")
+    logger.info(f"已导出{list_name}的 {count} 个号码到: {os.path.abspath(path)}")
+
+
+def _toggle_group_list_type(config):
+    """切换群组名单类型"""
+    current_type = config.get('chat', {}).get('group_list_type', 'whitelist')
+    new_type = 'blacklist' if current_type == 'whitelist' else 'whitelist'
+    
+    confirm = input(f"确认将群组名单类型从 {current_type}({'白名单' if current_type == 'whitelist' else '黑名单'}) 切换到 {new_type}({'白名单' if new_type == 'whitelist' else '黑名单'})? (y/N): ").strip().lower()
+    
+    if confirm == 'y':
+        config['chat']['group_list_type'] = new_type
+        logger.info(f"群组名单类型已切换为: {new_type}")
+    else:
+        logger.info("操作已取消")
+
+
+def _add_group_to_list(lists: ChatLists):
+    """添加群号到群组列表"""
+    _add_ids_to_list(lists['group_list'], "请输入要添加的群号（纯数字，可用空格或逗号分隔多个，输入0返回）: ",
+                     "群号", "群组列表", "是否继续添加其他群号? (y/N): ")
+
+
+def _remove_group_from_list(lists: ChatLists):
+    """从群组列表移除群号"""
+    _remove_ids_from_list(lists['group_list'], "请输入要删除的群号（纯数字，可用空格或逗号分隔多个，输入0返回）: ",
+                          "群号", "群组列表", "是否继续删除其他群号? (y/N): ")
+
+
+def _clear_group_list(lists: ChatLists):
+    """清空群组列表"""
+    _clear_id_list(lists['group_list'], "群组列表", "群组")
+
+
+def _show_group_list_details(config, lists: ChatLists):
+    """显示群组列表详情"""
+    list_type = config.get('chat', {}).get('group_list_type', 'whitelist')
+    _show_id_list_details(lists['group_list'],
+                          f"群组列表详情（{list_type} - {'白名单' if list_type == 'whitelist' else '黑名单'}）",
+                          "个群组")
 
 
 def _toggle_private_list_type(config):
@@ -510,187 +688,51 @@ def _toggle_private_list_type(config):
         logger.info("操作已取消")
 
 
-def _add_user_to_private_list(config):
+def _add_user_to_private_list(lists: ChatLists):
     """添加用户到私聊列表"""
-    while True:
-        user_id = input("请输入要添加的用户QQ号（纯数字，输入0返回）: ").strip()
-        
-        if user_id == '0':
-            break
-        
-        if not re.match(r'^\d+$', user_id):
-            logger.error("QQ号必须为纯数字，请重新输入")
-            continue
-        
-        user_id = int(user_id)
-        current_list = list(config.get('chat', {}).get('private_list', []))
-        
-        if user_id in current_list:
-            logger.warning(f"用户 {user_id} 已存在于私聊列表中")
-        else:
-            current_list.append(user_id)
-            config['chat']['private_list'] = current_list
-            logger.info(f"用户 {user_id} 已添加到私聊列表")
-        
-        if input("是否继续添加其他用户? (y/N): ").strip().lower() != 'y':
-            break
+    _add_ids_to_list(lists['private_list'], "请输入要添加的用户QQ号（纯数字，可用空格或逗号分隔多个，输入0返回）: ",
+                     "用户", "私聊列表", "是否继续添加其他用户? (y/N): ")
 
 
-def _remove_user_from_private_list(config):
+def _remove_user_from_private_list(lists: ChatLists):
     """从私聊列表移除用户"""
-    current_list = list(config.get('chat', {}).get('private_list', []))
-    
-    if not current_list:
-        logger.warning("私聊列表为空，无法删除")
-        return
-    
-    print(f"当前私聊列表: {current_list}")
-    
-    while True:
-        user_id = input("请输入要删除的用户QQ号（纯数字，输入0返回）: ").strip()
-        
-        if user_id == '0':
-            break
-        
-        if not re.match(r'^\d+$', user_id):
-            logger.error("QQ号必须为纯数字，请重新输入")
-            continue
-        
-        user_id = int(user_id)
-        
-        if user_id in current_list:
-            current_list.remove(user_id)
-            config['chat']['private_list'] = current_list
-            logger.info(f"用户 {user_id} 已从私聊列表中删除")
-        else:
-            logger.warning(f"用户 {user_id} 不在当前私聊列表中")
-        
-        if input("是否继续删除其他用户? (y/N): ").strip().lower() != 'y':
-            break
+    _remove_ids_from_list(lists['private_list'], "请输入要删除的用户QQ号（纯数字，可用空格或逗号分隔多个，输入0返回）: ",
+                          "用户", "私聊列表", "是否继续删除其他用户? (y/N): ")
 
 
-def _clear_private_list(config):
+def _clear_private_list(lists: ChatLists):
     """清空私聊列表"""
-    current_list = config.get('chat', {}).get('private_list', [])
-    
-    if not current_list:
-        logger.warning("私聊列表已经为空")
-        return
-    
-    confirm = input(f"确认清空私聊列表吗？当前有 {len(current_list)} 个用户 (y/N): ").strip().lower()
-    
-    if confirm == 'y':
-        config['chat']['private_list'] = []
-        logger.info("私聊列表已清空")
-    else:
-        logger.info("操作已取消")
+    _clear_id_list(lists['private_list'], "私聊列表", "用户")
 
 
-def _show_private_list_details(config):
+def _show_private_list_details(config, lists: ChatLists):
     """显示私聊列表详情"""
-    current_list = config.get('chat', {}).get('private_list', [])
     list_type = config.get('chat', {}).get('private_list_type', 'whitelist')
-    
-    print(f"\n私聊列表详情（{list_type} - {'白名单' if list_type == 'whitelist' else '黑名单'}）:")
-    
-    if not current_list:
-        print("  (列表为空)")
-    else:
-        for i, user_id in enumerate(current_list, 1):
-            print(f"  {i}. {user_id}")
-    
-    print(f"总计: {len(current_list)} 个用户")
+    _show_id_list_details(lists['private_list'],
+                          f"私聊列表详情（{list_type} - {'白名单' if list_type == 'whitelist' else '黑名单'}）",
+                          "个用户")
 
 
-def _add_user_to_ban_list(config):
+def _add_user_to_ban_list(lists: ChatLists):
     """添加用户到全局禁止名单"""
-    while True:
-        user_id = input("请输入要添加到全局禁止名单的用户QQ号（纯数字，输入0返回）: ").strip()
-        
-        if user_id == '0':
-            break
-        
-        if not re.match(r'^\d+$', user_id):
-            logger.error("QQ号必须为纯数字，请重新输入")
-            continue
-        
-        user_id = int(user_id)
-        current_list = list(config.get('chat', {}).get('ban_user_id', []))
-        
-        if user_id in current_list:
-            logger.warning(f"用户 {user_id} 已在全局禁止名单中")
-        else:
-            current_list.append(user_id)
-            config['chat']['ban_user_id'] = current_list
-            logger.info(f"用户 {user_id} 已添加到全局禁止名单")
-        
-        if input("是否继续添加其他用户? (y/N): ").strip().lower() != 'y':
-            break
+    _add_ids_to_list(lists['ban_user_id'], "请输入要添加到全局禁止名单的用户QQ号（纯数字，可用空格或逗号分隔多个，输入0返回）: ",
+                     "用户", "全局禁止名单", "是否继续添加其他用户? (y/N): ")
 
 
-def _remove_user_from_ban_list(config):
+def _remove_user_from_ban_list(lists: ChatLists):
     """从全局禁止名单移除用户"""
-    current_list = list(config.get('chat', {}).get('ban_user_id', []))
-    
-    if not current_list:
-        logger.warning("全局禁止名单为空，无法删除")
-        return
-    
-    print(f"当前全局禁止名单: {current_list}")
-    
-    while True:
-        user_id = input("请输入要从全局禁止名单移除的用户QQ号（纯数字，输入0返回）: ").strip()
-        
-        if user_id == '0':
-            break
-        
-        if not re.match(r'^\d+$', user_id):
-            logger.error("QQ号必须为纯数字，请重新输入")
-            continue
-        
-        user_id = int(user_id)
-        
-        if user_id in current_list:
-            current_list.remove(user_id)
-            config['chat']['ban_user_id'] = current_list
-            logger.info(f"用户 {user_id} 已从全局禁止名单中移除")
-        else:
-            logger.warning(f"用户 {user_id} 不在当前全局禁止名单中")
-        
-        if input("是否继续移除其他用户? (y/N): ").strip().lower() != 'y':
-            break
+    _remove_ids_from_list(lists['ban_user_id'], "请输入要从全局禁止名单移除的用户QQ号（纯数字，可用空格或逗号分隔多个，输入0返回）: ",
+                          "用户", "全局禁止名单", "是否继续移除其他用户? (y/N): ")
 
 
-def _clear_ban_list(config):
+def _clear_ban_list(lists: ChatLists):
     """清空全局禁止名单"""
-    current_list = config.get('chat', {}).get('ban_user_id', [])
-    
-    if not current_list:
-        logger.warning("全局禁止名单已经为空")
-        return
-    
-    confirm = input(f"确认清空全局禁止名单吗？当前有 {len(current_list)} 个用户 (y/N): ").strip().lower()
-    
-    if confirm == 'y':
-        config['chat']['ban_user_id'] = []
-        logger.info("全局禁止名单已清空")
-    else:
-        logger.info("操作已取消")
+    _clear_id_list(lists['ban_user_id'], "全局禁止名单", "用户")
 
 
-def _show_ban_list_details(config):
+def _show_ban_list_details(lists: ChatLists):
     """显示全局禁止名单详情"""
-    current_list = config.get('chat', {}).get('ban_user_id', [])
-    
-    print("\n全局禁止名单详情:")
-    
-    if not current_list:
-        print("  (列表为空)")
-    else:
-        for i, user_id in enumerate(current_list, 1):
-            print(f"  {i}. {user_id}")
-    
-    print(f"总计: {len(current_list)} 个被禁止用户")
+    _show_id_list_details(lists['ban_user_id'], "全局禁止名单详情", "个被禁止用户")
 
 
 def install_vc_redist():
@@ -742,28 +784,36 @@ def launch_napcat(qq_number: Optional[str] = None, headed_mode: bool = False) ->
         command = f'CHCP 65001 & start http://127.0.0.1:6099/webui/web_login?token=napcat & NapCatWinBootMain.exe {qq_number}'
         logger.info(f"尝试以无头模式启动 NapCat (QQ: {qq_number})")
 
-    return create_cmd_window(cwd, command)
+    return _launched('napcat', open_cmd_window(cwd, command))
 
 def launch_adapter():
     adapter_path = get_absolute_path('modules/MaiBot-Napcat-Adapter')
-    return create_cmd_window(adapter_path, 'python main.py')
+    return _launched('adapter', open_cmd_window(adapter_path, 'python main.py'))
 
 def launch_main_bot():
     main_path = get_absolute_path('modules/MaiBot')
-    return create_cmd_window(main_path, 'python bot.py')
+    return _launched('main_bot', open_cmd_window(main_path, 'python bot.py'))
+
+def _launched(component: str, pid: Optional[int]) -> bool:
+    """组件启动成功后记录当前配置和窗口进程，作为按配置改动重启的对比基准"""
+    if pid is None:
+        return False
+    try:
+        record_launch_baseline(component, pid)
+    except Exception as e:
+        logger.warning(f"记录 {component} 的启动配置失败：{e}")
+    return True
 
 def update_qq_in_config(config_path: str, qq_number: str):
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            doc = tomlkit.parse(f.read())
+        doc = config_store.load_toml(config_path)
         
         if 'bot' not in doc:
             doc['bot'] = tomlkit.table()  # 如果 bot 表不存在则创建
         
         doc['bot']['qq_account'] = qq_number  # 直接赋值，tomlkit 会处理类型
         
-        with open(config_path, 'w', encoding='utf-8') as f:
-            tomlkit.dump(doc, f)
+        config_store.save_toml(config_path, doc)
             
     except Exception as e:
         logger.error(f"更新配置文件失败：{str(e)}")
@@ -778,10 +828,12 @@ def interactive_pip_install():
     print("\n=== 交互式安装pip模块 ===")
     print("1. 通过模块名称安装")
     print("2. 通过requirements.txt文件安装")
+    print("3. 导出本地依赖缓存（wheelhouse）")
+    print("4. 导入本地依赖缓存（wheelhouse）")
     print("0. 返回主菜单")
     
     while True:
-        choice = input("请选择安装模式 (1/2/0): ").strip()
+        choice = input("请选择安装模式 (1/2/3/4/0): ").strip()
         
         if choice == '0':
             logger.info("已取消pip模块安装，返回主菜单")
@@ -794,12 +846,12 @@ def interactive_pip_install():
                 logger.error("模块名称不能为空")
                 continue
             
-            # 使用内置的python路径和阿里云镜像源
+            # 使用内置的python路径，优先从本地wheelhouse安装，缺包时再走阿里云镜像源
             python_path = get_absolute_path('runtime/python31211/bin/python.exe')
-            command = f'"{python_path}" -m pip install -i https://mirrors.aliyun.com/pypi/simple/ {modules}'
+            command = build_wheelhouse_install_command(python_path, modules)
             
             logger.info(f"正在安装模块: {modules}")
-            logger.info("使用阿里云镜像源加速下载...")
+            logger.info(f"优先使用本地依赖缓存 {WHEELHOUSE_DIR}，缺少时使用阿里云镜像源下载...")
             
             script_dir = os.path.dirname(os.path.abspath(__file__))
             return create_cmd_window(script_dir, command)
@@ -822,18 +874,32 @@ def interactive_pip_install():
                 if confirm != 'y':
                     continue
             
-            # 使用内置的python路径和阿里云镜像源
+            # 使用内置的python路径，优先从本地wheelhouse安装，缺包时再走阿里云镜像源
             python_path = get_absolute_path('runtime/python31211/bin/python.exe')
-            command = f'"{python_path}" -m pip install -i https://mirrors.aliyun.com/pypi/simple/ -r "{requirements_path}"'
+            command = build_wheelhouse_install_command(python_path, f'-r "{requirements_path}"')
             
             logger.info(f"正在从requirements文件安装: {requirements_path}")
-            logger.info("使用阿里云镜像源加速下载...")
+            logger.info(f"优先使用本地依赖缓存 {WHEELHOUSE_DIR}，缺少时使用阿里云镜像源下载...")
             
             script_dir = os.path.dirname(os.path.abspath(__file__))
             return create_cmd_window(script_dir, command)
+        
+        elif choice == '3':
+            archive_path = input("请输入导出的压缩包路径（如 D:\\wheelhouse.zip）: ").strip().strip('"').strip("'")
+            if not archive_path:
+                logger.error("路径不能为空")
+                continue
+            return export_wheelhouse(os.path.normpath(archive_path))
+        
+        elif choice == '4':
+            archive_path = input("请输入要导入的压缩包路径: ").strip().strip('"').strip("'")
+            if not archive_path:
+                logger.error("路径不能为空")
+                continue
+            return import_wheelhouse(os.path.normpath(archive_path))
             
         else:
-            logger.error("无效选择，请输入 1、2 或 0")
+            logger.error("无效选择，请输入 1、2、3、4 或 0")
 
 def launch_python_cmd():
     """启动一个使用项目 Python 环境的CMD窗口"""
@@ -1049,12 +1115,40 @@ def log_operation_result(operation: str, success: bool) -> None:
     logger.info(f"正在{operation}...{status}")
 
 
+def check_configs_before_launch() -> bool:
+    """启动前校验所有配置文件（未变化的配置使用缓存结果）
+    
+    Returns:
+        bool: True表示可以继续启动
+    """
+    has_errors = False
+    for result in validate_all_configs():
+        for message in result['errors']:
+            logger.error(f"{result['name']}：{message}")
+        for message in result['warnings']:
+            logger.warning(f"{result['name']}：{message}")
+        has_errors = has_errors or bool(result['errors'])
+    
+    if not has_errors:
+        return True
+    
+    logger.error("配置校验未通过，直接启动可能会在组件启动后崩溃")
+    if input("是否仍然启动？(y/N): ").strip().lower() == 'y':
+        return True
+    logger.info("已取消启动，请修正配置后重试")
+    return False
+
+
 def handle_launch_all_services() -> None:
     """处理启动所有服务的逻辑"""
     qq_number = read_qq_from_config()
     if not qq_number:
         logger.error("请先配置QQ号（选项5）")
         return
+    
+    # 启动前校验所有配置，避免登录NapCat后才因配置错误崩溃
+    if not check_configs_before_launch():
+        return
 
     headed_mode = get_napcat_launch_mode()
     
@@ -1082,6 +1176,32 @@ def handle_launch_napcat_only() -> None:
     log_operation_result("启动 NapCat", success)
 
 
+def _prefetch_updates_loop(stop_event: threading.Event) -> None:
+    """后台定期预取所有仓库的上游更新，直到 stop_event 被设置"""
+    while not stop_event.is_set():
+        with suppress(Exception):
+            process = spawn_background_prefetch()
+            # 等待预取完成，期间退出控制台时终止预取进程
+            while process.poll() is None:
+                if stop_event.wait(1):
+                    process.kill()
+                    return
+        stop_event.wait(UPDATE_PREFETCH_INTERVAL)
+
+
+def start_update_prefetch() -> Optional[threading.Event]:
+    """启动后台预取线程
+    
+    Returns:
+        threading.Event: 用于停止预取的事件，预取被关闭时返回None
+    """
+    if UPDATE_PREFETCH_INTERVAL <= 0:
+        return None
+    stop_event = threading.Event()
+    threading.Thread(target=_prefetch_updates_loop, args=(stop_event,), daemon=True).start()
+    return stop_event
+
+
 class MenuItem:
     """菜单项类"""
     def __init__(self, key: str, description: str, action: Callable[[], None] = None):
@@ -1166,6 +1286,13 @@ class MenuManager:
             MenuItem("16", "快捷打开配置文件", lambda: log_operation_result("打开配置文件", open_config_file())),
             MenuItem("17", "管理API服务商", lambda: log_operation_result("管理API服务商", add_api_provider())),
             MenuItem("18", "MaiBot模型配置管理", lambda: log_operation_result("模型配置管理", change_model_provider())),
+            MenuItem("19", "Git仓库维护（清理与优化）", lambda: log_operation_result("Git仓库维护", maintain_repositories())),
+            MenuItem("20", "配置快照（查看/对比/恢复）", lambda: log_operation_result("配置快照管理", manage_config_snapshots())),
+            MenuItem("21", "OneBot连接配置（重连间隔）", lambda: log_operation_result("OneBot连接配置", manage_onebot_profiles())),
+            MenuItem("22", "按配置改动重启组件", lambda: log_operation_result("按配置改动重启组件", restart_changed_components())),
+            MenuItem("23", "多账号管理（添加/启动/状态）", lambda: log_operation_result("多账号管理", manage_accounts())),
+            MenuItem("24", "分群部署（多个麦麦分担一个账号的群）", lambda: log_operation_result("分群部署", manage_shards())),
+            MenuItem("25", "API服务商和模型测速", lambda: log_operation_result("API服务商测速", benchmark_providers())),
         ])
         
         # 退出组
@@ -1191,6 +1318,14 @@ class MenuManager:
         print("如果可以的话，希望您可以给这两个仓库点个Star！")
         print("======================")
         
+        # 显示后台预取到的可用更新（只读取本地预取状态，不联网）
+        available_updates = get_available_updates()
+        if available_updates:
+            details = "，".join(f"{name}（{count}个新提交）" for name, count in available_updates)
+            print(f"🔔 有可用更新：{details}")
+            print("运行“![更新所有模块.bat”即可更新")
+            print("======================")
+        
         # 显示一言
         text, from_who = get_hitokoto()
         if text:
@@ -1308,8 +1443,8 @@ def remove_menu_item(key: str):
 #     print("开发者功能2")
 # 
 # dev_items = [
-#     MenuItem("20", "开发者功能1", dev_function1),
-#     MenuItem("21", "开发者功能2", dev_function2)
+#     MenuItem("26", "开发者功能1", dev_function1),
+#     MenuItem("27", "开发者功能2", dev_function2)
 # ]
 # add_custom_menu_group("开发者功能：", dev_items, 2)  # 插入到第3个位置
 #
@@ -1368,6 +1503,8 @@ def open_config_file() -> bool:
     if not os.path.exists(path):
         logger.error(f"找不到配置文件 {path}")
         return False
+    # 手动编辑前保存快照，改错时可在配置快照菜单中恢复
+    snapshot_file(path, reason='手动编辑前')
     try:
         subprocess.run([code_exe, path], check=True)
         logger.info(f"{name} 已使用 VSCode 打开")
@@ -1377,6 +1514,316 @@ def open_config_file() -> bool:
         return False
 
 
+def _choose_snapshot(path: str, prompt: str):
+    """显示配置文件的历史版本并让用户选择，返回快照记录或None"""
+    snapshots = list_snapshots(path)
+    if not snapshots:
+        logger.warning("该配置文件还没有快照")
+        return None
+    for number, entry in enumerate(snapshots, 1):
+        print(format_snapshot(number, entry))
+    while True:
+        version = input(f"{prompt}（序号或哈希前缀，0返回）: ").strip()
+        if version == '0' or not version:
+            return None
+        entry = find_snapshot(path, version)
+        if entry is not None:
+            return entry
+        logger.error("找不到该版本，请重新输入")
+
+
+def manage_config_snapshots() -> bool:
+    """查看、对比和恢复配置文件快照"""
+    while True:
+        files = list_snapshot_files()
+        print("\n=== 配置快照 ===")
+        if not files:
+            print("还没有任何配置快照，修改配置时会自动保存")
+            input("\n按回车键继续...")
+            return True
+        for idx, (key, count, _) in enumerate(files, 1):
+            print(f"{idx}. {key}  ({count} 个快照)")
+        print("0. 返回主菜单")
+        choice = input("请选择配置文件: ").strip()
+        if choice == '0':
+            return True
+        if not choice.isdigit() or not (1 <= int(choice) <= len(files)):
+            logger.error("无效选择")
+            continue
+        key = files[int(choice) - 1][0]
+
+        print(f"\n=== {key} ===")
+        print("1. 查看历史版本")
+        print("2. 对比历史版本与当前文件")
+        print("3. 恢复到历史版本")
+        print("0. 返回")
+        action = input("请选择操作: ").strip()
+        if action == '1':
+            for number, entry in enumerate(list_snapshots(key), 1):
+                print(format_snapshot(number, entry))
+            input("\n按回车键继续...")
+        elif action == '2':
+            entry = _choose_snapshot(key, "请选择要对比的版本")
+            if entry:
+                print(diff_snapshot(key, entry['hash']) or "没有差异")
+                input("\n按回车键继续...")
+        elif action == '3':
+            entry = _choose_snapshot(key, "请选择要恢复的版本")
+            if not entry:
+                continue
+            print(diff_snapshot(key, entry['hash']) or "没有差异")
+            if input("确认恢复到该版本？当前内容会先保存为快照 (y/N): ").strip().lower() != 'y':
+                logger.info("操作已取消")
+                continue
+            if restore_snapshot(key, entry['hash']):
+                logger.info(f"✅ 已恢复 {key} 到 {entry['hash'][:SHORT_HASH_LENGTH]}")
+            else:
+                logger.info("当前内容与该快照相同，无需恢复")
+
+
+def _print_onebot_settings():
+    selection = load_onebot_profile_selection()
+    profile = CONNECTION_PROFILES[selection['profile']]
+    settings = get_onebot_client_settings()
+    print(f"当前方案：{profile['name']} ({selection['profile']})")
+    print(f"  心跳间隔: {settings['heartInterval']} 毫秒，重连间隔: {settings['reconnectInterval']} 毫秒")
+    print(f"  debug: {'开' if settings['debug'] else '关'}，"
+          f"上报自身消息(reportSelfMessage): {'开' if settings['reportSelfMessage'] else '关'}")
+
+
+def _apply_onebot_profile() -> None:
+    """将所选方案写入已有的 onebot11 配置文件"""
+    updated = apply_profile_to_existing_configs()
+    if updated:
+        for path in updated:
+            logger.info(f"已更新 {path}")
+        logger.info("✅ 连接配置已应用，重启 NapCat 后生效")
+    else:
+        logger.info("已有的 OneBot 配置文件无需修改")
+
+
+def manage_onebot_profiles() -> bool:
+    """选择 OneBot 连接配置方案并测量适配器重连耗时"""
+    while True:
+        print("\n=== OneBot连接配置 ===")
+        _print_onebot_settings()
+        print("\n1. 选择连接配置方案")
+        print("2. 开关 debug")
+        print("3. 开关 上报自身消息(reportSelfMessage)")
+        print("4. 测量适配器重连耗时")
+        print("5. 查看各方案的测量结果")
+        print("0. 返回主菜单")
+        choice = input("请选择操作: ").strip()
+
+        if choice == '0':
+            return True
+        elif choice == '1':
+            profile_keys = list(CONNECTION_PROFILES)
+            for idx, key in enumerate(profile_keys, 1):
+                profile = CONNECTION_PROFILES[key]
+                print(f"{idx}. {profile['name']} ({key}) - {profile['description']}")
+            profile_choice = input(f"请选择方案（1-{len(profile_keys)}，0返回）: ").strip()
+            if not profile_choice.isdigit() or not (1 <= int(profile_choice) <= len(profile_keys)):
+                continue
+            selection = load_onebot_profile_selection()
+            save_onebot_profile_selection(profile_keys[int(profile_choice) - 1], selection['overrides'])
+            _apply_onebot_profile()
+        elif choice in ('2', '3'):
+            key = 'debug' if choice == '2' else 'reportSelfMessage'
+            selection = load_onebot_profile_selection()
+            overrides = dict(selection['overrides'])
+            overrides[key] = not get_onebot_client_settings()[key]
+            save_onebot_profile_selection(selection['profile'], overrides)
+            _apply_onebot_profile()
+        elif choice == '4':
+            print("测量会反复重启适配器，请先关闭已运行的适配器窗口，并确保 NapCat 已启动且已使用当前方案（修改方案后需重启 NapCat）")
+            trials = input("测量次数（默认3）: ").strip()
+            trials = int(trials) if trials.isdigit() and int(trials) > 0 else 3
+            try:
+                record = measure_reconnect(trials, report=logger.info)
+            except RuntimeError as e:
+                logger.error(f"测量失败：{e}")
+                continue
+            if record['samples']:
+                logger.info(f"✅ 平均重连耗时 {record['average']} 秒，最长 {record['max']} 秒，超时 {record['timeouts']} 次")
+            else:
+                logger.warning(f"所有 {record['timeouts']} 次测量均未重连")
+        elif choice == '5':
+            summary = summarize_onebot_measurements()
+            if not summary:
+                print("还没有测量记录")
+            for key, item in summary.items():
+                name = CONNECTION_PROFILES.get(key, {}).get('name', key)
+                print(f"{name} ({key}): 测量 {item['runs']} 轮，平均 {item['average']} 秒，"
+                      f"最长 {item['max']} 秒，超时 {item['timeouts']} 次")
+            input("\n按回车键继续...")
+        else:
+            logger.error("无效选择")
+
+
+def restart_changed_components() -> bool:
+    """对比各组件启动时的配置，只重启受配置改动影响的组件"""
+    plan = plan_restart()
+    print("\n=== 按配置改动重启组件 ===")
+    for key in plan['untracked']:
+        print(f"提示：{get_restart_component(key)['name']} 未通过控制台启动过，无法判断其配置改动")
+    if not plan['restart']:
+        logger.info("各组件启动后配置没有影响它们的改动，无需重启")
+        return True
+
+    for key in plan['restart']:
+        component = get_restart_component(key)
+        reasons = plan['reasons'][key]
+        print(f"\n需要重启 {component['name']}（{len(reasons)} 项改动）：")
+        for config_key, key_path in reasons[:10]:
+            print(f"  {config_key}: {key_path}")
+        if len(reasons) > 10:
+            print(f"  ... 共 {len(reasons)} 项")
+        if component.get('relogin'):
+            print("  ⚠️  重启 NapCat 需要重新登录QQ")
+
+    if input("\n是否按以上顺序重启？(y/N): ").strip().lower() != 'y':
+        logger.info("操作已取消")
+        return True
+
+    qq_number = read_qq_from_config()
+    headed_mode = get_napcat_launch_mode() if 'napcat' in plan['restart'] else False
+    launchers = {
+        'main_bot': launch_main_bot,
+        'adapter': launch_adapter,
+        'napcat': lambda: launch_napcat(qq_number, headed_mode=headed_mode),
+    }
+    return execute_restart_plan(plan, launchers, report=logger.info)
+
+
+def launch_account(account: dict, headed_mode: bool = False) -> bool:
+    """按依赖顺序启动一个账号的麦麦主程序、适配器和 NapCat"""
+    if account.get('primary'):
+        success = launch_main_bot() and launch_adapter()
+    else:
+        paths = get_account_paths(account)
+        success = (create_cmd_window(paths['main_dir'], 'python bot.py')
+                   and create_cmd_window(paths['adapter_dir'], 'python main.py'))
+    return success and launch_napcat(account['qq'], headed_mode=headed_mode)
+
+
+def manage_accounts() -> bool:
+    """添加、移除、启动多个同时运行的QQ账号，并查看它们的运行状态"""
+    while True:
+        print("\n=== 多账号管理 ===")
+        status = get_accounts_status()
+        if not status:
+            print("还没有配置任何账号，请先使用「添加/修改QQ号」设置主账号")
+        for item in status:
+            print(format_account_status(item))
+        print("\n1. 添加账号（自动分配端口）")
+        print("2. 移除账号")
+        print("3. 启动所有账号")
+        print("4. 启动单个账号")
+        print("5. 刷新状态")
+        print("0. 返回主菜单")
+        choice = input("请选择操作: ").strip()
+
+        if choice == '0':
+            return True
+        elif choice == '1':
+            qq_number = input("请输入要添加的QQ号: ").strip()
+            try:
+                account = add_account(qq_number)
+            except (ValueError, RuntimeError, OSError) as e:
+                logger.error(f"添加账号失败：{e}")
+                continue
+            logger.info(f"✅ 已添加账号 {account['qq']}：适配器端口 {account['adapter_port']}，"
+                        f"麦麦主程序端口 {account['core_port']}")
+            print(f"该账号的配置位于 {account['dir']}，API Key 等需要单独填写到其中的 MaiBot/.env")
+        elif choice == '2':
+            qq_number = input("请输入要移除的QQ号（主账号不能移除）: ").strip()
+            delete_files = input("是否同时删除该账号的目录和数据？(y/N): ").strip().lower() == 'y'
+            if remove_account(qq_number, delete_files):
+                logger.info(f"✅ 已移除账号 {qq_number}")
+            else:
+                logger.error(f"账号 {qq_number} 不存在")
+        elif choice in ('3', '4'):
+            accounts = list_all_accounts()
+            if choice == '4':
+                qq_number = input("请输入要启动的QQ号: ").strip()
+                accounts = [account for account in accounts if account['qq'] == qq_number]
+                if not accounts:
+                    logger.error(f"账号 {qq_number} 不存在")
+                    continue
+            headed_mode = get_napcat_launch_mode()
+            for account in accounts:
+                if launch_account(account, headed_mode):
+                    logger.info(f"已启动账号 {account['qq']}")
+                else:
+                    logger.error(f"启动账号 {account['qq']} 失败")
+        elif choice == '5':
+            continue
+        else:
+            logger.error("无效选择")
+
+
+def manage_shards() -> bool:
+    """设置账号的分片数、按消息数重新分配群，并启动各分片"""
+    qq_number = input("请输入要分群部署的QQ号（直接回车使用主账号）: ").strip() or read_qq_from_config()
+    if not qq_number:
+        return False
+    while True:
+        print(f"\n=== 分群部署（QQ {qq_number}）===")
+        try:
+            for item in get_shards_status(qq_number):
+                print(format_shard_status(item))
+        except ValueError as e:
+            logger.error(str(e))
+            return False
+        print("\n1. 设置分片数（1为取消分片）")
+        print(f"2. 按最近{DEFAULT_RATE_WINDOW_HOURS}小时的消息数重新分配群")
+        print("3. 从所有分片移除群")
+        print("4. 启动分片2及之后的分片（分片1随账号启动）")
+        print("0. 返回主菜单")
+        choice = input("请选择操作: ").strip()
+
+        if choice == '0':
+            return True
+        elif choice == '1':
+            count = input(f"分片数（1-{MAX_SHARDS}）: ").strip()
+            if not count.isdigit():
+                logger.error("无效的分片数")
+                continue
+            try:
+                plan = set_shard_count(qq_number, int(count), report=logger.info)
+            except (ValueError, OSError) as e:
+                logger.error(f"设置分片数失败：{e}")
+                continue
+            for line in format_rebalance(plan):
+                print(line)
+            logger.info("NapCat 的连接配置已更新，重启 NapCat 后连接新的分片")
+        elif choice == '2':
+            plan = rebalance_shards(qq_number, dry_run=True)
+            for line in format_rebalance(plan):
+                print(line)
+            if not plan['moves'] or input("是否按以上结果移动群？(y/N): ").strip().lower() != 'y':
+                continue
+            plan = rebalance_shards(qq_number)
+            if plan['changed']:
+                logger.info(f"✅ 已重新分配，请重启分片 {', '.join(map(str, plan['changed']))} 的适配器")
+        elif choice == '3':
+            groups, invalid = parse_ids(input("请输入要移除的群号（多个用空格或逗号分隔）: "))
+            if invalid:
+                logger.warning(f"忽略无效的群号：{', '.join(invalid)}")
+            logger.info(f"已从所有分片移除 {remove_shard_groups(qq_number, groups)} 个群")
+        elif choice == '4':
+            for shard in get_shard_list(qq_number)[1:]:
+                paths = shard['paths']
+                if (create_cmd_window(paths['main_dir'], 'python bot.py')
+                        and create_cmd_window(paths['adapter_dir'], 'python main.py')):
+                    logger.info(f"已启动分片{shard['number']}")
+                else:
+                    logger.error(f"启动分片{shard['number']}失败")
+        else:
+            logger.error("无效选择")
+
+
 def check_and_create_config_files() -> bool:
     """检测并创建所有必要的配置文件
     
@@ -1465,6 +1912,12 @@ def main() -> None:
     # 检测并创建配置文件
     check_and_create_config_files()
     
+    # 合并配置模板的更新（模板和配置都未变化时直接跳过）
+    merge_config_templates(report=logger.info)
+    
+    # 后台低优先级预取上游更新
+    prefetch_stop_event = start_update_prefetch()
+    
     try:
         while True:
             choice = show_menu()
@@ -1472,6 +1925,9 @@ def main() -> None:
                 break
     except KeyboardInterrupt:
         logger.info("\n程序已被用户中断")
+    finally:
+        if prefetch_stop_event:
+            prefetch_stop_event.set()
         
 
 
@@ -1528,43 +1984,33 @@ def _get_existing_providers(env_path: str) -> dict:
     Returns:
         dict: 服务商配置字典，格式为 {provider_name: {'base_url': url, 'key': key}}
     """
-    from dotenv import load_dotenv
-    
-    providers = {}
-    
     try:
-        with open(env_path, 'r', encoding='utf-8') as f:
-            env_content = f.read()
-        
-        load_dotenv(env_path)
-        
-        # 查找现有的API服务商
-        provider_keys = set()
-        for line in env_content.split('\n'):
-            line = line.strip()
-            if line and not line.startswith('#') and '=' in line:
-                key = line.split('=')[0].strip()
-                if key.endswith('_BASE_URL') or key.endswith('_KEY'):
-                    provider = key.replace('_BASE_URL', '').replace('_KEY', '')
-                    provider_keys.add(provider)
-        
-        # 获取每个服务商的完整配置
-        for provider in provider_keys:
-            base_url_key = f"{provider}_BASE_URL"
-            api_key_key = f"{provider}_KEY"
-            
-            base_url = os.getenv(base_url_key, '')
-            api_key = os.getenv(api_key_key, '')
-            
-            providers[provider] = {
-                'base_url': base_url,
-                'key': api_key
-            }
-            
+        return _load_env_document(env_path).providers()
     except Exception as e:
         logger.warning(f"读取现有配置时出错：{str(e)}")
-    
-    return providers
+        return {}
+
+
+def _load_env_document(env_path: str) -> EnvDocument:
+    """读取.env文档，文件不存在时返回空文档"""
+    if not os.path.exists(env_path):
+        return EnvDocument()
+    return config_store.load_env_document(env_path)
+
+
+def _save_provider(env_path: str, provider_name: str, api_url: str, api_key: str) -> None:
+    """将API服务商的 BASE_URL 和 KEY 写入.env文件，已存在的变量原位修改"""
+    document = _load_env_document(env_path)
+    document.update({
+        f"{provider_name}_BASE_URL": api_url,
+        f"{provider_name}_KEY": api_key or "",
+    })
+    try:
+        config_store.save_env_document(env_path, document)
+    except Exception:
+        # 写入失败时丢弃缓存中已修改的文档
+        config_store.invalidate(env_path)
+        raise
 
 
 def _mask_api_key(api_key: str) -> str:
@@ -1735,8 +2181,6 @@ def _add_predefined_provider(env_path: str, provider_key: str, provider_info: di
     Returns:
         bool: 是否成功添加
     """
-    from dotenv import set_key
-    
     print(f"\n=== 添加 {provider_info['name']} ===")
     print(f"服务商：{provider_info['name']}")
     print(f"描述：{provider_info['description']}")
@@ -1768,8 +2212,7 @@ def _add_predefined_provider(env_path: str, provider_key: str, provider_info: di
         base_url_key = f"{provider_key}_BASE_URL"
         api_key_key = f"{provider_key}_KEY"
         
-        set_key(env_path, base_url_key, api_url)
-        set_key(env_path, api_key_key, api_key if api_key else "")
+        _save_provider(env_path, provider_key, api_url, api_key)
         
         logger.info(f"✅ API服务商 {provider_info['name']} ({provider_key}) 已成功添加！")
         print("环境变量已设置：")
@@ -1793,8 +2236,6 @@ def _add_custom_provider(env_path: str, existing_providers: dict) -> bool:
     Returns:
         bool: 是否成功添加
     """
-    from dotenv import set_key
-    
     print("\n=== 自定义添加API服务商 ===")
     print("注意：服务商名称将用于生成环境变量，建议使用大写英文")
     print("例如：OPENAI, ANTHROPIC, GOOGLE 等")
@@ -1847,8 +2288,7 @@ def _add_custom_provider(env_path: str, existing_providers: dict) -> bool:
             base_url_key = f"{provider_name}_BASE_URL"
             api_key_key = f"{provider_name}_KEY"
             
-            set_key(env_path, base_url_key, api_url)
-            set_key(env_path, api_key_key, api_key if api_key else "")
+            _save_provider(env_path, provider_name, api_url, api_key)
             
             logger.info(f"✅ API服务商 {provider_name} 已成功添加！")
             print("环境变量已设置：")
@@ -1868,8 +2308,6 @@ def _add_custom_provider(env_path: str, existing_providers: dict) -> bool:
 
 def _modify_api_provider(env_path: str) -> bool:
     """修改现有API服务商"""
-    from dotenv import set_key
-    
     existing_providers = _get_existing_providers(env_path)
     
     if not existing_providers:
@@ -1928,8 +2366,7 @@ def _modify_api_provider(env_path: str) -> bool:
             base_url_key = f"{provider_name}_BASE_URL"
             api_key_key = f"{provider_name}_KEY"
             
-            set_key(env_path, base_url_key, new_url)
-            set_key(env_path, api_key_key, new_key)
+            _save_provider(env_path, provider_name, new_url, new_key)
             
             logger.info(f"✅ API服务商 {provider_name} 配置已更新！")
             print("新的配置：")
@@ -2001,24 +2438,14 @@ def _delete_api_provider(env_path: str) -> bool:
             base_url_key = f"{provider_name}_BASE_URL"
             api_key_key = f"{provider_name}_KEY"
             
-            # 读取.env文件内容
-            with open(env_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            # 过滤掉要删除的配置行
-            new_lines = []
-            for line in lines:
-                line_stripped = line.strip()
-                if line_stripped and not line_stripped.startswith('#') and '=' in line_stripped:
-                    key = line_stripped.split('=')[0].strip()
-                    if key not in [base_url_key, api_key_key]:
-                        new_lines.append(line)
-                else:
-                    new_lines.append(line)
-            
-            # 写回文件
-            with open(env_path, 'w', encoding='utf-8') as f:
-                f.writelines(new_lines)
+            document = _load_env_document(env_path)
+            document.delete(base_url_key)
+            document.delete(api_key_key)
+            try:
+                config_store.save_env_document(env_path, document)
+            except Exception:
+                config_store.invalidate(env_path)
+                raise
             
             logger.info(f"✅ API服务商 {provider_name} 已成功删除！")
             
@@ -2070,6 +2497,32 @@ def _display_all_api_providers(env_path: str) -> bool:
     return True
 
 
+def benchmark_providers() -> bool:
+    """对麦麦模型配置中用到的服务商和模型测速，显示排名"""
+    targets, missing = build_targets()
+    for provider in missing:
+        logger.warning(f".env 中没有服务商 {provider} 的 BASE_URL，跳过")
+    if not targets:
+        logger.error("没有可测速的服务商和模型，请先配置API服务商和模型")
+        return False
+
+    print("\n=== API服务商和模型测速 ===")
+    for target in targets:
+        print(f"  {target['provider']} / {target['model']}")
+    print("测速会向以上服务商发送真实请求并消耗少量额度")
+    concurrency = input(f"并发请求数（默认{DEFAULT_CONCURRENCY}）: ").strip()
+    concurrency = int(concurrency) if concurrency.isdigit() and int(concurrency) > 0 else DEFAULT_CONCURRENCY
+    requests_count = input(f"每个模型的请求数（默认{DEFAULT_REQUESTS}）: ").strip()
+    requests_count = int(requests_count) if requests_count.isdigit() and int(requests_count) > 0 else DEFAULT_REQUESTS
+
+    summaries, _, markdown_path = run_benchmark(targets, concurrency, requests_count, report=logger.info)
+    print()
+    print(format_benchmark_table(summaries))
+    logger.info(f"测速报告已保存：{markdown_path}")
+    input("\n按回车键继续...")
+    return True
+
+
 def change_model_provider():
     """交互式配置模型"""
     config_path = get_absolute_path('modules/MaiBot/config/bot_config.toml')
@@ -2092,8 +2545,7 @@ def change_model_provider():
             return False
         
         # 读取当前配置
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = tomlkit.load(f)
+        config = config_store.load_toml(config_path)
         
         if 'model' not in config:
             logger.error("错误：配置文件中没有找到 [model] 配置段")
@@ -2146,18 +2598,21 @@ def change_model_provider():
             
             # 配置选定的模型
             if _configure_single_model(section_name, section_config, existing_providers):
-                # 保存配置
-                with open(config_path, 'w', encoding='utf-8') as f:
-                    tomlkit.dump(config, f)
+                # 确认后立即保存
+                config_store.save_toml(config_path, config)
                 display_name = _get_model_display_name(section_name)
                 logger.info(f"✅ 模型 {display_name} [{section_name}] 配置已保存！")
-                
-                # 更新模型配置列表（可能有变化）
-                model_sections = _get_model_sections(config['model'])
             else:
+                # 丢弃该模型已修改的配置项，从文件重新读取
+                config_store.invalidate(config_path)
+                config = config_store.load_toml(config_path)
                 logger.warning("模型配置被取消")
+            
+            # 更新模型配置列表（可能有变化）
+            model_sections = _get_model_sections(config['model'])
                 
     except Exception as e:
+        config_store.invalidate(config_path)
         logger.error(f"配置模型失败：{str(e)}")
         return False
     
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from chat_lists import IdList, import_ids, parse_id, parse_ids
+
+
+def test_parse_id_rejects_non_decimal_digits():
+    # '²' 满足 str.isdigit()，但 int() 无法转换
+    assert parse_id('²') is None
+    assert parse_id('١٢٣') == 123
+    assert parse_id('0') is None
+    assert parse_id(' 12345 ') == 12345
+
+
+def test_parse_ids_lists_invalid_tokens():
+    ids, invalid = parse_ids('123, ²；abc 456')
+    assert ids == [123, 456]
+    assert invalid == ['²', 'abc']
+
+
+def test_import_ids_skips_invalid_tokens(tmp_path):
+    source = tmp_path / 'ids.txt'
+    source.write_text('123\n²\n456\n123\n', encoding='utf-8')
+    id_list = IdList()
+    added, duplicates, invalid = import_ids(id_list, str(source))
+    assert (added, duplicates, invalid) == (2, 1, 1)
+    assert id_list.sorted() == [123, 456]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import tomlkit
+
+from config_merge import merge_documents
+
+OLD_TEMPLATE = '''[inner]
+version = "1.0.0"
+
+# 机器人
+[bot]
+qq_account = 0
+nickname = "麦麦"
+
+# 聊天
+[chat]
+talk_frequency = 1
+
+[model]
+max_tokens = 1024
+
+[model.utils]
+name = "a"
+'''
+
+NEW_TEMPLATE = '''[inner]
+version = "1.1.0"
+
+# 机器人
+[bot]
+qq_account = 0
+# 麦麦的别名
+alias_names = []
+nickname = "麦麦"
+platform = "qq"
+
+# 表情包
+[emoji]
+emoji_chance = 0.6
+
+# 聊天
+[chat]
+talk_frequency = 1
+
+[model]
+max_tokens = 1024
+temperature = 0.2
+
+[model.utils]
+name = "a"
+
+# 小模型
+[model.utils_small]
+name = "b"
+
+# 实验性功能
+[experimental]
+enable = false
+'''
+
+
+def merge(base, new, user):
+    document = tomlkit.parse(user)
+    result = merge_documents(tomlkit.parse(base) if base is not None else None, tomlkit.parse(new), document)
+    return result, tomlkit.dumps(document)
+
+
+def test_added_items_follow_template_layout():
+    user = OLD_TEMPLATE.replace('qq_account = 0', 'qq_account = 123')
+    result, text = merge(OLD_TEMPLATE, NEW_TEMPLATE, user)
+    assert text == NEW_TEMPLATE.replace('qq_account = 0', 'qq_account = 123')
+    assert result['added'] == ['bot.alias_names', 'bot.platform', 'emoji', 'model.temperature',
+                               'model.utils_small', 'experimental']
+    assert result['updated'] == ['inner.version']
+
+
+def test_modified_version_is_a_conflict():
+    user = OLD_TEMPLATE.replace('version = "1.0.0"', 'version = "0.9.0"')
+    result, text = merge(OLD_TEMPLATE, NEW_TEMPLATE, user)
+    assert 'version = "0.9.0"' in text
+    assert [key for key, _ in result['conflicts']] == ['inner.version']
+
+
+def test_first_merge_keeps_version():
+    result, text = merge(None, NEW_TEMPLATE, OLD_TEMPLATE)
+    assert 'version = "1.0.0"' in text
+    assert 'inner.version' not in result['updated']
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from env_document import EnvDocument
+
+
+def test_single_quoted_values_are_not_interpolated():
+    document = EnvDocument.parse("HOST=localhost\nURL=\"http://${HOST}\"\nLITERAL='${HOST}'\nBARE=${HOST:-x}\n")
+    assert document['URL'] == 'http://localhost'
+    assert document['LITERAL'] == '${HOST}'
+    assert document['BARE'] == 'localhost'
+
+
+def test_set_value_is_interpolated_and_round_trips():
+    text = "HOST=localhost\nLITERAL='${HOST}'  # 注释\n"
+    document = EnvDocument.parse(text)
+    assert document.dumps() == text
+    document['LITERAL'] = '${HOST}:8000'
+    assert document['LITERAL'] == 'localhost:8000'
+    assert document.dumps() == "HOST=localhost\nLITERAL=${HOST}:8000  # 注释\n"
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+import llm_benchmark
+from llm_benchmark import build_targets, get_stub_targets, run_benchmark, run_request, save_report, start_stub_server
+
+
+@pytest.fixture
+def stub_server():
+    server = start_stub_server()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def report_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_benchmark, 'BENCHMARK_REPORT_DIR', tmp_path)
+    return tmp_path
+
+
+def test_run_request_against_stub(stub_server):
+    target = next(target for target in get_stub_targets(stub_server) if target['model'] == 'stub-fast')
+    result = run_request(target, max_tokens=8)
+    assert result['ok'], result['error']
+    assert result['status'] == 200
+    assert result['tokens'] == 8
+    assert 0 < result['ttft'] <= result['latency']
+
+
+def test_run_request_reports_unknown_model(stub_server):
+    target = {**get_stub_targets(stub_server)[0], 'model': 'missing'}
+    result = run_request(target, max_tokens=8)
+    assert not result['ok']
+    assert result['status'] == 404
+
+
+def test_run_benchmark_ranks_and_saves_report(stub_server, report_dir):
+    summaries, json_path, markdown_path = run_benchmark(
+        get_stub_targets(stub_server), concurrency=2, requests_count=4, max_tokens=8, report=lambda *args: None)
+    assert [summary['model'] for summary in summaries] == ['stub-fast', 'stub-slow']
+    assert summaries[0]['succeeded'] == 4
+    assert json_path.exists() and markdown_path.exists()
+    assert '| 1 | STUB | stub-fast |' in markdown_path.read_text(encoding='utf-8')
+
+
+def test_save_report_names_are_unique(report_dir):
+    settings = {'concurrency': 1, 'requests': 1, 'max_tokens': 8}
+    paths = set()
+    for _ in range(5):
+        # 同一秒内连续保存，文件名以毫秒区分
+        paths.add(save_report([], settings)[0])
+        time.sleep(0.002)
+    assert len(paths) == 5
+    assert len(list(report_dir.glob('benchmark_*.json'))) == 5
+
+
+def test_build_targets_reads_providers_from_env(tmp_path):
+    env_path = tmp_path / '.env'
+    env_path.write_text('STUB_BASE_URL=http://127.0.0.1:1/v1\nSTUB_KEY=secret\nOTHER_KEY=only-key\n',
+                        encoding='utf-8')
+    targets, missing = build_targets([('STUB', 'stub-fast'), ('OTHER', 'model'), ('NONE', 'model')],
+                                     env_path=str(env_path))
+    assert targets == [{'provider': 'STUB', 'model': 'stub-fast', 'base_url': 'http://127.0.0.1:1/v1',
+                        'key': 'secret'}]
+    assert missing == ['OTHER', 'NONE']
@@ -4,19 +4,113 @@
 功能：更新所有模块的git仓库并安装依赖包
 支持参数：
 - --only-onekey: 仅更新一键包仓库
+- --plan: 仅预检更新内容（待更新提交、变更文件、依赖与配置模板变化），不修改工作区
+- --prefetch: 仅获取上游最新提交（供控制台后台预取使用），不修改工作区
+- --maintenance: 维护所有仓库（gc/repack、commit-graph、multi-pack-index、清理过期引用）
+- --export-bundle <文件>: 导出离线更新包（每个仓库的git bundle及其依赖wheel）
+- --apply-bundle <文件>: 在无法联网的机器上使用离线更新包更新
+- --offline: 离线模式，仅使用本地wheelhouse安装依赖，不访问镜像源
+- --export-wheelhouse <文件>: 将本地wheelhouse导出为zip压缩包
+- --import-wheelhouse <文件>: 从zip压缩包导入wheelhouse
+- --rollback: 回滚到上一次更新前的状态
+- --no-rollback: 冒烟检查失败时不自动回滚
+- --precompile: 仅预编译麦麦主程序和适配器的字节码
+- --no-precompile: 更新后不预编译字节码
 - 无参数: 更新所有模块
 
 特性：
 - 支持多个备用远程仓库，当一个仓库无法访问时自动尝试下一个
 - 在拉取前强制设置远程仓库为指定的仓库地址
+- 并发探测备用远程仓库，git网络操作带超时，卡死的镜像不会阻塞更新
 - 自动安装requirements.txt中的依赖包
+- 依赖包缓存在 runtime/wheelhouse 中，之后的安装优先离线进行
+- 更新前记录各仓库提交与依赖版本，更新后冒烟检查失败时自动回滚
+- 更新后多进程预编译字节码，缩短首次启动时间
+- 更新后将配置模板新增的配置项三方合并到用户配置中
+- 控制台在后台低优先级预取上游提交，更新时直接使用预取结果，只需本地重置和安装依赖
+- 每次更新生成JSON性能报告（各仓库及各镜像的耗时、下载量、pip耗时），保存在 runtime/update_reports
 """
 
+import argparse
+import asyncio
+import importlib.util
+import json
 import os
+import py_compile
 import subprocess
+import shutil
 import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 
+# 本地wheel缓存目录，首次联网安装时填充，之后使用 --no-index --find-links 离线安装
+WHEELHOUSE_DIR = Path(__file__).parent.absolute() / 'runtime' / 'wheelhouse'
+# pip镜像源参数（阿里云镜像）
+PIP_INDEX_ARGS = '-i https://mirrors.aliyun.com/pypi/simple/ --trusted-host mirrors.aliyun.com'
+# pip通用参数（禁用进度条避免编码问题）
+PIP_COMMON_ARGS = '--no-color --disable-pip-version-check --progress-bar off'
+# git网络操作的超时时间（秒），防止镜像卡死导致更新无限等待
+GIT_NETWORK_TIMEOUT = 300
+# 探测镜像可用性的超时时间（秒）
+MIRROR_PROBE_TIMEOUT = 20
+# 终止子进程后等待其退出的最长时间（秒）
+PROCESS_EXIT_TIMEOUT = 5
+# 更新事务记录文件，保存更新前各仓库的提交和已安装依赖的版本，用于回滚
+UPDATE_TRANSACTION_PATH = Path(__file__).parent.absolute() / 'runtime' / 'update_transaction.json'
+# 更新后冒烟检查的超时时间（秒）
+SMOKE_CHECK_TIMEOUT = 120
+# 一键包内置的Python解释器，字节码必须由运行麦麦的同一解释器生成
+BUNDLED_PYTHON = Path(__file__).parent.absolute() / 'runtime' / 'python31211' / 'bin' / 'python.exe'
+# 冒烟检查在仓库目录中编译入口文件（命令行参数），并查找其顶层导入的模块是否存在；
+# 不执行入口文件的任何代码，入口文件顶层有副作用（如启动程序、写文件）也不受影响
+SMOKE_PROBE_CODE = ("import ast, importlib.util, sys; sys.path.insert(0, '.'); "
+                    "tree = ast.parse(open(sys.argv[1], encoding='utf-8').read(), sys.argv[1]); "
+                    "compile(tree, sys.argv[1], 'exec'); "
+                    "names = {alias.name.split('.')[0] for node in tree.body if isinstance(node, ast.Import) "
+                    "for alias in node.names} | {node.module.split('.')[0] for node in tree.body "
+                    "if isinstance(node, ast.ImportFrom) and node.module and not node.level}; "
+                    "missing = sorted(name for name in names if importlib.util.find_spec(name) is None); "
+                    "sys.exit('缺少模块: ' + ', '.join(missing) if missing else 0)")
+# 预检（--plan）获取的上游提交保存到此引用，不影响工作区和当前分支
+UPSTREAM_REF = 'refs/onekey/upstream'
+# 更新前的提交保存到此引用，防止仓库维护（gc）清理掉回滚所需的对象
+PRE_UPDATE_REF = 'refs/onekey/pre-update'
+# 更新预检报告
+UPDATE_PLAN_PATH = Path(__file__).parent.absolute() / 'runtime' / 'update_plan.json'
+# 预检发现可用更新时的退出码，便于脚本判断是否需要真正更新
+PLAN_UPDATES_AVAILABLE_EXIT_CODE = 100
+# 离线更新包解压目录
+UPDATE_BUNDLE_DIR = Path(__file__).parent.absolute() / 'runtime' / 'update_bundle'
+# 离线更新包中的清单文件名
+BUNDLE_MANIFEST_NAME = 'manifest.json'
+# 预编译时跳过的目录
+PRECOMPILE_EXCLUDED_DIRS = {'.git', '__pycache__', 'venv', '.venv', 'node_modules', 'data', 'logs'}
+# 后台预取状态文件，记录各仓库预取到的上游提交及待更新提交数
+PREFETCH_STATE_PATH = Path(__file__).parent.absolute() / 'runtime' / 'update_prefetch.json'
+# 预取结果的有效期（秒），超过后更新时重新联网拉取
+PREFETCH_MAX_AGE = 6 * 3600
+# 更新性能报告目录，每次更新生成一份JSON报告
+UPDATE_REPORT_DIR = Path(__file__).parent.absolute() / 'runtime' / 'update_reports'
+# 更新性能报告保留的历史数量
+UPDATE_REPORT_HISTORY_LIMIT = 50
+# 仓库锁文件（位于.git目录中），更新、维护和后台预取执行git操作前获取，防止同时修改同一仓库
+REPO_LOCK_NAME = 'onekey-update.lock'
+# 前台操作等待其他操作释放仓库锁的最长时间（秒）
+REPO_LOCK_WAIT = 300
+# 超过此时间（秒）的仓库锁视为进程异常退出遗留，可直接清除
+REPO_LOCK_STALE = 3600
+
+def get_python_command():
+    """运行麦麦的Python解释器：一键包内置的Python，不存在时（如开发环境）使用当前解释器
+
+    安装、记录、恢复和检查依赖都必须针对同一个解释器，否则回滚会恢复错误的环境
+    """
+    return str(BUNDLED_PYTHON) if BUNDLED_PYTHON.exists() else sys.executable
+
 def get_git_command():
     """获取可用的git命令路径"""
     # 获取脚本所在目录（项目根目录）
@@ -52,18 +146,345 @@ def get_git_command():
 
 # 全局变量存储git命令
 GIT_COMMAND = None
+# 当前更新的性能报告，由 start_update_report 创建，未创建时不记录
+CURRENT_REPORT = None
+
+def start_update_report(mode, only_onekey=False):
+    """开始记录本次更新的性能报告
+    
+    Args:
+        mode: 更新方式，'online' 为联网更新，'bundle' 为使用离线更新包
+        only_onekey: 是否仅更新一键包仓库
+    """
+    global CURRENT_REPORT
+    CURRENT_REPORT = {
+        'started_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'mode': mode,
+        'only_onekey': only_onekey,
+        'exit_code': None,
+        # 总耗时和各项耗时均不包括等待用户确认的时间（input_wait）
+        'duration': None,
+        'input_wait': 0.0,
+        'noop': None,
+        'bytes_fetched': 0,
+        'stages': {},
+        'repositories': [],
+        'mirror_probes': [],
+        'mirror_attempts': [],
+        'pip': [],
+        'packages_changed': [],
+    }
+    CURRENT_REPORT['_start'] = time.perf_counter()
+
+def record_report(section, entry):
+    """向当前性能报告的指定列表追加一条记录"""
+    if CURRENT_REPORT is not None:
+        CURRENT_REPORT[section].append(entry)
+
+def get_input_wait():
+    """本次更新中累计等待用户输入的时间（秒）"""
+    return CURRENT_REPORT['input_wait'] if CURRENT_REPORT is not None else 0.0
+
+def prompt_input(prompt):
+    """读取用户输入，等待的时间记入报告的 input_wait，不计入各项耗时"""
+    start = time.perf_counter()
+    try:
+        return input(prompt)
+    finally:
+        if CURRENT_REPORT is not None:
+            CURRENT_REPORT['input_wait'] += time.perf_counter() - start
+
+def elapsed_since(start, input_wait_before):
+    """从 start（time.perf_counter() 的值）到现在的耗时，扣除期间等待用户输入的时间"""
+    return round(time.perf_counter() - start - (get_input_wait() - input_wait_before), 3)
+
+def record_report_stage(stage, start, input_wait_before=None):
+    """记录一个更新阶段的耗时（start为 time.perf_counter() 的起始值，可扣除期间等待用户输入的时间）"""
+    if CURRENT_REPORT is not None:
+        waited_before = get_input_wait() if input_wait_before is None else input_wait_before
+        CURRENT_REPORT['stages'][stage] = elapsed_since(start, waited_before)
+
+def finish_update_report(exit_code):
+    """结束本次更新的性能报告，写入 runtime/update_reports 并清理过旧的历史报告
+    
+    Returns:
+        Path: 报告文件路径，未记录报告或写入失败时返回None
+    """
+    global CURRENT_REPORT
+    report, CURRENT_REPORT = CURRENT_REPORT, None
+    if report is None:
+        return None
+    
+    report['exit_code'] = exit_code
+    report['input_wait'] = round(report['input_wait'], 3)
+    report['duration'] = round(time.perf_counter() - report.pop('_start') - report['input_wait'], 3)
+    report['bytes_fetched'] = sum(attempt.get('bytes_fetched', 0) for attempt in report['mirror_attempts'])
+    
+    try:
+        UPDATE_REPORT_DIR.mkdir(parents=True, exist_ok=True)
+        # 同一秒内的多次更新以毫秒和进程ID区分，不会互相覆盖
+        now = time.time()
+        report_path = UPDATE_REPORT_DIR / (f"update_{time.strftime('%Y%m%d_%H%M%S', time.localtime(now))}"
+                                           f"_{int(now * 1000) % 1000:03d}_{os.getpid()}.json")
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        
+        # 文件名包含时间戳，按名称排序即为时间顺序
+        history = sorted(UPDATE_REPORT_DIR.glob('update_*.json'))
+        for old_report in history[:-UPDATE_REPORT_HISTORY_LIMIT]:
+            old_report.unlink()
+    except OSError as e:
+        print(f"⚠️  写入更新性能报告失败: {e}")
+        return None
+    
+    print(f"📊 更新性能报告: {report_path}")
+    return report_path
+
+# 硬编码的远程仓库URL（支持多个备用仓库）
+REMOTE_URLS = {
+    'onekey': [
+        'https://gh.llkk.cc/https://github.com/DrSmoothl/MaiBotOneKey.git',
+        'https://github.moeyy.xyz/https://github.com/DrSmoothl/MaiBotOneKey.git',
+        'https://gitproxy.click/https://github.com/DrSmoothl/MaiBotOneKey.git',
+        'https://gitproxy.net/https://github.com/DrSmoothl/MaiBotOneKey.git',
+        'https://github.com/DrSmoothl/MaiBotOneKey.git'
+    ],
+    'maibot': [
+        'https://gh.llkk.cc/https://github.com/MaiM-with-u/MaiBot.git',
+        'https://github.moeyy.xyz/https://github.com/MaiM-with-u/MaiBot.git',
+        'https://gitproxy.click/https://github.com/MaiM-with-u/MaiBot.git',
+        'https://gitproxy.net/https://github.com/MaiM-with-u/MaiBot.git',
+        'https://github.com/MaiM-with-u/MaiBot.git',
+    ],
+    'adapter': [
+        'https://gh.llkk.cc/https://github.com/MaiM-with-u/MaiBot-Napcat-Adapter.git',
+        'https://github.moeyy.xyz/https://github.com/MaiM-with-u/MaiBot-Napcat-Adapter.git',
+        'https://gitproxy.click/https://github.com/MaiM-with-u/MaiBot-Napcat-Adapter.git',
+        'https://gitproxy.net/https://github.com/MaiM-with-u/MaiBot-Napcat-Adapter.git',
+        'https://github.com/MaiM-with-u/MaiBot-Napcat-Adapter.git'
+    ]
+}
+
+def get_repositories(only_onekey=False):
+    """获取需要管理的仓库列表
+    
+    Args:
+        only_onekey: 是否仅包含一键包仓库
+        
+    Returns:
+        list: 仓库信息列表，每项包含 name/key/path/remote_urls/force_reset/entry/templates
+    """
+    # 获取脚本所在目录（项目根目录）
+    script_dir = Path(__file__).parent.absolute()
+    
+    repositories = [
+        {
+            'name': '一键包主仓库',
+            'key': 'onekey',
+            'path': script_dir,
+            'remote_urls': REMOTE_URLS['onekey'],
+            'force_reset': True,
+            'entry': 'start.py',
+            'templates': []
+        },
+        {
+            'name': 'MaiBot主仓库',
+            'key': 'maibot',
+            'path': script_dir / 'modules' / 'MaiBot',
+            'remote_urls': REMOTE_URLS['maibot'],
+            'force_reset': True,
+            'entry': 'bot.py',
+            'templates': [
+                'template/bot_config_template.toml',
+                'template/lpmm_config_template.toml',
+                'template/template.env'
+            ]
+        },
+        {
+            'name': 'MaiBot-Napcat-Adapter适配器仓库',
+            'key': 'adapter',
+            'path': script_dir / 'modules' / 'MaiBot-Napcat-Adapter',
+            'remote_urls': REMOTE_URLS['adapter'],
+            'force_reset': True,
+            'entry': 'main.py',
+            'templates': ['template.toml']
+        }
+    ]
+    
+    if only_onekey:
+        return repositories[:1]
+    return repositories
+
+
+def _build_command_env():
+    """构建子进程环境变量，确保正确的编码"""
+    env = os.environ.copy()
+    env['PYTHONIOENCODING'] = 'utf-8'
+    env['LANG'] = 'zh_CN.UTF-8'
+    return env
+
+def _kill_process_tree(process):
+    """终止进程及其子进程（shell=True时实际命令运行在子进程中）"""
+    if process.returncode is not None:
+        return
+    try:
+        if os.name == 'nt':
+            subprocess.run(f'taskkill /F /T /PID {process.pid}', shell=True, capture_output=True)
+        else:
+            os.killpg(process.pid, 9)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+async def _run_streaming_command(spec, env):
+    """异步执行单条命令，逐行输出带前缀的结果，支持超时和取消"""
+    name = spec['name']
+    timeout = spec.get('timeout')
+    result = {
+        'name': name,
+        'command': spec['command'],
+        'returncode': None,
+        'timed_out': False,
+        'cancelled': False,
+        'error': None,
+        'duration': 0.0,
+        'output': [],
+    }
+    start_time = time.monotonic()
+    process = None
+    
+    async def pump_output():
+        while True:
+            line = await process.stdout.readline()
+            if not line:
+                break
+            text = line.decode('utf-8', errors='ignore').rstrip('\r\n')
+            result['output'].append(text)
+            if spec.get('echo', True):
+                print(f"[{name}] {text}")
+        await process.wait()
+    
+    try:
+        # 非Windows下放入独立进程组，超时/取消时可以整组终止
+        extra_kwargs = {} if os.name == 'nt' else {'start_new_session': True}
+        process = await asyncio.create_subprocess_shell(
+            spec['command'],
+            cwd=spec.get('cwd'),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env=env,
+            **extra_kwargs
+        )
+        await asyncio.wait_for(pump_output(), timeout=timeout)
+        result['returncode'] = process.returncode
+    except asyncio.TimeoutError:
+        result['timed_out'] = True
+        print(f"[{name}] ⏱️ 超过 {timeout} 秒未完成，已终止")
+    except asyncio.CancelledError:
+        result['cancelled'] = True
+        raise
+    except Exception as e:
+        result['error'] = str(e)
+        print(f"[{name}] ❌ 执行命令时发生异常: {e}")
+    finally:
+        # 超时、取消或读取输出出错（如单行超长）时子进程可能仍在运行，终止并回收
+        if process is not None and process.returncode is None:
+            _kill_process_tree(process)
+            try:
+                await asyncio.wait_for(process.wait(), timeout=PROCESS_EXIT_TIMEOUT)
+            except (asyncio.TimeoutError, ProcessLookupError):
+                pass
+        result['duration'] = time.monotonic() - start_time
+    
+    return result
 
-def run_command(command, cwd=None, description="", realtime_output=False):
-    """执行命令"""
+def run_commands_concurrently(commands, timeout=None):
+    """并发执行多条命令，实时输出带命令名前缀的结果
+    
+    Args:
+        commands: 命令列表，每项为 {'name', 'command', 'cwd', 'timeout', 'echo'}，
+                  其中 cwd/timeout/echo 可省略
+        timeout: 未单独指定超时时间的命令使用的默认超时（秒），None表示不限制
+        
+    Returns:
+        list: 每条命令的执行结果字典，顺序与commands一致
+        
+    按下Ctrl+C时会终止所有仍在运行的命令，然后重新抛出KeyboardInterrupt
+    """
+    env = _build_command_env()
+    
+    async def run_all():
+        return await asyncio.gather(*(
+            _run_streaming_command({'timeout': timeout, **spec}, env) for spec in commands
+        ))
+    
+    try:
+        return asyncio.run(run_all())
+    except KeyboardInterrupt:
+        print("\n⚠️  已取消并终止所有正在执行的命令")
+        raise
+
+def command_succeeded(result):
+    """判断单条命令的执行结果是否成功"""
+    return result['returncode'] == 0 and not result['timed_out'] and result['error'] is None
+
+def summarize_command_results(results):
+    """汇总并输出并发命令的执行结果
+    
+    Returns:
+        bool: 所有命令是否都执行成功
+    """
+    for result in results:
+        if command_succeeded(result):
+            status = "✅ 成功"
+        elif result['timed_out']:
+            status = "⏱️ 超时"
+        elif result['error'] is not None:
+            status = f"❌ 异常: {result['error']}"
+        else:
+            status = f"❌ 失败，返回码: {result['returncode']}"
+        print(f"  [{result['name']}] {status} ({result['duration']:.1f}s)")
+    
+    success_count = sum(1 for result in results if command_succeeded(result))
+    print(f"命令执行结果: {success_count}/{len(results)} 成功")
+    return success_count == len(results)
+
+def run_command(command, cwd=None, description="", realtime_output=False, timeout=None):
+    """执行命令
+    
+    Args:
+        timeout: 超时时间（秒），超时后终止整个进程树；None表示不限制
+    """
     try:
         if description:
             print(f"正在执行: {description}")
         print(f"命令: {command} (目录: {cwd if cwd else '当前目录'})")
         
         # 设置环境变量以确保正确的编码
-        env = os.environ.copy()
-        env['PYTHONIOENCODING'] = 'utf-8'
-        env['LANG'] = 'zh_CN.UTF-8'
+        env = _build_command_env()
+        
+        if timeout is not None:
+            # 带超时的模式，使用异步执行器以便超时时终止整个进程树
+            result = run_commands_concurrently([{
+                'name': description or 'cmd',
+                'command': command,
+                'cwd': cwd,
+                'timeout': timeout,
+                'echo': realtime_output,
+            }])[0]
+            if command_succeeded(result):
+                output = '\n'.join(result['output']).strip()
+                if not realtime_output and output:
+                    print(f"✅ 成功: {output}")
+                else:
+                    print("✅ 执行完成" if realtime_output else "✅ 成功")
+                return True
+            if result['timed_out']:
+                print(f"❌ 执行超时（{timeout}秒）")
+            elif not realtime_output and result['output']:
+                print(f"❌ 错误: {chr(10).join(result['output']).strip()}")
+            else:
+                print(f"❌ 执行失败，返回码: {result['returncode']}")
+            return False
         
         if realtime_output:
             # 实时输出模式
@@ -124,6 +545,8 @@ def run_command(command, cwd=None, description="", realtime_output=False):
                 error_msg = result.stderr.strip() if result.stderr else "未知错误"
                 print(f"❌ 错误: {error_msg}")
                 return False
+    except KeyboardInterrupt:
+        raise
     except Exception as e:
         print(f"❌ 执行命令时发生异常: {e}")
         return False
@@ -158,11 +581,143 @@ def run_git_command(repo_path, command):
         # 先设置Git配置
         for config_cmd in git_config_commands:
             run_command(config_cmd, repo_path)
+        
+        # 网络操作设置超时，避免镜像卡死导致更新无限等待
+        return run_command(git_command, repo_path, timeout=GIT_NETWORK_TIMEOUT)
     
     return run_command(git_command, repo_path)
 
-def install_requirements(repo_path, repo_name):
-    """安装requirements.txt中的依赖"""
+def rank_remote_urls(repo_path, remote_urls):
+    """并发探测所有备用远程仓库，将可访问的仓库排在前面
+    
+    不可访问的仓库仍保留在列表末尾作为最后的尝试。
+    
+    Returns:
+        list: 重新排序后的远程仓库URL列表
+    """
+    if GIT_COMMAND is None or len(remote_urls) <= 1:
+        return list(remote_urls)
+    
+    print(f"正在并发探测 {len(remote_urls)} 个远程仓库的可用性...")
+    probes = [
+        {
+            'name': f"镜像{i+1}",
+            'command': f'"{GIT_COMMAND}" -c http.sslverify=false ls-remote --heads {remote_url}',
+            'cwd': repo_path,
+            'timeout': MIRROR_PROBE_TIMEOUT,
+            'echo': False,
+        }
+        for i, remote_url in enumerate(remote_urls)
+    ]
+    results = run_commands_concurrently(probes)
+    summarize_command_results(results)
+    for remote_url, result in zip(remote_urls, results):
+        record_report('mirror_probes', {
+            'repository': os.path.basename(os.path.abspath(repo_path)),
+            'url': remote_url,
+            'success': command_succeeded(result),
+            'timed_out': result['timed_out'],
+            'duration': round(result['duration'], 3),
+        })
+    
+    reachable = [url for url, result in zip(remote_urls, results) if command_succeeded(result)]
+    unreachable = [url for url, result in zip(remote_urls, results) if not command_succeeded(result)]
+    return reachable + unreachable
+
+def wheelhouse_has_wheels():
+    """检查本地wheelhouse中是否已有缓存的依赖包"""
+    if not WHEELHOUSE_DIR.exists():
+        return False
+    return any(WHEELHOUSE_DIR.glob('*.whl')) or any(WHEELHOUSE_DIR.glob('*.tar.gz'))
+
+def build_offline_install_command(python_cmd, target_args):
+    """构建仅使用本地wheelhouse的pip安装命令
+    
+    Args:
+        python_cmd: Python解释器路径
+        target_args: 安装目标参数，如 '-r requirements.txt' 或模块名称
+    """
+    return (f'"{python_cmd}" -m pip install --no-index --find-links "{WHEELHOUSE_DIR}" '
+            f'{target_args} {PIP_COMMON_ARGS}')
+
+def build_fill_wheelhouse_command(python_cmd, target_args, wheel_dir=None):
+    """构建从镜像源下载依赖并存入wheelhouse的pip命令
+    
+    Args:
+        wheel_dir: wheel的保存目录，默认为本地wheelhouse（本地wheelhouse始终作为缓存来源）
+    """
+    wheel_dir = wheel_dir or WHEELHOUSE_DIR
+    return (f'"{python_cmd}" -m pip wheel -w "{wheel_dir}" --find-links "{WHEELHOUSE_DIR}" '
+            f'{PIP_INDEX_ARGS} {target_args} {PIP_COMMON_ARGS}')
+
+def build_wheelhouse_install_command(python_cmd, target_args):
+    """构建优先离线安装、缺包时再联网填充wheelhouse的组合命令（用于新开的命令行窗口）"""
+    offline_cmd = build_offline_install_command(python_cmd, target_args)
+    fill_cmd = build_fill_wheelhouse_command(python_cmd, target_args)
+    return f'{offline_cmd} || ({fill_cmd} && {offline_cmd})'
+
+def fill_wheelhouse(repo_path, repo_name, target_args='-r requirements.txt'):
+    """从镜像源下载依赖包到本地wheelhouse"""
+    WHEELHOUSE_DIR.mkdir(parents=True, exist_ok=True)
+    fill_cmd = build_fill_wheelhouse_command(get_python_command(), target_args)
+    return run_command(fill_cmd, repo_path, f"下载 {repo_name} 依赖到本地wheelhouse", realtime_output=True)
+
+def export_wheelhouse(archive_path):
+    """将本地wheelhouse导出为zip压缩包，供其他机器离线安装使用"""
+    if not wheelhouse_has_wheels():
+        print(f"❌ 本地wheelhouse为空，无法导出: {WHEELHOUSE_DIR}")
+        return False
+    
+    archive_path = Path(archive_path)
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    # wheel本身已是压缩格式，直接存储即可
+    with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for package_file in sorted(WHEELHOUSE_DIR.iterdir()):
+            if package_file.is_file():
+                archive.write(package_file, package_file.name)
+                count += 1
+    print(f"✅ 已导出 {count} 个依赖包到: {archive_path}")
+    return True
+
+def import_wheelhouse(archive_path):
+    """从zip压缩包导入依赖包到本地wheelhouse，已存在的文件会被跳过"""
+    archive_path = Path(archive_path)
+    if not archive_path.exists():
+        print(f"❌ 找不到wheelhouse压缩包: {archive_path}")
+        return False
+    
+    WHEELHOUSE_DIR.mkdir(parents=True, exist_ok=True)
+    imported_count = 0
+    skipped_count = 0
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                # 只取文件名，防止压缩包中的路径跳出wheelhouse目录
+                name = os.path.basename(member.filename)
+                if member.is_dir() or not name.endswith(('.whl', '.tar.gz', '.zip')):
+                    continue
+                target = WHEELHOUSE_DIR / name
+                if target.exists():
+                    skipped_count += 1
+                    continue
+                with archive.open(member) as src, open(target, 'wb') as dst:
+                    while chunk := src.read(1024 * 1024):
+                        dst.write(chunk)
+                imported_count += 1
+    except zipfile.BadZipFile as e:
+        print(f"❌ wheelhouse压缩包已损坏: {e}")
+        return False
+    
+    print(f"✅ 已导入 {imported_count} 个依赖包，跳过已存在的 {skipped_count} 个")
+    return True
+
+def install_requirements(repo_path, repo_name, offline=False):
+    """安装requirements.txt中的依赖
+    
+    优先使用本地wheelhouse离线安装；缺少依赖时从镜像源下载到wheelhouse后再安装。
+    offline为True时不访问镜像源。
+    """
     requirements_file = os.path.join(repo_path, 'requirements.txt')
     
     if not os.path.exists(requirements_file):
@@ -173,11 +728,37 @@ def install_requirements(repo_path, repo_name):
     print(f"正在安装 {repo_name} 的依赖")
     print(f"{'='*40}")
     
-    # 获取Python可执行文件路径
-    python_cmd = sys.executable
-    # 安装依赖（使用阿里云镜像源，禁用进度条避免编码问题）
-    install_cmd = f'"{python_cmd}" -m pip install -r requirements.txt -i https://mirrors.aliyun.com/pypi/simple/ --trusted-host mirrors.aliyun.com --upgrade --no-color --disable-pip-version-check --progress-bar off'
-    success = run_command(install_cmd, repo_path, f"安装 {repo_name} 依赖", realtime_output=True)
+    # 获取Python可执行文件路径（运行麦麦的解释器）
+    python_cmd = get_python_command()
+    offline_cmd = build_offline_install_command(python_cmd, '-r requirements.txt --upgrade')
+    
+    def timed_step(stage, step):
+        # 记录pip各阶段（离线安装、解析下载、安装）的耗时
+        start = time.perf_counter()
+        step_success = step()
+        record_report('pip', {
+            'repository': repo_name,
+            'stage': stage,
+            'success': step_success,
+            'duration': round(time.perf_counter() - start, 3),
+        })
+        return step_success
+    
+    success = False
+    if wheelhouse_has_wheels():
+        print(f"📦 使用本地wheelhouse离线安装: {WHEELHOUSE_DIR}")
+        success = timed_step('offline_install', lambda: run_command(
+            offline_cmd, repo_path, f"离线安装 {repo_name} 依赖", realtime_output=True))
+    
+    if not success:
+        if offline:
+            print(f"❌ 离线模式下本地wheelhouse缺少 {repo_name} 所需的依赖包")
+        else:
+            # 本地缓存不完整，从阿里云镜像源补齐后再离线安装
+            print("🌐 本地wheelhouse缺少依赖，正在从镜像源下载...")
+            if timed_step('resolve_download', lambda: fill_wheelhouse(repo_path, repo_name)):
+                success = timed_step('install', lambda: run_command(
+                    offline_cmd, repo_path, f"安装 {repo_name} 依赖", realtime_output=True))
     
     if success:
         print(f"✅ {repo_name} 依赖安装完成")
@@ -186,8 +767,11 @@ def install_requirements(repo_path, repo_name):
     
     return success
 
-def update_repository(repo_path, repo_name, remote_urls=None, force_reset=False):
-    """更新单个仓库，支持多个备用远程仓库，支持强制覆盖本地更改"""
+def update_repository(repo_path, repo_name, remote_urls=None, force_reset=False, prefetched_head=None):
+    """更新单个仓库，支持多个备用远程仓库，支持强制覆盖本地更改
+    
+    prefetched_head为后台已预取的上游提交，可用时直接在本地更新，无需访问网络。
+    """
     print(f"\n{'='*50}")
     print(f"正在更新 {repo_name}")
     print(f"路径: {repo_path}")
@@ -205,7 +789,7 @@ def update_repository(repo_path, repo_name, remote_urls=None, force_reset=False)
     if force_reset:
         print("⚠️  一键包将强制覆盖所有本地更改（包括未提交和已暂存的修改，配置文件和数据文件夹不在这个范围），此操作不可逆！")
         print("⚠️  如果你是第一次启动,请忽略此提示。")
-        confirm = input("是否继续？输入 y 确认，其他键取消: ").strip().lower()
+        confirm = prompt_input("是否继续？输入 y 确认，其他键取消: ").strip().lower()
         if confirm != 'y':
             print("用户取消强制更新操作。")
             return False
@@ -218,6 +802,27 @@ def update_repository(repo_path, repo_name, remote_urls=None, force_reset=False)
             return False
         # 跳过 fetch --all，因为后面会设置新的远程仓库并拉取
 
+    # 后台已预取上游提交时只需在本地重置/快进，失败再联网拉取
+    if prefetched_head and get_git_output(repo_path, f'rev-parse {UPSTREAM_REF}') == prefetched_head:
+        print(f"📥 使用后台预取的上游版本: {prefetched_head[:10]}")
+        attempt_start = time.perf_counter()
+        if force_reset:
+            local_success = run_git_command(repo_path, f'git reset --hard {prefetched_head}')
+        else:
+            local_success = run_git_command(repo_path, f'git merge --ff-only {prefetched_head}')
+        record_report('mirror_attempts', {
+            'repository': repo_name,
+            'url': UPSTREAM_REF,
+            'success': local_success,
+            'failed_stage': None if local_success else 'prefetched',
+            'duration': round(time.perf_counter() - attempt_start, 3),
+            'bytes_fetched': 0,
+        })
+        if local_success:
+            print(f"✅ {repo_name} 更新完成")
+            return True
+        print("⚠️  使用预取版本更新失败，改为联网拉取")
+
     # 如果提供了远程URL列表，尝试每个URL直到成功
     pull_success = False
     if remote_urls:
@@ -225,8 +830,15 @@ def update_repository(repo_path, repo_name, remote_urls=None, force_reset=False)
         if isinstance(remote_urls, str):
             remote_urls = [remote_urls]
         
+        # 先并发探测，优先尝试可访问的仓库，避免在卡死的镜像上等待
+        remote_urls = rank_remote_urls(repo_path, remote_urls)
+        
+        objects_dir = os.path.join(repo_path, '.git', 'objects')
         for i, remote_url in enumerate(remote_urls):
             print(f"尝试远程仓库 {i+1}/{len(remote_urls)}: {remote_url}")
+            attempt_start = time.perf_counter()
+            objects_size_before = _get_directory_size(objects_dir)
+            failed_stage = 'set-url'
             
             # 设置远程仓库
             if run_git_command(repo_path, f"git remote set-url origin {remote_url}"):
@@ -237,29 +849,42 @@ def update_repository(repo_path, repo_name, remote_urls=None, force_reset=False)
                 if force_reset:
                     # 强制拉取远程最新代码并覆盖本地
                     # 先fetch获取最新的远程引用
+                    failed_stage = 'fetch'
                     if run_git_command(repo_path, 'git fetch origin'):
                         print("✅ 成功获取远程更新")
                         # 然后强制重置到远程分支
+                        failed_stage = 'reset'
                         if (run_git_command(repo_path, 'git reset --hard origin/main') or 
                             run_git_command(repo_path, 'git reset --hard origin/master') or
                             run_git_command(repo_path, 'git pull --rebase') or 
                             run_git_command(repo_path, 'git pull')):
                             print(f"✅ {repo_name} 强制更新完成")
                             pull_success = True
-                            break
                         else:
                             print("❌ 强制重置失败，尝试下一个仓库")
                     else:
                         print("❌ 获取远程更新失败，尝试下一个仓库")
                 else:
+                    failed_stage = 'pull'
                     if run_git_command(repo_path, "git pull"):
                         print(f"✅ {repo_name} 更新完成")
                         pull_success = True
-                        break
                     else:
                         print(f"❌ 从 {remote_url} 拉取失败，尝试下一个仓库")            
             else:
                 print(f"❌ 设置远程仓库失败: {remote_url}")
+            
+            record_report('mirror_attempts', {
+                'repository': repo_name,
+                'url': remote_url,
+                'success': pull_success,
+                'failed_stage': None if pull_success else failed_stage,
+                'duration': round(time.perf_counter() - attempt_start, 3),
+                # 以对象目录大小的增量估算本次拉取的下载量
+                'bytes_fetched': max(_get_directory_size(objects_dir) - objects_size_before, 0),
+            })
+            if pull_success:
+                break
         
         if not pull_success:
             print(f"❌ 所有远程仓库都无法访问，{repo_name} 更新失败")
@@ -300,10 +925,930 @@ def update_repository(repo_path, repo_name, remote_urls=None, force_reset=False)
     
     return pull_success
 
+def ensure_git_command():
+    """确保已检测到可用的git命令
+    
+    Returns:
+        bool: 是否有可用的git命令
+    """
+    global GIT_COMMAND
+    if GIT_COMMAND is None:
+        GIT_COMMAND = get_git_command()
+    return GIT_COMMAND is not None
+
+def get_git_output(repo_path, command):
+    """执行git命令并返回标准输出，失败时返回None
+    
+    Args:
+        repo_path: 仓库路径
+        command: git子命令及参数，如 'rev-parse HEAD'
+    """
+    if not ensure_git_command():
+        return None
+    try:
+        result = subprocess.run(
+            f'"{GIT_COMMAND}" {command}',
+            cwd=repo_path,
+            shell=True,
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            errors='ignore',
+            timeout=60
+        )
+    except (subprocess.TimeoutExpired, OSError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip()
+
+def _try_create_repo_lock(lock_path, owner):
+    """尝试创建锁文件，已被占用时返回False；遗留的过期锁会被清除"""
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(lock_path) > REPO_LOCK_STALE:
+                os.remove(lock_path)
+        except OSError:
+            pass
+        return False
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'owner': owner, 'pid': os.getpid(), 'time': time.strftime('%Y-%m-%d %H:%M:%S')}, f)
+    return True
+
+@contextmanager
+def repo_lock(repo_path, owner, wait=REPO_LOCK_WAIT):
+    """获取仓库锁，在 with 块结束时释放
+    
+    Args:
+        repo_path: 仓库路径，不是git仓库时不加锁
+        owner: 持有者说明，写入锁文件便于排查
+        wait: 等待锁释放的最长时间（秒），0表示不等待
+    
+    Yields:
+        bool: 是否获取到锁
+    """
+    git_dir = os.path.join(str(repo_path), '.git')
+    if not os.path.isdir(git_dir):
+        yield True
+        return
+    lock_path = os.path.join(git_dir, REPO_LOCK_NAME)
+    deadline = time.monotonic() + wait
+    acquired = _try_create_repo_lock(lock_path, owner)
+    if not acquired and wait > 0:
+        print(f"⏳ 仓库正被其他操作（如后台预取）使用，等待其完成: {repo_path}")
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.5)
+            acquired = _try_create_repo_lock(lock_path, owner)
+        if not acquired:
+            print(f"❌ 等待仓库锁超时。如确认没有其他更新或维护在运行，可删除 {lock_path} 后重试")
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+def snapshot_installed_packages(python_cmd=None):
+    """获取当前已安装的依赖包版本
+    
+    Returns:
+        dict: {小写包名: 版本号}，获取失败时返回None
+    """
+    python_cmd = python_cmd or get_python_command()
+    try:
+        result = subprocess.run(
+            [python_cmd, '-m', 'pip', 'list', '--format=json', '--disable-pip-version-check'],
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            errors='ignore',
+            timeout=120
+        )
+        if result.returncode != 0:
+            return None
+        return {package['name'].lower(): package['version'] for package in json.loads(result.stdout)}
+    except (subprocess.TimeoutExpired, OSError, ValueError):
+        return None
+
+def save_update_transaction(transaction):
+    """保存更新事务记录"""
+    UPDATE_TRANSACTION_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(UPDATE_TRANSACTION_PATH, 'w', encoding='utf-8') as f:
+        json.dump(transaction, f, indent=2, ensure_ascii=False)
+
+def load_update_transaction():
+    """读取上一次的更新事务记录，不存在时返回None"""
+    if not UPDATE_TRANSACTION_PATH.exists():
+        return None
+    try:
+        with open(UPDATE_TRANSACTION_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"❌ 读取更新事务记录失败: {e}")
+        return None
+
+def begin_update_transaction(repositories):
+    """开始更新事务：记录所有仓库更新前的提交和已安装依赖的版本"""
+    print("正在记录更新前的状态（仓库提交与依赖版本）...")
+    transaction = {
+        'started_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'status': 'in_progress',
+        'repositories': [],
+        'packages': snapshot_installed_packages() or {},
+        'dependencies_consistent': check_dependency_consistency(),
+        'configs': snapshot_merge_outputs()
+    }
+    for repo in repositories:
+        head = get_git_output(str(repo['path']), 'rev-parse HEAD')
+        if head:
+            get_git_output(str(repo['path']), f'update-ref {PRE_UPDATE_REF} {head}')
+        transaction['repositories'].append({
+            'name': repo['name'],
+            'path': str(repo['path']),
+            'head': head
+        })
+        print(f"  {repo['name']}: {head[:10] if head else '(无法获取)'}")
+    print(f"  已安装依赖包: {len(transaction['packages'])} 个")
+    print(f"  配置文件: {sum(1 for text in transaction['configs'].values() if text is not None)} 个")
+    save_update_transaction(transaction)
+    return transaction
+
+def check_dependency_consistency(python_cmd=None):
+    """使用 pip check 检查已安装依赖是否一致"""
+    python_cmd = python_cmd or get_python_command()
+    try:
+        result = subprocess.run(
+            [python_cmd, '-m', 'pip', 'check', '--disable-pip-version-check'],
+            capture_output=True,
+            timeout=SMOKE_CHECK_TIMEOUT
+        )
+        return result.returncode == 0
+    except (subprocess.TimeoutExpired, OSError):
+        return False
+
+def snapshot_merge_outputs():
+    """记录配置模板合并可能改写的文件内容，不存在的文件记为None"""
+    try:
+        from config_merge import merge_output_paths
+    except ImportError:
+        return {}
+    snapshot = {}
+    for path in merge_output_paths():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot[path] = f.read()
+        except OSError:
+            snapshot[path] = None
+    return snapshot
+
+def restore_merge_outputs(snapshot):
+    """将配置模板合并改写的文件恢复为更新前的内容
+    
+    Returns:
+        bool: 是否全部恢复成功
+    """
+    from config_store import atomic_write_text, config_store
+    
+    all_success = True
+    restored = 0
+    for path, text in snapshot.items():
+        try:
+            if text is None:
+                if not os.path.exists(path):
+                    continue
+                os.remove(path)
+            else:
+                with open(path, 'r', encoding='utf-8') as f:
+                    if f.read() == text:
+                        continue
+                atomic_write_text(path, text)
+        except FileNotFoundError:
+            atomic_write_text(path, text)
+        except OSError as e:
+            print(f"❌ 恢复 {path} 失败: {e}")
+            all_success = False
+            continue
+        config_store.invalidate(path)
+        restored += 1
+    if restored:
+        print(f"✅ 已恢复 {restored} 个被配置模板合并改写的文件")
+    return all_success
+
+def run_smoke_check(repositories, check_dependencies=True):
+    """更新后的冒烟检查：并发在子进程中检查各仓库的入口模块，并检查依赖是否一致
+    
+    入口模块只编译、不执行，再查找其顶层导入的模块是否存在；
+    语法错误、缺少依赖或依赖版本不兼容（pip check）都会导致检查失败。
+    
+    Args:
+        repositories: 仓库信息列表
+        check_dependencies: 是否执行 pip check（更新前就不一致的环境应跳过，避免误判）
+    
+    Returns:
+        bool: 冒烟检查是否通过
+    """
+    # 麦麦由内置Python运行，入口检查也必须使用同一个解释器和它的依赖
+    python_cmd = get_python_command()
+    checks = []
+    if check_dependencies:
+        checks.append({
+            'name': 'pip依赖一致性',
+            'command': f'"{python_cmd}" -m pip check --disable-pip-version-check',
+        })
+    for repo in repositories:
+        entry = repo.get('entry')
+        if entry and os.path.exists(os.path.join(str(repo['path']), entry)):
+            checks.append({
+                'name': f"{repo['name']}入口检查",
+                'command': f'"{python_cmd}" -c "{SMOKE_PROBE_CODE}" {entry}',
+                'cwd': str(repo['path']),
+            })
+    
+    results = run_commands_concurrently(checks, timeout=SMOKE_CHECK_TIMEOUT)
+    return summarize_command_results(results)
+
+def rollback_update_transaction(transaction, offline=False):
+    """回滚更新事务：将仓库重置到更新前的提交，恢复变化过的依赖包版本和被配置模板合并改写的文件
+    
+    Returns:
+        bool: 回滚是否全部成功
+    """
+    print(f"\n{'='*60}")
+    print(f"正在回滚到更新前的状态（{transaction.get('started_at', '未知时间')}）")
+    print(f"{'='*60}")
+    
+    all_success = True
+    for repo in transaction.get('repositories', []):
+        head = repo.get('head')
+        if not head:
+            print(f"⚠️  {repo['name']} 没有记录更新前的提交，跳过")
+            continue
+        if get_git_output(repo['path'], 'rev-parse HEAD') == head:
+            print(f"✅ {repo['name']} 已是更新前的版本 {head[:10]}")
+            continue
+        with repo_lock(repo['path'], 'rollback') as acquired:
+            success = acquired and run_git_command(repo['path'], f'git reset --hard {head}')
+        if success:
+            print(f"✅ {repo['name']} 已回滚到 {head[:10]}")
+        else:
+            print(f"❌ {repo['name']} 回滚失败")
+            all_success = False
+    
+    previous_packages = transaction.get('packages', {})
+    current_packages = snapshot_installed_packages()
+    python_cmd = get_python_command()
+    if previous_packages and current_packages is not None:
+        changed = {name: version for name, version in previous_packages.items()
+                   if current_packages.get(name) != version}
+        if changed:
+            print(f"正在恢复 {len(changed)} 个依赖包的版本...")
+            specs = ' '.join(f'"{name}=={version}"' for name, version in sorted(changed.items()))
+            # 优先从本地wheelhouse恢复，缺包时再访问镜像源
+            success = run_command(
+                build_offline_install_command(python_cmd, f'--no-deps {specs}'),
+                description="从本地wheelhouse恢复依赖版本",
+                realtime_output=True
+            )
+            if not success and not offline:
+                success = run_command(
+                    f'"{python_cmd}" -m pip install --no-deps {PIP_INDEX_ARGS} {specs} {PIP_COMMON_ARGS}',
+                    description="从镜像源恢复依赖版本",
+                    realtime_output=True
+                )
+            if not success:
+                all_success = False
+        else:
+            print("✅ 依赖包版本与更新前一致，无需恢复")
+        
+        added = sorted(name for name in current_packages if name not in previous_packages)
+        if added:
+            print(f"📋 更新新增的依赖包已保留: {', '.join(added)}")
+    elif previous_packages:
+        print("❌ 无法获取当前已安装的依赖包，跳过依赖回滚")
+        all_success = False
+    
+    if not restore_merge_outputs(transaction.get('configs', {})):
+        all_success = False
+    
+    transaction['status'] = 'rolled_back' if all_success else 'rollback_failed'
+    save_update_transaction(transaction)
+    sync_mirrored_modules()
+    
+    if all_success:
+        print("✅ 回滚完成")
+    else:
+        print("❌ 回滚过程中出现错误，请检查上述信息")
+    return all_success
+
+def _get_directory_size(path):
+    """计算目录总大小（字节）"""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+def _time_git_status(repo_path, rounds=3):
+    """测量 git status --porcelain 的耗时（取多次中的最小值，排除冷缓存影响）"""
+    best = None
+    for _ in range(rounds):
+        start_time = time.perf_counter()
+        if get_git_output(repo_path, 'status --porcelain') is None:
+            return None
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def maintain_repository(repo):
+    """维护单个仓库：清理过期引用、gc/repack、写入commit-graph和multi-pack-index
+    
+    Returns:
+        bool: 维护是否成功
+    """
+    repo_path = str(repo['path'])
+    git_dir = os.path.join(repo_path, '.git')
+    print(f"\n{'='*50}")
+    print(f"正在维护 {repo['name']}")
+    print(f"路径: {repo_path}")
+    print(f"{'='*50}")
+    
+    if not os.path.isdir(git_dir):
+        print(f"❌ 错误: 不是git仓库: {repo_path}")
+        return False
+    
+    with repo_lock(repo_path, 'maintenance') as acquired:
+        if not acquired:
+            return False
+        return _maintain_locked_repository(repo, repo_path, git_dir)
+
+def _maintain_locked_repository(repo, repo_path, git_dir):
+    size_before = _get_directory_size(git_dir)
+    status_before = _time_git_status(repo_path)
+    
+    # 清理过期的远程引用需要访问网络，失败时不影响后续本地维护
+    if not run_git_command(repo_path, 'git remote prune origin'):
+        print("⚠️  清理过期远程引用失败（可能无法访问远程仓库），继续执行本地维护")
+    run_git_command(repo_path, 'git worktree prune')
+    
+    steps = [
+        # 保留引用日志和默认的过期时间，回滚所需的更新前提交不会被清理
+        ('git gc --quiet', "垃圾回收并重新打包"),
+        ('git commit-graph write --reachable --changed-paths', "写入commit-graph"),
+        ('git multi-pack-index write', "写入multi-pack-index"),
+        ('git config core.commitGraph true', "启用commit-graph"),
+        ('git config fetch.writeCommitGraph true', "拉取时自动更新commit-graph"),
+        ('git config core.untrackedCache true', "启用未跟踪文件缓存"),
+    ]
+    all_success = True
+    for command, description in steps:
+        print(f"🔧 {description}")
+        if not run_git_command(repo_path, command):
+            all_success = False
+    
+    size_after = _get_directory_size(git_dir)
+    status_after = _time_git_status(repo_path)
+    
+    print(f"\n📊 {repo['name']} 维护结果:")
+    print(f"   .git 大小: {size_before / 1024 / 1024:.1f} MB -> {size_after / 1024 / 1024:.1f} MB")
+    if status_before is not None and status_after is not None:
+        print(f"   git status 耗时: {status_before * 1000:.0f} ms -> {status_after * 1000:.0f} ms")
+    return all_success
+
+def maintain_repositories(repositories=None):
+    """维护所有受管理的仓库
+    
+    Returns:
+        bool: 所有仓库是否维护成功
+    """
+    if not ensure_git_command():
+        print("❌ Git环境检测失败，无法维护仓库")
+        return False
+    repositories = repositories or get_repositories()
+    success_count = sum(1 for repo in repositories if maintain_repository(repo))
+    print(f"\n仓库维护完成: {success_count}/{len(repositories)}")
+    return success_count == len(repositories)
+
+def fetch_upstream(repo_path, remote_urls):
+    """从备用远程仓库获取上游最新提交到 UPSTREAM_REF，不修改工作区、当前分支和远程配置
+    
+    Returns:
+        str: 成功获取的远程仓库URL，全部失败时返回None
+    """
+    for remote_url in rank_remote_urls(repo_path, remote_urls):
+        if run_git_command(repo_path, f'git fetch --no-tags {remote_url} +HEAD:{UPSTREAM_REF}'):
+            return remote_url
+        print(f"❌ 从 {remote_url} 获取失败，尝试下一个仓库")
+    return None
+
+def plan_repository(repo):
+    """预检单个仓库的更新内容
+    
+    Returns:
+        dict: 预检结果，获取失败时 error 字段不为None
+    """
+    repo_path = str(repo['path'])
+    plan = {
+        'name': repo['name'],
+        'key': repo['key'],
+        'path': repo_path,
+        'error': None,
+        'remote_url': None,
+        'local_head': None,
+        'upstream_head': None,
+        'incoming_commits': 0,
+        'changed_files': [],
+        'requirements_changed': False,
+        'templates_changed': [],
+        'local_modifications': 0,
+    }
+    if not os.path.exists(os.path.join(repo_path, '.git')):
+        plan['error'] = "不是git仓库"
+        return plan
+    
+    with repo_lock(repo_path, 'plan') as acquired:
+        plan['remote_url'] = fetch_upstream(repo_path, repo['remote_urls']) if acquired else None
+    if not acquired:
+        plan['error'] = "仓库正被其他操作使用"
+        return plan
+    if plan['remote_url'] is None:
+        plan['error'] = "所有远程仓库都无法访问"
+        return plan
+    
+    plan['local_head'] = get_git_output(repo_path, 'rev-parse HEAD')
+    plan['upstream_head'] = get_git_output(repo_path, f'rev-parse {UPSTREAM_REF}')
+    plan['incoming_commits'] = int(get_git_output(repo_path, f'rev-list --count HEAD..{UPSTREAM_REF}') or 0)
+    # 强制更新会把工作区重置为上游版本，因此直接比较 HEAD 与上游
+    changed = get_git_output(repo_path, f'diff --name-only HEAD {UPSTREAM_REF}') or ''
+    plan['changed_files'] = [line for line in changed.splitlines() if line]
+    plan['requirements_changed'] = 'requirements.txt' in plan['changed_files']
+    plan['templates_changed'] = [t for t in repo.get('templates', []) if t in plan['changed_files']]
+    status = get_git_output(repo_path, 'status --porcelain') or ''
+    plan['local_modifications'] = len([line for line in status.splitlines() if line])
+    return plan
+
+def print_update_plan(plans):
+    """输出更新预检报告"""
+    print(f"\n{'='*60}")
+    print("更新预检报告")
+    print(f"{'='*60}")
+    for plan in plans:
+        print(f"\n📦 {plan['name']}")
+        if plan['error']:
+            print(f"   ❌ 预检失败: {plan['error']}")
+            continue
+        print(f"   当前版本: {(plan['local_head'] or '未知')[:10]}  上游版本: {(plan['upstream_head'] or '未知')[:10]}")
+        if not plan['changed_files']:
+            print("   ✅ 已是最新版本")
+            continue
+        print(f"   待更新提交: {plan['incoming_commits']} 个")
+        print(f"   变更文件: {len(plan['changed_files'])} 个")
+        for path in plan['changed_files'][:20]:
+            print(f"     {path}")
+        if len(plan['changed_files']) > 20:
+            print(f"     ...（其余 {len(plan['changed_files']) - 20} 个）")
+        print(f"   requirements.txt: {'有变化，需要重新安装依赖' if plan['requirements_changed'] else '无变化'}")
+        if plan['templates_changed']:
+            print(f"   配置模板有变化: {', '.join(plan['templates_changed'])}")
+        if plan['local_modifications']:
+            print(f"   ⚠️  本地有 {plan['local_modifications']} 个文件被修改，更新时将被覆盖")
+    
+    outdated = [plan for plan in plans if not plan['error'] and plan['changed_files']]
+    print(f"\n{'='*60}")
+    print(f"需要更新的仓库: {len(outdated)}/{len(plans)}")
+    pip_needed = [plan['name'] for plan in outdated if plan['requirements_changed']]
+    print(f"需要重新安装依赖: {', '.join(pip_needed) if pip_needed else '无'}")
+    template_changed = [plan['name'] for plan in outdated if plan['templates_changed']]
+    print(f"配置模板有变化: {', '.join(template_changed) if template_changed else '无'}")
+    print(f"{'='*60}")
+
+def run_update_plan(repositories):
+    """执行更新预检：获取一次上游提交并生成每个仓库的变更报告，不修改工作区
+    
+    Returns:
+        int: 退出码，0表示全部已是最新，PLAN_UPDATES_AVAILABLE_EXIT_CODE表示有可用更新，1表示预检失败
+    """
+    plans = [plan_repository(repo) for repo in repositories]
+    print_update_plan(plans)
+    
+    UPDATE_PLAN_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(UPDATE_PLAN_PATH, 'w', encoding='utf-8') as f:
+        json.dump({'created_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'repositories': plans},
+                  f, indent=2, ensure_ascii=False)
+    print(f"预检报告已保存: {UPDATE_PLAN_PATH}")
+    
+    if any(plan['error'] for plan in plans):
+        return 1
+    if any(plan['changed_files'] for plan in plans):
+        return PLAN_UPDATES_AVAILABLE_EXIT_CODE
+    return 0
+
+def load_prefetch_state():
+    """读取后台预取状态
+    
+    Returns:
+        dict: {仓库key: 预取信息}，文件不存在或损坏时返回空字典
+    """
+    if not PREFETCH_STATE_PATH.exists():
+        return {}
+    try:
+        with open(PREFETCH_STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_prefetch_state(state):
+    """保存后台预取状态（先写临时文件再替换，控制台读取时不会读到写了一半的文件）"""
+    PREFETCH_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = PREFETCH_STATE_PATH.with_suffix('.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, PREFETCH_STATE_PATH)
+
+def _count_incoming_commits(repo_path):
+    """统计本地 HEAD 到已预取上游提交之间的待更新提交数（仅读取本地引用）"""
+    return int(get_git_output(repo_path, f'rev-list --count HEAD..{UPSTREAM_REF}') or 0)
+
+def prefetch_repositories(repositories=None):
+    """获取所有仓库的上游最新提交到 UPSTREAM_REF 并记录预取状态，不修改工作区
+    
+    Returns:
+        bool: 是否所有仓库都预取成功
+    """
+    repositories = repositories or get_repositories()
+    state = load_prefetch_state()
+    all_success = True
+    for repo in repositories:
+        repo_path = str(repo['path'])
+        if not os.path.exists(os.path.join(repo_path, '.git')):
+            continue
+        # 前台更新或维护正在使用该仓库时跳过，下一轮再预取
+        with repo_lock(repo_path, 'prefetch', wait=0) as acquired:
+            if not acquired:
+                continue
+            remote_url = fetch_upstream(repo_path, repo['remote_urls'])
+            if remote_url is None:
+                all_success = False
+                continue
+            upstream_head = get_git_output(repo_path, f'rev-parse {UPSTREAM_REF}')
+            incoming_commits = _count_incoming_commits(repo_path)
+        state[repo['key']] = {
+            'name': repo['name'],
+            'fetched_at': time.time(),
+            'remote_url': remote_url,
+            'upstream_head': upstream_head,
+            'incoming_commits': incoming_commits,
+        }
+    save_prefetch_state(state)
+    return all_success
+
+def refresh_prefetch_state(repositories):
+    """更新后根据本地引用重新计算待更新提交数，不访问网络"""
+    state = load_prefetch_state()
+    for repo in repositories:
+        if repo['key'] in state:
+            state[repo['key']]['incoming_commits'] = _count_incoming_commits(str(repo['path']))
+    if state:
+        save_prefetch_state(state)
+
+def get_fresh_prefetched_heads(repositories):
+    """获取有效期内的预取上游提交
+    
+    Returns:
+        dict: {仓库key: 上游提交}
+    """
+    state = load_prefetch_state()
+    now = time.time()
+    heads = {}
+    for repo in repositories:
+        entry = state.get(repo['key'])
+        if entry and entry.get('upstream_head') and now - entry.get('fetched_at', 0) < PREFETCH_MAX_AGE:
+            heads[repo['key']] = entry['upstream_head']
+    return heads
+
+def get_available_updates():
+    """根据预取状态返回有待更新提交的仓库，只读取状态文件，不访问网络也不调用git
+    
+    Returns:
+        list: [(仓库名称, 待更新提交数)]
+    """
+    return [
+        (entry.get('name', key), entry['incoming_commits'])
+        for key, entry in load_prefetch_state().items()
+        if entry.get('incoming_commits', 0) > 0
+    ]
+
+def spawn_background_prefetch():
+    """以低优先级启动后台预取进程，输出全部丢弃，不干扰控制台
+    
+    Returns:
+        subprocess.Popen: 预取进程
+    """
+    kwargs = {}
+    if os.name == 'nt':
+        kwargs['creationflags'] = subprocess.BELOW_NORMAL_PRIORITY_CLASS | subprocess.CREATE_NO_WINDOW
+    else:
+        kwargs['preexec_fn'] = lambda: os.nice(10)
+    return subprocess.Popen(
+        [sys.executable, str(Path(__file__).absolute()), '--prefetch'],
+        cwd=str(Path(__file__).parent.absolute()),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=_build_command_env(),
+        **kwargs
+    )
+
+def export_update_bundle(repositories, archive_path):
+    """在可联网的机器上导出离线更新包
+    
+    更新包包含每个仓库上游最新版本的git bundle，以及其requirements.txt所需的全部wheel。
+    
+    Returns:
+        bool: 是否导出成功
+    """
+    archive_path = Path(archive_path).absolute()
+    runtime_dir = Path(__file__).parent.absolute() / 'runtime'
+    runtime_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {'created_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'repositories': {}}
+    
+    with tempfile.TemporaryDirectory(dir=runtime_dir, prefix='bundle_build_') as staging:
+        staging = Path(staging)
+        wheel_dir = staging / 'wheels'
+        wheel_dir.mkdir()
+        
+        for repo in repositories:
+            repo_path = str(repo['path'])
+            print(f"\n{'='*50}")
+            print(f"正在打包 {repo['name']}")
+            print(f"{'='*50}")
+            if not os.path.exists(os.path.join(repo_path, '.git')):
+                print(f"❌ 错误: 不是git仓库: {repo_path}")
+                return False
+            if fetch_upstream(repo_path, repo['remote_urls']) is None:
+                print(f"❌ 所有远程仓库都无法访问，{repo['name']} 打包失败")
+                return False
+            
+            # 在临时裸仓库中把上游提交保存为 main 分支，使离线机器可以按正常流程 fetch 后 reset
+            bare_repo = staging / f"{repo['key']}.git"
+            bundle_name = f"{repo['key']}.bundle"
+            if not (run_git_command(str(staging), f'git init --bare -q "{bare_repo}"') and
+                    run_git_command(str(bare_repo), f'git fetch --no-tags "{repo_path}" +{UPSTREAM_REF}:refs/heads/main') and
+                    run_git_command(str(bare_repo), f'git bundle create "{staging / bundle_name}" refs/heads/main')):
+                print(f"❌ 创建 {repo['name']} 的git bundle失败")
+                return False
+            shutil.rmtree(bare_repo, ignore_errors=True)
+            
+            upstream_head = get_git_output(repo_path, f'rev-parse {UPSTREAM_REF}')
+            manifest['repositories'][repo['key']] = {'bundle': bundle_name, 'head': upstream_head}
+            
+            # 下载上游版本requirements.txt所需的wheel
+            requirements = get_git_output(repo_path, f'show {UPSTREAM_REF}:requirements.txt')
+            if requirements:
+                requirements_file = staging / f"{repo['key']}-requirements.txt"
+                requirements_file.write_text(requirements + '\n', encoding='utf-8')
+                if not run_command(
+                    build_fill_wheelhouse_command(sys.executable, f'-r "{requirements_file}"', wheel_dir),
+                    description=f"下载 {repo['name']} 的依赖包",
+                    realtime_output=True
+                ):
+                    print(f"❌ 下载 {repo['name']} 的依赖包失败")
+                    return False
+        
+        with open(staging / BUNDLE_MANIFEST_NAME, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        
+        archive_path.parent.mkdir(parents=True, exist_ok=True)
+        # git bundle和wheel都已压缩，直接存储即可
+        with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for file_path in sorted(staging.rglob('*')):
+                if file_path.is_file():
+                    archive.write(file_path, file_path.relative_to(staging).as_posix())
+    
+    size_mb = archive_path.stat().st_size / 1024 / 1024
+    print(f"\n✅ 离线更新包已导出: {archive_path} ({size_mb:.1f} MB)")
+    return True
+
+def extract_update_bundle(archive_path):
+    """解压离线更新包并导入其中的wheel到本地wheelhouse
+    
+    Returns:
+        dict: 更新包清单，失败时返回None
+    """
+    archive_path = Path(archive_path)
+    if not archive_path.exists():
+        print(f"❌ 找不到离线更新包: {archive_path}")
+        return None
+    
+    shutil.rmtree(UPDATE_BUNDLE_DIR, ignore_errors=True)
+    UPDATE_BUNDLE_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                # 只解压清单和git bundle，并防止路径跳出解压目录
+                name = os.path.basename(member.filename)
+                if member.is_dir() or not (name == BUNDLE_MANIFEST_NAME or name.endswith('.bundle')):
+                    continue
+                with archive.open(member) as src, open(UPDATE_BUNDLE_DIR / name, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+        with open(UPDATE_BUNDLE_DIR / BUNDLE_MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (zipfile.BadZipFile, OSError, ValueError) as e:
+        print(f"❌ 离线更新包无效: {e}")
+        return None
+    
+    print(f"📦 离线更新包创建于 {manifest.get('created_at', '未知时间')}")
+    if not import_wheelhouse(archive_path):
+        return None
+    return manifest
+
+def apply_bundle_to_repositories(repositories, manifest):
+    """将离线更新包中的git bundle设为仓库的更新来源，返回更新包中包含的仓库"""
+    bundled_repositories = []
+    for repo in repositories:
+        entry = manifest.get('repositories', {}).get(repo['key'])
+        if entry is None:
+            print(f"📋 离线更新包中没有 {repo['name']}，跳过")
+            continue
+        bundled_repositories.append({**repo, 'bundle': str(UPDATE_BUNDLE_DIR / entry['bundle'])})
+    return bundled_repositories
+
+def fetch_bundle(repo):
+    """从离线更新包的git bundle获取上游提交到 UPSTREAM_REF，不修改远程仓库配置
+    
+    Returns:
+        str: 获取到的上游提交，失败时返回None
+    """
+    repo_path = str(repo['path'])
+    print(f"📦 从离线更新包获取 {repo['name']} 的上游版本")
+    if not run_git_command(repo_path, f'git fetch --no-tags "{repo["bundle"]}" +refs/heads/main:{UPSTREAM_REF}'):
+        print(f"❌ 从离线更新包获取 {repo['name']} 失败")
+        return None
+    return get_git_output(repo_path, f'rev-parse {UPSTREAM_REF}')
+
+def _collect_python_sources(root):
+    """收集目录下所有需要预编译的.py文件"""
+    sources = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in PRECOMPILE_EXCLUDED_DIRS]
+        sources.extend(os.path.join(dirpath, name) for name in filenames if name.endswith('.py'))
+    return sources
+
+def _needs_compile(source_path):
+    """检查源文件对应的字节码是否缺失或已过期（按源码哈希判断）"""
+    try:
+        cache_path = importlib.util.cache_from_source(source_path)
+        with open(cache_path, 'rb') as f:
+            header = f.read(16)
+        # 字节码头部：magic(4) + flags(4) + 源码哈希(8)，flags为0表示基于时间戳
+        if len(header) < 16 or header[:4] != importlib.util.MAGIC_NUMBER:
+            return True
+        if int.from_bytes(header[4:8], 'little') & 0b1 == 0:
+            return True
+        with open(source_path, 'rb') as f:
+            return header[8:16] != importlib.util.source_hash(f.read())
+    except OSError:
+        return True
+
+def _compile_source(source_path):
+    """编译单个源文件，返回 (路径, 耗时秒数, 错误信息)"""
+    start_time = time.perf_counter()
+    try:
+        # checked-hash：字节码按源码哈希校验，不依赖文件修改时间，
+        # 一键包被解压/复制到其他机器后仍然有效，手动修改源码后也会自动重新编译
+        py_compile.compile(
+            source_path,
+            doraise=True,
+            invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH
+        )
+        return source_path, time.perf_counter() - start_time, None
+    except (py_compile.PyCompileError, OSError, ValueError) as e:
+        return source_path, time.perf_counter() - start_time, str(e)
+
+def precompile_repositories(repositories, workers=None):
+    """使用多进程并行预编译仓库的字节码，避免首次启动时编译
+    
+    Args:
+        repositories: 仓库信息列表
+        workers: 进程数，None表示使用CPU核心数
+        
+    Returns:
+        bool: 预编译是否全部成功
+    """
+    # 字节码与解释器版本绑定，必须使用内置解释器生成
+    if BUNDLED_PYTHON.exists() and Path(sys.executable).resolve() != BUNDLED_PYTHON.resolve():
+        print(f"使用内置Python进行预编译: {BUNDLED_PYTHON}")
+        return run_command(
+            f'"{BUNDLED_PYTHON}" "{Path(__file__).absolute()}" --precompile',
+            description="预编译字节码",
+            realtime_output=True
+        )
+    
+    workers = workers or os.cpu_count() or 1
+    all_success = True
+    for repo in repositories:
+        repo_path = str(repo['path'])
+        if not os.path.isdir(repo_path):
+            print(f"📋 {repo['name']} 不存在，跳过预编译")
+            continue
+        
+        start_time = time.perf_counter()
+        sources = _collect_python_sources(repo_path)
+        stale_sources = [source for source in sources if _needs_compile(source)]
+        if not stale_sources:
+            print(f"✅ {repo['name']}: {len(sources)} 个文件的字节码均为最新，无需预编译")
+            continue
+        
+        compile_seconds = 0.0
+        errors = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for source, duration, error in executor.map(_compile_source, stale_sources, chunksize=16):
+                compile_seconds += duration
+                if error:
+                    errors.append((source, error))
+        wall_seconds = time.perf_counter() - start_time
+        
+        print(f"✅ {repo['name']}: 预编译 {len(stale_sources) - len(errors)}/{len(stale_sources)} 个文件，"
+              f"用时 {wall_seconds:.1f}s（{workers} 个进程）")
+        print(f"   首次启动预计节省约 {compile_seconds:.1f}s 的字节码编译时间")
+        if errors:
+            all_success = False
+            print(f"⚠️  {len(errors)} 个文件编译失败（启动时若导入这些文件同样会失败）:")
+            for source, error in errors[:10]:
+                print(f"   {os.path.relpath(source, repo_path)}: {error.strip().splitlines()[-1]}")
+    
+    return all_success
+
+def get_precompile_repositories():
+    """获取需要预编译的仓库（麦麦主程序和适配器）"""
+    return [repo for repo in get_repositories() if repo['key'] in ('maibot', 'adapter')]
+
+def merge_updated_config_templates():
+    """更新后将配置模板新增的配置项合并到用户配置中"""
+    try:
+        from config_merge import merge_config_templates
+    except ImportError as e:
+        print(f"⚠️  无法加载配置合并模块，跳过配置模板合并: {e}")
+        return
+    print("\n正在合并配置模板更新...")
+    merge_config_templates()
+
+def sync_mirrored_modules():
+    """更新或回滚后，将其他账号和分群部署的分片目录中的代码同步到 modules/ 中的当前版本
+
+    这些目录中的代码是 modules/ 的硬链接，git 和 pip 更新时以新文件替换旧文件，
+    不同步的话其他账号和分片会继续运行旧代码。
+    """
+    try:
+        from accounts import load_accounts, sync_accounts
+        from shards import load_shards, sync_shards
+    except ImportError as e:
+        print(f"⚠️  无法加载多账号模块，跳过代码同步: {e}")
+        return True
+    if not load_accounts() and not load_shards():
+        return True
+    print("\n正在同步其他账号和分片的代码...")
+    success = sync_accounts() & sync_shards()
+    if not success:
+        print("⚠️  部分文件未能同步，请关闭对应账号或分片的窗口后运行 python accounts.py sync 和 python shards.py sync")
+    return success
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="更新所有模块的git仓库并安装依赖包")
+    parser.add_argument('--only-onekey', action='store_true', help="仅更新一键包仓库")
+    parser.add_argument('--plan', action='store_true', help="仅预检更新内容，不修改工作区")
+    parser.add_argument('--prefetch', action='store_true', help="仅获取上游最新提交，不修改工作区")
+    parser.add_argument('--maintenance', action='store_true', help="维护所有仓库（gc/repack、commit-graph、清理过期引用）")
+    parser.add_argument('--export-bundle', metavar='FILE', help="导出离线更新包（git bundle + 依赖wheel）")
+    parser.add_argument('--apply-bundle', metavar='FILE', help="使用离线更新包进行更新")
+    parser.add_argument('--offline', action='store_true', help="仅使用本地wheelhouse安装依赖")
+    parser.add_argument('--export-wheelhouse', metavar='FILE', help="将本地wheelhouse导出为zip压缩包")
+    parser.add_argument('--import-wheelhouse', metavar='FILE', help="从zip压缩包导入wheelhouse")
+    parser.add_argument('--rollback', action='store_true', help="回滚到上一次更新前的状态")
+    parser.add_argument('--no-rollback', action='store_true', help="冒烟检查失败时不自动回滚")
+    parser.add_argument('--precompile', action='store_true', help="仅预编译麦麦主程序和适配器的字节码")
+    parser.add_argument('--no-precompile', action='store_true', help="更新后不预编译字节码")
+    return parser.parse_args(argv)
+
 def main():
     """主函数"""
     # 检查命令行参数
-    only_onekey = len(sys.argv) > 1 and sys.argv[1] == "--only-onekey"
+    args = parse_args(sys.argv[1:])
+    only_onekey = args.only_onekey
+    
+    if args.export_wheelhouse:
+        return 0 if export_wheelhouse(args.export_wheelhouse) else 1
+    if args.import_wheelhouse:
+        return 0 if import_wheelhouse(args.import_wheelhouse) else 1
+    if args.precompile:
+        return 0 if precompile_repositories(get_precompile_repositories()) else 1
     
     if only_onekey:
         print("开始更新一键包仓库...")
@@ -320,64 +1865,45 @@ def main():
         print("❌ Git环境检测失败，无法继续")
         return 1
     
-    # 获取脚本所在目录（项目根目录）
-    script_dir = Path(__file__).parent.absolute()
+    if args.rollback:
+        transaction = load_update_transaction()
+        if transaction is None:
+            print("❌ 没有找到更新事务记录，无法回滚")
+            return 1
+        return 0 if rollback_update_transaction(transaction, offline=args.offline) else 1
     
-    # 硬编码的远程仓库URL（支持多个备用仓库）
-    REMOTE_URLS = {
-        'onekey': [
-            'https://gh.llkk.cc/https://github.com/DrSmoothl/MaiBotOneKey.git',
-            'https://github.moeyy.xyz/https://github.com/DrSmoothl/MaiBotOneKey.git',
-            'https://gitproxy.click/https://github.com/DrSmoothl/MaiBotOneKey.git',
-            'https://gitproxy.net/https://github.com/DrSmoothl/MaiBotOneKey.git',
-            'https://github.com/DrSmoothl/MaiBotOneKey.git'
-        ],
-        'maibot': [
-            'https://gh.llkk.cc/https://github.com/MaiM-with-u/MaiBot.git',
-            'https://github.moeyy.xyz/https://github.com/MaiM-with-u/MaiBot.git',
-            'https://gitproxy.click/https://github.com/MaiM-with-u/MaiBot.git',
-            'https://gitproxy.net/https://github.com/MaiM-with-u/MaiBot.git',
-            'https://github.com/MaiM-with-u/MaiBot.git',
-        ],
-        'adapter': [
-            'https://gh.llkk.cc/https://github.com/MaiM-with-u/MaiBot-Napcat-Adapter.git',
-            'https://github.moeyy.xyz/https://github.com/MaiM-with-u/MaiBot-Napcat-Adapter.git',
-            'https://gitproxy.click/https://github.com/MaiM-with-u/MaiBot-Napcat-Adapter.git',
-            'https://gitproxy.net/https://github.com/MaiM-with-u/MaiBot-Napcat-Adapter.git',
-            'https://github.com/MaiM-with-u/MaiBot-Napcat-Adapter.git'
-        ]
-    }
-      # 定义要更新的仓库
-    if only_onekey:
-        repositories = [
-            {
-                'name': '一键包主仓库',
-                'path': script_dir,
-                'remote_urls': REMOTE_URLS['onekey'],
-                'force_reset': True
-            }
-        ]
-    else:
-        repositories = [
-            {
-                'name': '一键包主仓库',
-                'path': script_dir,
-                'remote_urls': REMOTE_URLS['onekey'],
-                'force_reset': True
-            },
-            {
-                'name': 'MaiBot主仓库',
-                'path': script_dir / 'modules' / 'MaiBot',
-                'remote_urls': REMOTE_URLS['maibot'],
-                'force_reset': True
-            },
-            {
-                'name': 'MaiBot-Napcat-Adapter适配器仓库',
-                'path': script_dir / 'modules' / 'MaiBot-Napcat-Adapter',
-                'remote_urls': REMOTE_URLS['adapter'],
-                'force_reset': True
-            }
-        ]
+    repositories = get_repositories(only_onekey)
+    
+    if args.plan:
+        return run_update_plan(repositories)
+    if args.prefetch:
+        return 0 if prefetch_repositories(repositories) else 1
+    if args.maintenance:
+        return 0 if maintain_repositories(repositories) else 1
+    if args.export_bundle:
+        return 0 if export_update_bundle(repositories, args.export_bundle) else 1
+    if args.apply_bundle:
+        # 离线更新：从git bundle获取上游提交，依赖只从本地wheelhouse安装，其余流程与正常更新一致
+        manifest = extract_update_bundle(args.apply_bundle)
+        if manifest is None:
+            return 1
+        repositories = apply_bundle_to_repositories(repositories, manifest)
+        args.offline = True
+    
+    start_update_report('bundle' if args.apply_bundle else 'online', only_onekey)
+    exit_code = 1
+    try:
+        exit_code = run_update(args, repositories, only_onekey)
+    finally:
+        # 无论成功、失败还是中断都写入性能报告
+        finish_update_report(exit_code)
+    return exit_code
+
+def run_update(args, repositories, only_onekey=False):
+    """执行更新的各个阶段：更新仓库、安装依赖、冒烟检查、预编译"""
+    stage_start = time.perf_counter()
+    transaction = begin_update_transaction(repositories)
+    record_report_stage('snapshot', stage_start)
     
     total_count = len(repositories)
     update_success_count = 0
@@ -387,18 +1913,90 @@ def main():
     print("第一阶段：更新Git仓库")
     print(f"{'='*60}")
     
+    stage_start, stage_wait = time.perf_counter(), get_input_wait()
+    heads_before = {entry['path']: entry['head'] for entry in transaction['repositories']}
+    # 离线更新包模式下上游即为更新包，不使用后台预取结果
+    prefetched_heads = {} if args.apply_bundle else get_fresh_prefetched_heads(repositories)
     for repo in repositories:
-        if update_repository(str(repo['path']), repo['name'], repo['remote_urls'], repo.get('force_reset', False)):
+        repo_start, repo_wait = time.perf_counter(), get_input_wait()
+        with repo_lock(repo['path'], 'update') as acquired:
+            if acquired and repo.get('bundle'):
+                # 更新包中的提交先获取到本地引用，再按预取版本在本地更新，origin 保持原来的远程仓库
+                prefetched_heads[repo['key']] = fetch_bundle(repo)
+                acquired = prefetched_heads[repo['key']] is not None
+            success = acquired and update_repository(str(repo['path']), repo['name'], repo['remote_urls'],
+                                                     repo.get('force_reset', False), prefetched_heads.get(repo['key']))
+        if success:
             update_success_count += 1
+        record_report('repositories', {
+            'name': repo['name'],
+            'success': success,
+            'duration': elapsed_since(repo_start, repo_wait),
+            'head_before': heads_before.get(str(repo['path'])),
+            'head_after': get_git_output(str(repo['path']), 'rev-parse HEAD'),
+        })
+    refresh_prefetch_state(repositories)
+    record_report_stage('update', stage_start, stage_wait)
     
     # 第二阶段：安装依赖
     print(f"\n{'='*60}")
     print("第二阶段：安装依赖包")
     print(f"{'='*60}")
     
+    stage_start = time.perf_counter()
     for repo in repositories:
-        if install_requirements(str(repo['path']), repo['name']):
+        if install_requirements(str(repo['path']), repo['name'], offline=args.offline):
             install_success_count += 1
+    record_report_stage('install', stage_start)
+    
+    if CURRENT_REPORT is not None:
+        # 所有仓库提交未变化且没有依赖包版本变化，即本次更新为空操作
+        packages_after = snapshot_installed_packages() or {}
+        packages_before = transaction['packages']
+        CURRENT_REPORT['packages_changed'] = sorted(
+            name for name in set(packages_before) | set(packages_after)
+            if packages_before.get(name) != packages_after.get(name)
+        )
+        CURRENT_REPORT['noop'] = (
+            all(entry['head_before'] == entry['head_after'] for entry in CURRENT_REPORT['repositories'])
+            and not CURRENT_REPORT['packages_changed']
+        )
+    
+    # 将上游配置模板的变化合并到用户配置（模板未变化时直接跳过）
+    stage_start = time.perf_counter()
+    merge_updated_config_templates()
+    record_report_stage('config_merge', stage_start)
+    
+    # 第三阶段：冒烟检查，失败时自动回滚
+    print(f"\n{'='*60}")
+    print("第三阶段：更新后冒烟检查")
+    print(f"{'='*60}")
+    
+    stage_start = time.perf_counter()
+    smoke_check_passed = run_smoke_check(repositories, check_dependencies=transaction['dependencies_consistent'])
+    record_report_stage('smoke_check', stage_start)
+    if smoke_check_passed:
+        transaction['status'] = 'committed'
+        save_update_transaction(transaction)
+        sync_mirrored_modules()
+    else:
+        print("❌ 冒烟检查未通过，新版本可能无法正常启动")
+        transaction['status'] = 'smoke_check_failed'
+        save_update_transaction(transaction)
+        if args.no_rollback:
+            print("⚠️  已指定 --no-rollback，保留更新后的状态。可稍后运行 update_modules.py --rollback 手动回滚")
+        else:
+            rollback_update_transaction(transaction, offline=args.offline)
+            return 1
+    
+    # 第四阶段：并行预编译字节码，缩短首次启动时间
+    if not only_onekey and not args.no_precompile:
+        print(f"\n{'='*60}")
+        print("第四阶段：预编译字节码")
+        print(f"{'='*60}")
+        stage_start = time.perf_counter()
+        precompile_repositories(get_precompile_repositories())
+        record_report_stage('precompile', stage_start)
     
     # 输出总结
     print(f"\n{'='*60}")